@@ -3,32 +3,53 @@ SPY Options Backend API - FastAPI application with Azure integration.
 Optimized v1.9.0:
  - Broadcast-first: SignalR dispatch inmediato, Azure save en BackgroundTask
  - httpx.AsyncClient: sin threads extra para broadcasts
- - Caché de lectura en /anomalies (30s) y /spymarket/spy_latest (5s)
+ - Caché de lectura unificado (read_cache): TTL, LRU por bytes, single-flight, stale-while-revalidate
  - Deprecados eliminados: utcnow(), flow.dict(), @on_event, import duplicado
  - Métricas Prometheus con status real (al finalizar, no al inicio)
+ - Storage no bloqueante: async_storage (executor acotado) en todos los endpoints
+ - Broadcaster SignalR: coalescing por tick, anomalías en lote, token cacheado
+ - Histórico reciente en memoria (ring buffers write-through): GET sin I/O de storage
+ - Rollups OHLC 10s/1m/5m de flow y spymarket para vistas de horas/días (?hours=)
+ - Lecturas incrementales (?since=<unix_ts>): solo filas posteriores al cursor + nuevo cursor
+ - Formato columnar opt-in para históricos (?format=columnar / Accept: application/vnd.columnar+json)
+ - GET condicional (ETag / If-None-Match → 304) en snapshots y /flow
 """
 import logging
 import asyncio
+import hashlib
+import math
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from functools import partial
+from typing import List, Dict, Any, Awaitable, Callable, NamedTuple, Optional, Tuple
 from zoneinfo import ZoneInfo
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi import Request, BackgroundTasks
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi import Request, Response, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import generate_latest
+from pydantic import ValidationError
 from config import settings
-from models import AnomaliesSnapshot, AnomaliesResponse, HealthResponse, VolumesSnapshot, FlowSnapshot, SpymarketSnapshot, MarketState, MarketEvent, MarketEventsResponse, GammaMetrics
+from models import AnomaliesSnapshot, AnomaliesResponse, HealthResponse, VolumesSnapshot, FlowSnapshot, SpymarketSnapshot, MarketState, MarketEvent, MarketEventsResponse, GammaMetrics, IngestBatch, IngestBatchResponse, IngestRecordStatus
 from services.storage_client import storage_client
+from services.async_storage import async_storage
 from services.signalr_rest import signalr_rest
+from services.broadcaster import broadcaster
+from services.read_cache import read_cache
+from services.recent_history import recent_history
+from services.rollups import RESOLUTIONS, rollup_alias, rollups, select_resolution
+from services.retention import retention
+from utils.columnar import COLUMNAR_MEDIA_TYPE, FORMATS as RESPONSE_FORMATS, to_columns, wants_columnar
+from utils.downsampling import METHODS as DOWNSAMPLING_METHODS, downsample_records, to_epoch
 from services.annotation_calculator import AnnotationCalculator
 from services.signalr_negotiate import router as signalr_negotiate_router
 from metrics import (
     http_requests_total,
     anomalies_detected_total,
-    anomalies_current
+    anomalies_current,
+    ingest_batch_records_total
 )
 
 # Configure logging
@@ -39,20 +60,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ─────────────────────────────────────────────
-#  Caché de lectura en memoria (pod-local)
+#  Caché de lectura en memoria (pod-local, services/read_cache.py)
 #  TTL ajustado por endpoint según criticidad
 # ─────────────────────────────────────────────
-_flow_cache: dict = {}
-_flow_cache_time: dict = {}
-
-_anomalies_cache: dict = {}
-_anomalies_cache_time: dict = {}
-
-_spymarket_cache: dict = {}
-_spymarket_cache_ts: float = 0.0
 _SPYMARKET_CACHE_TTL = 5       # segundos — dato muy fresco
-_ANOMALIES_CACHE_TTL = 30      # segundos
+_ANOMALIES_CACHE_TTL = 30      # segundos (también gamma_snap)
 _FLOW_CACHE_TTL = 60           # segundos
+_VOLUMES_CACHE_TTL = 60        # segundos
+_EVENTS_CACHE_TTL = 30         # segundos
+
+# Downsampling de /flow (conserva picos; sustituye la decimación por stride)
+_FLOW_COLUMNS = ("cum_call_flow", "cum_put_flow", "spy_price")
+_FLOW_DEFAULT_POINTS = 4000
+
+# Rollups OHLC (services/rollups.py): puntos máximos para ?hours=
+_ROLLUP_DEFAULT_POINTS = 2000
 
 
 # ─────────────────────────────────────────────
@@ -64,12 +86,21 @@ async def lifespan(app: FastAPI):
     # ── STARTUP ──
     logger.info(f"Starting SPY Options Backend API v{settings.app_version}")
 
+    # Executor acotado para el SDK síncrono de Azure Tables (no bloquea el event loop)
+    async_storage.start()
+
+    # Índice de annotations en memoria, alimentado por cada ingest de spymarket
+    app.state.annotation_calc = AnnotationCalculator(storage_client)  # guardado en app.state
+    logger.info("✅ Annotation calculator initialized")
+
     try:
-        storage_client.connect()
-        logger.info("✅ Azure Table Storage connected")
-        annotation_calc = AnnotationCalculator(storage_client)
-        app.state.annotation_calc = annotation_calc  # guardado en app.state
-        logger.info("✅ Annotation calculator initialized")
+        await async_storage.connect()
+        logger.info(f"✅ Storage connected (backend={storage_client.backend})")
+        # Reabrir los buckets de rollup persistidos en el shutdown (antes de aceptar ingest)
+        await rollups.hydrate(async_storage)
+        # Hidratación de los ring buffers en background (los GET caen a Azure hasta que termine)
+        app.state.history_hydration = asyncio.create_task(recent_history.hydrate(async_storage))
+        app.state.annotation_hydration = asyncio.create_task(app.state.annotation_calc.hydrate(async_storage))
     except Exception as e:
         logger.error(f"❌ Failed to connect to Storage: {e}")
 
@@ -77,10 +108,10 @@ async def lifespan(app: FastAPI):
     await signalr_rest.init_async_client()
     logger.info("✅ SignalR httpx.AsyncClient inicializado")
 
-    # Scheduler de limpieza automática
+    # Scheduler de limpieza automática (retención por tabla, fuera del event loop)
     cleanup_scheduler = AsyncIOScheduler(timezone='UTC')
     cleanup_scheduler.add_job(
-        func=lambda: storage_client.purge_old_data(days=7),
+        func=retention.run_async,
         trigger='cron',
         hour=2,
         minute=0,
@@ -93,9 +124,21 @@ async def lifespan(app: FastAPI):
     yield  # ← la app corre aquí
 
     # ── SHUTDOWN ──
+    for name in ("history_hydration", "annotation_hydration"):
+        hydration = getattr(app.state, name, None)
+        if hydration is not None and not hydration.done():
+            hydration.cancel()
+    await broadcaster.close()
     await signalr_rest.close_async_client()
     logger.info("✅ SignalR httpx.AsyncClient cerrado")
     cleanup_scheduler.shutdown(wait=False)
+    # Interrumpir una purga en curso (se reanuda en la próxima ejecución)
+    await asyncio.get_running_loop().run_in_executor(None, retention.stop)
+    # Persistir los buckets de rollup abiertos (parciales) antes de parar el executor
+    await _run_saves(_rollup_saves(rollups.flush()))
+    async_storage.shutdown(wait=True)
+    # Flush final del write-behind (después del executor: ya no llegan más save_*)
+    storage_client.close()
 
 
 # FastAPI app initialization
@@ -144,109 +187,238 @@ async def metrics():
 
 
 # ─────────────────────────────────────────────
-#  SPY MARKET
+#  INGEST HELPERS
+#  Compartidos por los POST individuales y /ingest/batch:
+#  _prepare_* valida y calcula, _dispatch_ingest hace broadcast + persistencia
 # ─────────────────────────────────────────────
 
-@app.post("/spymarket", tags=["Market"])
-async def receive_spymarket(request: Request, background_tasks: BackgroundTasks):
-    """
-    Endpoint único para recibir datos SPY desde detector.
+class _PreparedIngest(NamedTuple):
+    """Registro validado, listo para broadcast SignalR y guardado en Azure."""
+    broadcasts: List[Tuple[str, Dict[str, Any]]]  # [(event_name, data), ...]
+    saves: List[Callable[[], Awaitable[Any]]]     # Guardados diferidos (BackgroundTask)
+    response: Dict[str, Any]                      # Respuesta del endpoint individual
 
-    OPT v1.9: Broadcast-first — SignalR se dispara ANTES de guardar en Azure.
-    El guardado en Azure se delega a BackgroundTask (no bloquea al detector).
-    """
-    try:
-        data = await request.json()
 
-        # Validación mínima
-        required = ["timestamp", "price", "previous_close"]
-        missing = [f for f in required if f not in data]
-        if missing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required fields: {', '.join(missing)}"
-            )
-
-        # Extraer datos base
-        timestamp = int(data["timestamp"])
-        price = float(data["price"])
-        previous_close = float(data["previous_close"])
-
-        # Si previous_close es 0, recuperar último válido de Azure
-        if previous_close == 0.0:
-            last = storage_client.get_spymarket_latest()
-            if last and last.get("previous_close", 0.0) > 0:
-                previous_close = last["previous_close"]
-                logger.warning(f"⚠️ previous_close=0 recibido, usando último válido: {previous_close}")
-
-        market_status = data.get("market_status", "UNKNOWN")
-
-        # Calcular datos derivados
-        spy_change_pct = round(
-            ((price - previous_close) / previous_close) * 100, 2
-        ) if previous_close > 0 else 0.0
-
-        atm_center = round(price)
-        atm_min = atm_center - 5
-        atm_max = atm_center + 5
-
-        snapshot = SpymarketSnapshot(
-            timestamp=timestamp,
-            price=price,
-            bid=data.get("bid"),
-            ask=data.get("ask"),
-            last=data.get("last"),
-            volume=data.get("volume"),
-            previous_close=previous_close,
-            market_status=market_status,
-            spy_change_pct=spy_change_pct,
-            atm_center=atm_center,
-            atm_min=atm_min,
-            atm_max=atm_max
-        )
+async def _run_saves(saves: List[Callable[[], Awaitable[Any]]]) -> None:
+    """Ejecuta los guardados en Azure de una petición (en background, vía async_storage)."""
+    results = await asyncio.gather(*(save() for save in saves), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"❌ Background save failed: {result}")
 
-        broadcast_payload = {
-            "current_price": price,
-            "spy_change_pct": spy_change_pct,
-            "atm_center": atm_center,
-            "atm_min": atm_min,
-            "atm_max": atm_max,
-            "market_status": market_status,
-            "previous_close": previous_close
-        }
 
-        # ✅ OPT 1: Broadcast PRIMERO — respuesta inmediata al detector
-        await signalr_rest.broadcast_async(
-            hub_name="spyoptions",
-            event_name="marketState",
-            data=broadcast_payload
-        )
+def _rollup_saves(closed: List[Tuple[str, Dict[str, Any]]]) -> List[Callable[[], Awaitable[Any]]]:
+    """Guardados diferidos de los buckets de rollup cerrados por un ingest."""
+    return [partial(async_storage.save_rollup, alias, entity) for alias, entity in closed]
 
-        # ✅ OPT 1: Guardar en Azure en background (no bloquea)
-        def _save_spymarket():
-            if not storage_client.save_spymarket(snapshot):
-                logger.warning("⚠️ Background save_spymarket falló — dato no persistido")
 
-        background_tasks.add_task(_save_spymarket)
+async def _dispatch_ingest(prepared: List[_PreparedIngest], background_tasks: BackgroundTasks) -> None:
+    """
+    ✅ OPT 1: Broadcast PRIMERO — todos los eventos SignalR del tick vía broadcaster
+       (coalescing de estado, anomalías en lote, envíos concurrentes acotados).
+    ✅ OPT 1: Persistencia en un único BackgroundTask (no bloquea al detector).
+    """
+    await broadcaster.publish([event for item in prepared for event in item.broadcasts])
+
+    saves = [save for item in prepared for save in item.saves]
+    if saves:
+        background_tasks.add_task(_run_saves, saves)
+
+
+async def _prepare_spymarket(data: dict) -> _PreparedIngest:
+    """Valida un snapshot SPY del detector y calcula los datos derivados."""
+    # Validación mínima
+    required = ["timestamp", "price", "previous_close"]
+    missing = [f for f in required if f not in data]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required fields: {', '.join(missing)}"
+        )
 
-        # Invalidar caché de /spymarket/spy_latest
-        global _spymarket_cache, _spymarket_cache_ts
-        _spymarket_cache = {}
-        _spymarket_cache_ts = 0.0
+    # Extraer datos base
+    timestamp = int(data["timestamp"])
+    price = float(data["price"])
+    previous_close = float(data["previous_close"])
+
+    # Si previous_close es 0, recuperar último válido (memoria, o Azure en arranque en frío)
+    if previous_close == 0.0:
+        last = recent_history.spymarket_latest()
+        if last is None:
+            last = await async_storage.get_spymarket_latest()
+        if last and last.get("previous_close", 0.0) > 0:
+            previous_close = last["previous_close"]
+            logger.warning(f"⚠️ previous_close=0 recibido, usando último válido: {previous_close}")
+
+    market_status = data.get("market_status", "UNKNOWN")
+
+    # Calcular datos derivados
+    spy_change_pct = round(
+        ((price - previous_close) / previous_close) * 100, 2
+    ) if previous_close > 0 else 0.0
+
+    atm_center = round(price)
+    atm_min = atm_center - 5
+    atm_max = atm_center + 5
+
+    snapshot = SpymarketSnapshot(
+        timestamp=timestamp,
+        price=price,
+        bid=data.get("bid"),
+        ask=data.get("ask"),
+        last=data.get("last"),
+        volume=data.get("volume"),
+        previous_close=previous_close,
+        market_status=market_status,
+        spy_change_pct=spy_change_pct,
+        atm_center=atm_center,
+        atm_min=atm_min,
+        atm_max=atm_max
+    )
 
-        logger.debug(
-            f"✅ SPY market processed | "
-            f"${price:.2f} ({spy_change_pct:+.2f}%) | "
-            f"ATM: {atm_center}"
-        )
+    broadcast_payload = {
+        "current_price": price,
+        "spy_change_pct": spy_change_pct,
+        "atm_center": atm_center,
+        "atm_min": atm_min,
+        "atm_max": atm_max,
+        "market_status": market_status,
+        "previous_close": previous_close
+    }
+
+    async def _save_spymarket():
+        if not await async_storage.save_spymarket(snapshot):
+            logger.warning("⚠️ Background save_spymarket falló — dato no persistido")
+
+    # Histórico en memoria + rollups + invalidar caché de /spymarket/spy_latest
+    recent_history.record_spymarket(snapshot)
+    closed_rollups = rollups.update("spymarket", timestamp, snapshot.model_dump())
+    annotation_calc = getattr(app.state, "annotation_calc", None)
+    if annotation_calc is not None:
+        annotation_calc.record(timestamp)
+    read_cache.invalidate("spymarket")
+
+    logger.debug(
+        f"✅ SPY market processed | "
+        f"${price:.2f} ({spy_change_pct:+.2f}%) | "
+        f"ATM: {atm_center}"
+    )
 
-        http_requests_total.labels(method="POST", endpoint="/spymarket", status="201").inc()
-        return {
+    return _PreparedIngest(
+        broadcasts=[("marketState", broadcast_payload)],
+        saves=[_save_spymarket] + _rollup_saves(closed_rollups),
+        response={
             "status": "accepted",
             "timestamp": timestamp,
             "spy_change_pct": spy_change_pct,
             "atm_range": {"min": atm_min, "max": atm_max}
         }
+    )
+
+
+def _prepare_anomalies(anomalies: List[AnomaliesSnapshot], count: int) -> _PreparedIngest:
+    """Prepara el broadcast y la persistencia de un lote de anomalías."""
+    logger.info(f"Recibidas {count} anomalías")
+
+    broadcasts = []
+    for anomaly in anomalies:
+        anomalies_detected_total.labels(severity=anomaly.severity).inc()
+
+        broadcasts.append(("anomalyDetected", {
+            "timestamp": datetime.fromtimestamp(anomaly.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "strike": float(anomaly.strike),
+            "option_type": anomaly.option_type,
+            "mid_price": float(anomaly.mid_price),
+            "bid": float(anomaly.bid),
+            "ask": float(anomaly.ask),
+            "deviation_percent": float(anomaly.deviation_percent),
+            "volume": int(anomaly.volume),
+            "open_interest": int(anomaly.open_interest),
+            "severity": anomaly.severity
+        }))
+
+    # Histórico en memoria + invalidar caché de /anomalies
+    recent_history.record_anomalies(anomalies)
+    read_cache.invalidate("anomalies")
+
+    return _PreparedIngest(
+        broadcasts=broadcasts,
+        saves=[partial(async_storage.save_anomalies, anomaly) for anomaly in anomalies],
+        response={"status": "accepted", "count": count}
+    )
+
+
+def _prepare_flow(flow: FlowSnapshot) -> _PreparedIngest:
+    """Prepara el broadcast y la persistencia de un punto de signed premium flow."""
+    logger.info(
+        f"🚀 Flow recibido: "
+        f"Calls=${flow.cum_call_flow:,.0f} | Puts=${flow.cum_put_flow:,.0f} | "
+        f"Net=${flow.net_flow:,.0f}"
+    )
+
+    flow_data = {
+        "timestamp": flow.timestamp,
+        "cum_call_flow": float(flow.cum_call_flow),
+        "cum_put_flow": float(flow.cum_put_flow),
+        "net_flow": float(flow.net_flow),
+        "spy_price": float(flow.spy_price)
+    }
+    recent_history.record_flow(flow_data)
+    closed_rollups = rollups.update("flow", flow.timestamp, flow_data)
+
+    return _PreparedIngest(
+        broadcasts=[("flow", flow_data)],
+        saves=[partial(async_storage.save_flow, flow.model_dump())] + _rollup_saves(closed_rollups),  # ✅ Fix: model_dump()
+        response={"status": "accepted", "timestamp": flow.timestamp}
+    )
+
+
+def _prepare_gamma(data: dict) -> _PreparedIngest:
+    """Prepares broadcast and persistence of gamma exposure metrics."""
+    logger.info(
+        f"🌡️ Gamma metrics received: "
+        f"NetGEX={data.get('net_gex', 0):.3f}, "
+        f"Regime={data.get('gamma_regime', 0):.3f}, "
+        f"Pinning={data.get('pinning_risk', 0):.3f}"
+    )
+
+    # Histórico en memoria + invalidar caché de /gamma/gamma_snap
+    recent_history.record_gamma(data)
+    read_cache.invalidate("gamma")
+
+    return _PreparedIngest(
+        broadcasts=[("gammaUpdate", data)],
+        saves=[partial(async_storage.save_gamma_metrics, data)],
+        response={
+            "status": "accepted",
+            "timestamp": data.get("timestamp"),
+            "net_gex": data.get("net_gex"),
+            "gamma_regime": data.get("gamma_regime"),
+            "pinning_risk": data.get("pinning_risk")
+        }
+    )
+
+
+# ─────────────────────────────────────────────
+#  SPY MARKET
+# ─────────────────────────────────────────────
+
+@app.post("/spymarket", tags=["Market"])
+async def receive_spymarket(request: Request, background_tasks: BackgroundTasks):
+    """
+    Endpoint único para recibir datos SPY desde detector.
+
+    OPT v1.9: Broadcast-first — SignalR se dispara ANTES de guardar en Azure.
+    El guardado en Azure se delega a BackgroundTask (no bloquea al detector).
+    """
+    try:
+        data = await request.json()
+
+        prepared = await _prepare_spymarket(data)
+        await _dispatch_ingest([prepared], background_tasks)
+
+        http_requests_total.labels(method="POST", endpoint="/spymarket", status="201").inc()
+        return prepared.response
 
     except HTTPException:
         raise
@@ -257,25 +429,37 @@ async def receive_spymarket(request: Request, background_tasks: BackgroundTasks)
 
 
 @app.get("/spymarket/spy_latest", tags=["Market"])
-async def get_spymarket_latest():
-    """Obtiene el último snapshot de spymarket. Caché de 5s."""
-    global _spymarket_cache, _spymarket_cache_ts
+async def get_spymarket_latest(response: Response, if_none_match: Optional[str] = Header(default=None)):
+    """Obtiene el último snapshot de spymarket. Caché de 5s. ETag = RowKey del snapshot."""
+    market_data = recent_history.spymarket_latest()
+    if market_data is not None:
+        return _conditional(_etag("spymarket", "latest", market_data.get("RowKey")), if_none_match, response, lambda: market_data)
 
-    now_ts = datetime.now(timezone.utc).timestamp()
+    try:
+        # ✅ OPT 4: Caché de 5s para /spymarket/spy_latest (invalidado en cada ingest)
+        market_data = await read_cache.get_or_load(
+            "spymarket", "latest", async_storage.get_spymarket_latest, ttl=_SPYMARKET_CACHE_TTL
+        ) or {}
+        return _conditional(_etag("spymarket", "latest", market_data.get("RowKey")), if_none_match, response, lambda: market_data)
+    except Exception as e:
+        logger.error(f"Error getting spymarket latest: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # ✅ OPT 4: Caché de 5s para /spymarket/spy_latest
-    if _spymarket_cache and (now_ts - _spymarket_cache_ts) < _SPYMARKET_CACHE_TTL:
-        return _spymarket_cache
 
+@app.get("/spymarket", response_model=dict, tags=["Market"])
+async def get_spymarket_history(
+    hours: int = Query(default=4, ge=1, le=168),
+    points: int = Query(default=_ROLLUP_DEFAULT_POINTS, ge=10, le=20000),
+    since: Optional[float] = Query(default=None, ge=0),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+):
+    """Histórico OHLC de precio de las últimas `hours` horas (rollups 10s / 1m / 5m)."""
+    columnar = _columnar_requested(fmt, accept)
     try:
-        market_data = storage_client.get_spymarket_latest()
-        if not market_data:
-            return {}
-        _spymarket_cache = market_data
-        _spymarket_cache_ts = now_ts
-        return market_data
+        return _history_response(await _rollup_history("spymarket", hours, points, since), "history", columnar)
     except Exception as e:
-        logger.error(f"Error getting spymarket latest: {e}", exc_info=True)
+        logger.error(f"Error getting spymarket history: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -287,40 +471,11 @@ async def get_spymarket_latest():
 async def create_anomaly(payload: AnomaliesResponse, background_tasks: BackgroundTasks):
     """Procesa anomalías: broadcast inmediato, persistencia en background."""
     try:
-        logger.info(f"Recibidas {payload.count} anomalías")
-
-        for anomaly in payload.anomalies:
-            anomalies_detected_total.labels(severity=anomaly.severity).inc()
-
-            broadcast_data = {
-                "timestamp": datetime.fromtimestamp(anomaly.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
-                "strike": float(anomaly.strike),
-                "option_type": anomaly.option_type,
-                "mid_price": float(anomaly.mid_price),
-                "bid": float(anomaly.bid),
-                "ask": float(anomaly.ask),
-                "deviation_percent": float(anomaly.deviation_percent),
-                "volume": int(anomaly.volume),
-                "open_interest": int(anomaly.open_interest),
-                "severity": anomaly.severity
-            }
-
-            # ✅ OPT 1: Broadcast PRIMERO
-            await signalr_rest.broadcast_async(
-                hub_name="spyoptions",
-                event_name="anomalyDetected",
-                data=broadcast_data
-            )
-
-            # ✅ OPT 1: Persistencia en background
-            background_tasks.add_task(storage_client.save_anomalies, anomaly)
-
-        # Invalidar caché de /anomalies
-        _anomalies_cache.clear()
-        _anomalies_cache_time.clear()
+        prepared = _prepare_anomalies(payload.anomalies, payload.count)
+        await _dispatch_ingest([prepared], background_tasks)
 
         http_requests_total.labels(method="POST", endpoint="/anomalies", status="201").inc()
-        return {"status": "accepted", "count": payload.count}
+        return prepared.response
     except Exception as e:
         logger.error(f"❌ Error processing anomalies: {e}")
         http_requests_total.labels(method="POST", endpoint="/anomalies", status="500").inc()
@@ -328,19 +483,20 @@ async def create_anomaly(payload: AnomaliesResponse, background_tasks: Backgroun
 
 
 @app.get("/anomalies", response_model=dict, tags=["Anomalies"])
-async def get_anomalies(hours: int = Query(default=4, ge=1, le=168), limit: int = Query(default=100, ge=1, le=500)):
-    """✅ OPT: Filtro de campos para reducir payload y caché de 30s."""
-    cache_key = f"anomalies_{limit}"
-    now = datetime.now(timezone.utc)
-
-    if cache_key in _anomalies_cache:
-        cache_age = (now - _anomalies_cache_time.get(cache_key, now)).total_seconds()
-        if cache_age < _ANOMALIES_CACHE_TTL:
-            return _anomalies_cache[cache_key]
-
-    try:
-        raw_anomalies = storage_client.get_anomalies(limit=limit)
-            
+async def get_anomalies(
+    response: Response,
+    hours: int = Query(default=4, ge=1, le=168),
+    limit: int = Query(default=100, ge=1, le=500),
+    since: Optional[float] = Query(default=None, ge=0),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """✅ OPT: Filtro de campos para reducir payload y caché de 30s. Con `since`, solo anomalías posteriores."""
+    async def _load() -> dict:
+        now = datetime.now(timezone.utc)
+        raw_anomalies = recent_history.anomalies(limit, since)
+        if raw_anomalies is None:
+            raw_anomalies = await async_storage.get_anomalies(limit=limit, since=since)
+        
         # ✅ Filtramos para enviar SOLO lo que el frontend usa en cards y Strike Walls
         # Usamos .get() y fallbacks para evitar 500 si algún registro está incompleto
         clean_anomalies = [
@@ -355,17 +511,20 @@ async def get_anomalies(hours: int = Query(default=4, ge=1, le=168), limit: int
             }
             for a in raw_anomalies
         ]
-            
+        
         result = {
             "count": len(clean_anomalies),
             "anomalies": clean_anomalies,
-            "last_scan": now.isoformat().replace("+00:00", "Z") # Estándar ISO con Z
+            "last_scan": now.isoformat().replace("+00:00", "Z"), # Estándar ISO con Z
+            "cursor": _next_cursor(clean_anomalies, since),
         }
-        
-        _anomalies_cache[cache_key] = result
-        _anomalies_cache_time[cache_key] = now
         return result
 
+    try:
+        cache_key = f"limit={limit}&since={since}"
+        result = await read_cache.get_or_load("anomalies", cache_key, _load, ttl=_ANOMALIES_CACHE_TTL)
+        version = (result["cursor"], result["count"])
+        return _conditional(_etag("anomalies", cache_key, version), if_none_match, response, lambda: result)
     except Exception as e:
         logger.error(f"❌ Error en get_anomalies: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -381,32 +540,11 @@ async def receive_flow(flow: FlowSnapshot, background_tasks: BackgroundTasks):
     Recibe signed premium flow. Broadcast-first, guardado en background.
     """
     try:
-        logger.info(
-            f"🚀 Flow recibido: "
-            f"Calls=${flow.cum_call_flow:,.0f} | Puts=${flow.cum_put_flow:,.0f} | "
-            f"Net=${flow.net_flow:,.0f}"
-        )
-
-        flow_data = {
-            "timestamp": flow.timestamp,
-            "cum_call_flow": float(flow.cum_call_flow),
-            "cum_put_flow": float(flow.cum_put_flow),
-            "net_flow": float(flow.net_flow),
-            "spy_price": float(flow.spy_price)
-        }
-
-        # ✅ OPT 1: Broadcast PRIMERO
-        await signalr_rest.broadcast_async(
-            hub_name="spyoptions",
-            event_name="flow",
-            data=flow_data
-        )
-
-        # ✅ OPT 1: Persistencia en background
-        background_tasks.add_task(storage_client.save_flow, flow.model_dump())  # ✅ Fix: model_dump()
+        prepared = _prepare_flow(flow)
+        await _dispatch_ingest([prepared], background_tasks)
 
         http_requests_total.labels(method="POST", endpoint="/flow", status="201").inc()
-        return {"status": "accepted", "timestamp": flow.timestamp}
+        return prepared.response
 
     except Exception as e:
         logger.error(f"❌ Error processing flow: {e}")
@@ -414,24 +552,174 @@ async def receive_flow(flow: FlowSnapshot, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _next_cursor(records: List[Dict[str, Any]], since: Optional[float]) -> Optional[float]:
+    """Cursor para la siguiente lectura incremental: timestamp Unix más reciente de `records` (o `since`)."""
+    cursor = since
+    for record in records:
+        ts = to_epoch(record.get("timestamp"))
+        if math.isfinite(ts) and (cursor is None or ts > cursor):
+            cursor = ts
+    return cursor
+
+
+def _etag(namespace: str, params: str, version: Any) -> str:
+    """
+    ETag débil de una respuesta: endpoint + parámetros + versión del dato
+    (RowKey / cursor del registro más reciente y nº de registros).
+    Derivado del propio dato, no de un contador local: es válido entre réplicas.
+    """
+    digest = hashlib.blake2b(f"{params}|{version}".encode(), digest_size=8).hexdigest()
+    return f'W/"{namespace}-{digest}"'
+
+
+def _conditional(etag: str, if_none_match: Optional[str], response: Response, build: Callable[[], Any]) -> Any:
+    """
+    304 sin cuerpo si el cliente ya tiene `etag` (sin construir ni serializar
+    la respuesta); si no, el resultado de `build()` con cabeceras ETag.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    result = build()
+    target = result if isinstance(result, Response) else response
+    target.headers.update(headers)
+    return result
+
+
+def _columnar_requested(fmt: Optional[str], accept: Optional[str]) -> bool:
+    """Valida `format=` y decide si la respuesta va en formato columnar."""
+    if fmt is not None and fmt not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+    return wants_columnar(fmt, accept)
+
+
+def _history_response(payload: Dict[str, Any], key: str, columnar: bool):
+    """
+    Respuesta de un histórico: el payload tal cual (filas) o, en formato
+    columnar, con `payload[key]` convertido a struct-of-arrays. La respuesta
+    columnar se serializa directamente (sin jsonable_encoder).
+    """
+    if not columnar:
+        return payload
+    content = {**payload, key: to_columns(payload[key]), "format": "columnar"}
+    return JSONResponse(content=content, media_type=COLUMNAR_MEDIA_TYPE)
+
+
+def _downsample_flow(history: List[Dict[str, Any]], points: int, resolution: Optional[int], method: str) -> List[Dict[str, Any]]:
+    """Reduce el histórico de flow a `points` (o buckets de `resolution` s) conservando picos."""
+    reduced = downsample_records(history, _FLOW_COLUMNS, points=points, resolution=resolution, method=method)
+    if len(reduced) < len(history):
+        logger.debug(f"✂️ Flow downsampling ({method}): {len(history)} -> {len(reduced)}")
+    return reduced
+
+
+async def _rollup_history(stream: str, hours: int, max_points: int, since: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Histórico de `hours` horas desde los rollups OHLC, con la resolución más fina
+    que no supera `max_points` buckets. El bucket abierto y los últimos cerrados
+    se añaden desde memoria (unidos por RowKey: la lista persistida cacheada
+    puede no contener aún los recién cerrados).
+
+    Con `since`, solo buckets con inicio >= since: el bucket del cursor se
+    reenvía porque pudo seguir agregando datos. El cursor devuelto es el inicio
+    del último bucket persistido (nunca avanza más allá de un bucket que podría
+    faltar en la respuesta); los buckets posteriores se reenvían en la siguiente.
+    """
+    label = select_resolution(hours * 3600, max_points)
+    seconds = RESOLUTIONS[label]
+
+    async def _load() -> List[Dict[str, Any]]:
+        anchor = recent_history.newest_ts(stream) or time.time()
+        return await async_storage.get_rollups(rollup_alias(stream, label), anchor - hours * 3600)
+
+    # TTL = resolución; los buckets cerrados después de la carga se añaden desde memoria
+    persisted = await read_cache.get_or_load(f"{stream}_rollup", f"hours={hours}&resolution={label}", _load, ttl=seconds)
+    merged = {bucket["RowKey"]: bucket for bucket in persisted}
+    window_start = (recent_history.newest_ts(stream) or time.time()) - hours * 3600
+    for bucket in rollups.recent_buckets(stream, label):
+        if bucket["bucket_start"] + seconds > window_start:
+            merged[bucket["RowKey"]] = bucket  # Memoria gana: valores finales / bucket abierto
+    history = [
+        {k: v for k, v in merged[key].items() if k not in ("PartitionKey", "RowKey")}
+        for key in sorted(merged, reverse=True)  # RowKey invertido descendente = ASC
+        if since is None or merged[key]["bucket_start"] >= since
+    ]
+    cursor = since
+    if persisted and (since is None or persisted[-1]["bucket_start"] > since):
+        cursor = persisted[-1]["bucket_start"]
+    return {"hours": hours, "resolution": label, "count": len(history), "history": history, "cursor": cursor}
+
+
 @app.get("/flow", response_model=dict, tags=["Flow"])
-async def get_flow(limit: int = Query(default=8000, ge=1, le=20000)):
-    """Retorna los últimos 'limit' registros de flow. Con caché de 60s."""
-    cache_key = f"flow_{limit}"
-    now = datetime.now(timezone.utc)
+async def get_flow(
+    response: Response,
+    limit: int = Query(default=8000, ge=1, le=20000),
+    points: int = Query(default=_FLOW_DEFAULT_POINTS, ge=10, le=20000),
+    resolution: Optional[int] = Query(default=None, ge=1, le=3600),
+    method: str = Query(default="minmax"),
+    hours: Optional[int] = Query(default=None, ge=1, le=168),
+    since: Optional[float] = Query(default=None, ge=0),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Retorna los últimos 'limit' registros de flow: memoria, o Azure con caché de 60s.
 
-    if cache_key in _flow_cache:
-        cache_age = (now - _flow_cache_time.get(cache_key, now)).total_seconds()
-        if cache_age < _FLOW_CACHE_TTL:
-            return _flow_cache[cache_key]
+    El histórico se reduce a como máximo `points` puntos (o a buckets de
+    `resolution` segundos) con downsampling que conserva picos (minmax / lttb).
 
-    try:
-        history = storage_client.get_flow(limit=limit)
+    Con `hours`, devuelve en su lugar los rollups OHLC (10s / 1m / 5m) de las
+    últimas `hours` horas, con resolución elegida para no superar `points`.
+
+    Con `since` (cursor Unix de la respuesta anterior), solo los registros
+    posteriores; la respuesta incluye el nuevo `cursor`.
+
+    Con `format=columnar` (o `Accept: application/vnd.columnar+json`), `history`
+    va en struct-of-arrays con timestamps epoch.
+
+    ETag = cursor + nº de registros: con If-None-Match coincidente, 304 sin
+    downsampling ni serialización.
+    """
+    columnar = _columnar_requested(fmt, accept)
+    if hours is not None:
+        try:
+            payload = await _rollup_history("flow", hours, points, since)
+            # El bucket abierto cambia sin mover el cursor: su last_ts entra en la versión
+            last_ts = payload["history"][-1].get("last_ts") if payload["history"] else None
+            etag = _etag("flow", f"hours={hours}&points={points}&since={since}&columnar={columnar}", (payload["cursor"], payload["count"], last_ts))
+            return _conditional(etag, if_none_match, response, lambda: _history_response(payload, "history", columnar))
+        except Exception as e:
+            http_requests_total.labels(method="GET", endpoint="/flow", status="500").inc()
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if method not in DOWNSAMPLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(DOWNSAMPLING_METHODS)}")
+
+    cache_key = f"limit={limit}&points={points}&resolution={resolution}&method={method}&since={since}"
+    etag_params = f"{cache_key}&columnar={columnar}"
+
+    history = recent_history.flow(limit, since)
+    if history is not None:
+        cursor = _next_cursor(history[-1:], since)
+
+        def _build():
+            reduced = _downsample_flow(history, points, resolution, method)
+            return _history_response({"limit": limit, "count": len(reduced), "history": reduced, "cursor": cursor}, "history", columnar)
+
+        return _conditional(_etag("flow", etag_params, (cursor, len(history))), if_none_match, response, _build)
+
+    async def _load() -> dict:
         # history ya viene ASC (cronológico) de storage_client
-        result = {"limit": limit, "count": len(history), "history": history}
-        _flow_cache[cache_key] = result
-        _flow_cache_time[cache_key] = now
-        return result
+        history = await async_storage.get_flow(limit=limit, since=since)
+        cursor = _next_cursor(history[-1:], since)
+        history = _downsample_flow(history, points, resolution, method)
+        return {"limit": limit, "count": len(history), "history": history, "cursor": cursor}
+
+    try:
+        result = await read_cache.get_or_load("flow", cache_key, _load, ttl=_FLOW_CACHE_TTL)
+        etag = _etag("flow", etag_params, (result["cursor"], result["count"]))
+        return _conditional(etag, if_none_match, response, lambda: _history_response(result, "history", columnar))
     except Exception as e:
         http_requests_total.labels(method="GET", endpoint="/flow", status="500").inc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -452,31 +740,11 @@ async def receive_gamma(request: Request, background_tasks: BackgroundTasks):
     try:
         data = await request.json()
         
-        logger.info(
-            f"🌡️ Gamma metrics received: "
-            f"NetGEX={data.get('net_gex', 0):.3f}, "
-            f"Regime={data.get('gamma_regime', 0):.3f}, "
-            f"Pinning={data.get('pinning_risk', 0):.3f}"
-        )
-        
-        # ✅ OPT 1: Broadcast FIRST (immediate response)
-        await signalr_rest.broadcast_async(
-            hub_name="spyoptions",
-            event_name="gammaUpdate",
-            data=data
-        )
-        
-        # ✅ OPT 1: Background persistence (non-blocking)
-        background_tasks.add_task(storage_client.save_gamma_metrics, data)
+        prepared = _prepare_gamma(data)
+        await _dispatch_ingest([prepared], background_tasks)
         
         http_requests_total.labels(method="POST", endpoint="/gamma", status="201").inc()
-        return {
-            "status": "accepted",
-            "timestamp": data.get("timestamp"),
-            "net_gex": data.get("net_gex"),
-            "gamma_regime": data.get("gamma_regime"),
-            "pinning_risk": data.get("pinning_risk")
-        }
+        return prepared.response
         
     except Exception as e:
         logger.error(f"❌ Error processing gamma metrics: {e}")
@@ -484,6 +752,90 @@ async def receive_gamma(request: Request, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ─────────────────────────────────────────────
+#  BATCH INGEST (detector PUBLISH_MODE=batch)
+# ─────────────────────────────────────────────
+
+def _rejection_detail(error: Exception) -> str:
+    """Mensaje corto de rechazo para IngestRecordStatus.detail."""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+            for err in error.errors()
+        )
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return str(error)
+
+
+@app.post("/ingest/batch", response_model=IngestBatchResponse, tags=["Ingest"])
+async def ingest_batch(envelope: IngestBatch, background_tasks: BackgroundTasks):
+    """
+    Recibe en un solo POST todos los registros de un scan del detector
+    (spymarket, flow, gamma, anomalies).
+
+    Cada registro se valida por separado (estado por registro); los válidos se
+    difunden por SignalR en una pasada y se persisten en un único BackgroundTask.
+    """
+    prepared: List[_PreparedIngest] = []
+    results: List[IngestRecordStatus] = []
+
+    def _accept(channel: str, index: int) -> None:
+        results.append(IngestRecordStatus(channel=channel, index=index, status="accepted"))
+
+    def _reject(channel: str, index: int, error: Exception) -> None:
+        detail = _rejection_detail(error)
+        logger.warning(f"⚠️ /ingest/batch rejected {channel}[{index}]: {detail}")
+        results.append(IngestRecordStatus(channel=channel, index=index, status="rejected", detail=detail))
+
+    try:
+        for index, record in enumerate(envelope.spymarket):
+            try:
+                prepared.append(await _prepare_spymarket(record))
+                _accept("spymarket", index)
+            except Exception as e:
+                _reject("spymarket", index, e)
+
+        for index, record in enumerate(envelope.flow):
+            try:
+                prepared.append(_prepare_flow(FlowSnapshot.model_validate(record)))
+                _accept("flow", index)
+            except Exception as e:
+                _reject("flow", index, e)
+
+        for index, record in enumerate(envelope.gamma):
+            try:
+                GammaMetrics.model_validate(record)
+                prepared.append(_prepare_gamma(record))
+                _accept("gamma", index)
+            except Exception as e:
+                _reject("gamma", index, e)
+
+        valid_anomalies: List[AnomaliesSnapshot] = []
+        for index, record in enumerate(envelope.anomalies):
+            try:
+                valid_anomalies.append(AnomaliesSnapshot.model_validate(record))
+                _accept("anomalies", index)
+            except Exception as e:
+                _reject("anomalies", index, e)
+        if valid_anomalies:
+            prepared.append(_prepare_anomalies(valid_anomalies, len(valid_anomalies)))
+
+        await _dispatch_ingest(prepared, background_tasks)
+
+    except Exception as e:
+        logger.error(f"❌ Error processing ingest batch: {e}")
+        http_requests_total.labels(method="POST", endpoint="/ingest/batch", status="500").inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for result in results:
+        ingest_batch_records_total.labels(channel=result.channel, status=result.status).inc()
+
+    accepted = sum(1 for result in results if result.status == "accepted")
+    http_requests_total.labels(method="POST", endpoint="/ingest/batch", status="201").inc()
+    return IngestBatchResponse(accepted=accepted, rejected=len(results) - accepted, results=results)
+
+
 # ─────────────────────────────────────────────
 #  VOLUMES
 # ─────────────────────────────────────────────
@@ -491,14 +843,22 @@ async def receive_gamma(request: Request, background_tasks: BackgroundTasks):
 
 
 @app.get("/gamma/gamma_snap", tags=["Gamma"])
-async def get_gamma_snap(limit: int = Query(default=1, ge=1, le=100)):
+async def get_gamma_snap(
+    response: Response,
+    limit: int = Query(default=1, ge=1, le=100),
+    since: Optional[float] = Query(default=None, ge=0),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
     """
-    Historical gamma metrics snapshot (last N records).
+    Historical gamma metrics snapshot (last N records, only those after `since` if given).
     Compatible with frontend cache pattern (similar to /anomalies/anom_snap).
     
     Returns:
         {
             "count": int,
+            "cursor": float,  # Unix ts of the newest record (pass as `since` next time)
             "gamma_metrics": [
                 {
                     "timestamp": str,
@@ -510,17 +870,12 @@ async def get_gamma_snap(limit: int = Query(default=1, ge=1, le=100)):
             ]
         }
     """
-    cache_key = f"gamma_snap_{limit}"
-    now = datetime.now(timezone.utc)
-    
-    # Caché 30s (consistente con anomalies)
-    if cache_key in _anomalies_cache:
-        cache_age = (now - _anomalies_cache_time.get(cache_key, now)).total_seconds()
-        if cache_age < _ANOMALIES_CACHE_TTL:
-            return _anomalies_cache[cache_key]
-    
-    try:
-        raw_gamma = storage_client.get_gamma_metrics(limit=limit)
+    columnar = _columnar_requested(fmt, accept)
+
+    async def _load() -> dict:
+        raw_gamma = recent_history.gamma(limit, since)
+        if raw_gamma is None:
+            raw_gamma = await async_storage.get_gamma_metrics(limit=limit, since=since)
         
         # Filtrar campos para optimizar payload
         clean_gamma = [
@@ -536,16 +891,19 @@ async def get_gamma_snap(limit: int = Query(default=1, ge=1, le=100)):
         
         response = {
             "count": len(clean_gamma),
-            "gamma_metrics": clean_gamma
+            "gamma_metrics": clean_gamma,
+            "cursor": _next_cursor(clean_gamma, since),
         }
-        
-        # Actualizar caché
-        _anomalies_cache[cache_key] = response
-        _anomalies_cache_time[cache_key] = now
-        
-        logger.info(f"📊 GET /gamma/gamma_snap: {len(clean_gamma)} registros (cache={cache_key})")
-        http_requests_total.labels(method="GET", endpoint="/gamma/gamma_snap", status="200").inc()
+        logger.info(f"📊 GET /gamma/gamma_snap: {len(clean_gamma)} registros (limit={limit})")
         return response
+
+    try:
+        # Caché 30s (consistente con anomalies)
+        cache_key = f"limit={limit}&since={since}"
+        result = await read_cache.get_or_load("gamma", cache_key, _load, ttl=_ANOMALIES_CACHE_TTL)
+        http_requests_total.labels(method="GET", endpoint="/gamma/gamma_snap", status="200").inc()
+        etag = _etag("gamma", f"{cache_key}&columnar={columnar}", (result["cursor"], result["count"]))
+        return _conditional(etag, if_none_match, response, lambda: _history_response(result, "gamma_metrics", columnar))
         
     except Exception as e:
         logger.error(f"❌ Error get_gamma_snap: {e}")
@@ -553,12 +911,23 @@ async def get_gamma_snap(limit: int = Query(default=1, ge=1, le=100)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/volumes", response_model=dict, tags=["Volumes"])
-async def get_volumes(hours: int = Query(default=120, ge=1, le=168), limit: int = Query(default=4000, ge=1, le=8000)):
-    """Retorna el historial de volúmenes."""
+async def get_volumes(
+    hours: int = Query(default=120, ge=1, le=168),
+    limit: int = Query(default=4000, ge=1, le=8000),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+):
+    """Retorna el historial de volúmenes. Con caché de 60s. Opcional: format=columnar."""
+    columnar = _columnar_requested(fmt, accept)
+
+    async def _load() -> dict:
+        history = await async_storage.get_volumes(hours=hours, max_results=limit)
+        return {"hours": hours, "limit": limit, "count": len(history), "history": history}
+
     try:
-        history = storage_client.get_volumes(hours=hours, max_results=limit)
+        result = await read_cache.get_or_load("volumes", f"hours={hours}&limit={limit}", _load, ttl=_VOLUMES_CACHE_TTL)
         http_requests_total.labels(method="GET", endpoint="/volumes", status="200").inc()
-        return {"hours": hours, "limit": limit, "count": len(history), "history": history}
+        return _history_response(result, "history", columnar)
     except Exception as e:
         http_requests_total.labels(method="GET", endpoint="/volumes", status="500").inc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -569,19 +938,44 @@ async def get_volumes(hours: int = Query(default=120, ge=1, le=168), limit: int
 # ─────────────────────────────────────────────
 
 @app.get("/volumes/snap_last_4h", tags=["Volumes"])
-async def get_volumes_snap_last_4h(hours: int = Query(default=72), limit: int = Query(default=4000)):
+async def get_volumes_snap_last_4h(
+    hours: int = Query(default=72),
+    limit: int = Query(default=4000),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+):
     """Alias para compatibilidad con frontend"""
-    return await get_volumes(hours=hours, limit=limit)
+    return await get_volumes(hours=hours, limit=limit, fmt=fmt, accept=accept)
 
 @app.get("/flow/Flow_snap_last_4h", tags=["Flow"])
-async def get_flow_snap_last_4h(limit: int = Query(default=4000, ge=1, le=12000)):
+async def get_flow_snap_last_4h(
+    response: Response,
+    limit: int = Query(default=4000, ge=1, le=12000),
+    points: int = Query(default=_FLOW_DEFAULT_POINTS, ge=10, le=20000),
+    resolution: Optional[int] = Query(default=None, ge=1, le=3600),
+    method: str = Query(default="minmax"),
+    hours: Optional[int] = Query(default=None, ge=1, le=168),
+    since: Optional[float] = Query(default=None, ge=0),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
     """Alias para compatibilidad con frontend"""
-    return await get_flow(limit=limit)
+    return await get_flow(
+        response=response, limit=limit, points=points, resolution=resolution, method=method,
+        hours=hours, since=since, fmt=fmt, accept=accept, if_none_match=if_none_match,
+    )
 
 @app.get("/anomalies/anom_snap", tags=["Anomalies"])
-async def get_anomalies_snap_last_4h(hours: int = Query(default=4), limit: int = Query(default=20)):
+async def get_anomalies_snap_last_4h(
+    response: Response,
+    hours: int = Query(default=4),
+    limit: int = Query(default=20),
+    since: Optional[float] = Query(default=None, ge=0),
+    if_none_match: Optional[str] = Header(default=None),
+):
     """Alias para compatibilidad con frontend — últimas 4h"""
-    return await get_anomalies(hours=hours, limit=limit)
+    return await get_anomalies(hours=hours, limit=limit, since=since, response=response, if_none_match=if_none_match)
 
 
 # ─────────────────────────────────────────────
@@ -600,15 +994,12 @@ async def _process_tv_signal(data: dict):
     """
     try:
         # Broadcast a SignalR
-        await signalr_rest.broadcast_async(
-            hub_name="spyoptions",
-            event_name="tvSignal",
-            data=data
-        )
+        await broadcaster.publish([("tvSignal", data)])
         logger.info(f"📡 Signal broadcasted: {data.get('action')}")
         
         # Persistir en storage
-        storage_client.save_market_event(data)
+        await async_storage.save_market_event(data)
+        read_cache.invalidate("events")
         logger.info(f"💾 Signal saved: {data.get('action')} @ {data.get('price')}")
         
     except Exception as e:
@@ -653,16 +1044,20 @@ async def tradingview_webhook(request: Request, background_tasks: BackgroundTask
 
 
 @app.get("/api/market-events", tags=["Webhooks"])
-async def get_market_events(limit: int = Query(default=100, ge=1, le=500)):
+async def get_market_events(limit: int = Query(default=100, ge=1, le=500), since: Optional[float] = Query(default=None, ge=0)):
     """
-    Retrieves historical market events (signals).
+    Retrieves historical market events (signals), only those after `since` if given.
     """
-    try:
-        events = storage_client.get_market_events(limit=limit)
+    async def _load() -> dict:
+        events = await async_storage.get_market_events(limit=limit, since=since)
         return {
             "count": len(events),
-            "events": events
+            "events": events,
+            "cursor": _next_cursor(events, since),
         }
+
+    try:
+        return await read_cache.get_or_load("events", f"limit={limit}&since={since}", _load, ttl=_EVENTS_CACHE_TTL)
     except Exception as e:
         logger.error(f"❌ Error in get_market_events: {e}")
         raise HTTPException(status_code=500, detail=str(e))
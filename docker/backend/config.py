@@ -36,6 +36,55 @@ class Settings(BaseSettings):
     strikes_range_percent: float = 1.0
     scan_interval_seconds: int = 60
     
+    # Storage (executor acotado para el SDK síncrono de Azure Tables)
+    storage_executor_workers: int = 8
+    
+    # Storage write-behind (save_* agrupados en entity-group transactions)
+    storage_write_behind: bool = True
+    storage_flush_interval_seconds: float = 1.0
+    storage_flush_batch_size: int = 100  # Máximo de Azure por transacción
+    storage_write_buffer_max: int = 5000
+    
+    # Storage backend: 'azure' (Table Storage) | 'sqlite' (embebido WAL, single-node/offline)
+    storage_backend: str = "azure"
+    storage_sqlite_path: str = "data/spy_options.db"
+    
+    # Storage PartitionKey: 'single' ('SPY') | 'daily' ('SPY|YYYYMMDD', repartition con scripts/migrar.py)
+    storage_partition_scheme: str = "single"
+    storage_partition_max_lookback_days: int = 31  # Fan-out máximo (días) de lecturas sin límite inferior
+    
+    # SignalR broadcaster (coalescing por tick + fan-out acotado)
+    signalr_coalesce_window_ms: int = 20
+    signalr_max_concurrency: int = 8
+    
+    # Read cache (GET endpoints)
+    read_cache_max_mb: int = 64
+    read_cache_stale_seconds: float = 30.0
+    
+    # Histórico reciente en memoria (capacidad de los ring buffers por stream)
+    history_flow_capacity: int = 20000
+    history_spymarket_capacity: int = 20000
+    history_gamma_capacity: int = 2000
+    history_anomalies_capacity: int = 2000
+    # Segundos sin ingest local (horario de mercado) tras los que se lee de Azure
+    history_max_ingest_lag_seconds: float = 30.0
+    
+    # Retención por tabla en días (services/retention.py); 0 = conservar todo
+    retention_days_market: int = 7
+    retention_days_flow: int = 7
+    retention_days_volumes: int = 7
+    retention_days_anomalies: int = 30
+    retention_days_gamma: int = 30
+    retention_days_events: int = 365
+    retention_days_rollup_10s: int = 7
+    retention_days_rollup_1m: int = 90
+    retention_days_rollup_5m: int = 0
+    retention_max_parallel_batches: int = 4
+    
+    # Archivo frío (services/archive.py): los días expirados se compactan a Parquet antes de purgarse
+    archive_enabled: bool = False
+    archive_path: str = "data/archive"  # Volumen compartido entre réplicas
+    
     # Logging (from bot-config configmap)
     log_level: str = "INFO"
     
@@ -29,6 +29,13 @@ anomalies_current = Gauge(
     'Current anomalies in storage'
 )
 
+# Batch Ingest Metrics
+ingest_batch_records_total = Counter(
+    'ingest_batch_records_total',
+    'Records received through /ingest/batch',
+    ['channel', 'status']
+)
+
 # SignalR Metrics
 signals_broadcasted_total = Counter(
     'signals_broadcasted_total',
@@ -54,9 +61,132 @@ storage_operation_duration_seconds = Histogram(
     ['operation']
 )
 
+storage_executor_inflight = Gauge(
+    'storage_executor_inflight',
+    'Storage operations submitted to the async storage executor (running + queued)'
+)
+
+storage_flush_duration_seconds = Histogram(
+    'storage_flush_duration_seconds',
+    'Latency of write-behind entity-group transactions',
+    ['table']
+)
+
+storage_flush_entities = Histogram(
+    'storage_flush_entities',
+    'Entities per write-behind transaction',
+    ['table'],
+    buckets=(1, 5, 10, 25, 50, 75, 100)
+)
+
+storage_write_buffer_pending = Gauge(
+    'storage_write_buffer_pending',
+    'Entities waiting in the write-behind buffer'
+)
+
+storage_write_buffer_dropped_total = Counter(
+    'storage_write_buffer_dropped_total',
+    'Entities dropped because the write-behind buffer was full',
+    ['table']
+)
+
+gamma_walls_legacy_decodes_total = Counter(
+    'gamma_walls_legacy_decodes_total',
+    'gamma_walls values decoded with the legacy str()/literal_eval path (pending backfill)'
+)
+
+# Retention Metrics
+retention_deleted_total = Counter(
+    'retention_deleted_total',
+    'Entities deleted by the retention engine',
+    ['table']
+)
+
+retention_batch_failures_total = Counter(
+    'retention_batch_failures_total',
+    'Retention delete transactions that failed and fell back to per-entity deletes',
+    ['table']
+)
+
+retention_run_duration_seconds = Histogram(
+    'retention_run_duration_seconds',
+    'Duration of a retention pass over one table',
+    ['table'],
+    buckets=[1, 5, 15, 60, 300, 900, 3600]
+)
+
+retention_last_success_timestamp = Gauge(
+    'retention_last_success_timestamp',
+    'Unix time of the last completed retention pass per table',
+    ['table']
+)
+
+# Archive (cold tier) Metrics
+archive_rows_written_total = Counter(
+    'archive_rows_written_total',
+    'Rows compacted from the table into daily Parquet archive files',
+    ['table']
+)
+
+archive_rows_read_total = Counter(
+    'archive_rows_read_total',
+    'Rows read back from the Parquet archive by tiered queries',
+    ['table']
+)
+
+# Read Cache Metrics
+read_cache_requests_total = Counter(
+    'read_cache_requests_total',
+    'Read cache lookups by result (hit, stale, miss, coalesced)',
+    ['cache', 'result']
+)
+
+read_cache_load_duration_seconds = Histogram(
+    'read_cache_load_duration_seconds',
+    'Latency of read cache loads (backing storage query)',
+    ['cache']
+)
+
+read_cache_bytes = Gauge(
+    'read_cache_bytes',
+    'Estimated size of the read cache in bytes'
+)
+
+read_cache_evictions_total = Counter(
+    'read_cache_evictions_total',
+    'Read cache entries evicted by the LRU byte limit',
+    ['cache']
+)
+
+# Recent History (ring buffers) Metrics
+recent_history_records = Gauge(
+    'recent_history_records',
+    'Records held in the in-memory recent history ring buffer',
+    ['stream']
+)
+
+recent_history_reads_total = Counter(
+    'recent_history_reads_total',
+    'History reads by source (memory ring buffer or storage fallback)',
+    ['stream', 'source']
+)
+
+# Rollup Metrics
+rollup_buckets_closed_total = Counter(
+    'rollup_buckets_closed_total',
+    'Rollup buckets closed and persisted',
+    ['stream', 'resolution']
+)
+
 # Egress Metrics (Software Layer)
 signalr_broadcast_latency_seconds = Histogram(
     'signalr_broadcast_latency_seconds',
     'Latency of SignalR broadcast operations',
     ['event_name']
 )
+
+signalr_events_coalesced_total = Counter(
+    'signalr_events_coalesced_total',
+    'SignalR state events superseded by a newer value within the same tick',
+    ['event_name']
+)
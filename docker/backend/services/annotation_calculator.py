@@ -4,18 +4,31 @@ Annotation Calculator Service
 
 Responsabilidad:
 - Calcular índices de marcadores de mercado (15:30 open, 22:00-22:15 close)
-- Usar tabla spymarket como fuente de verdad temporal
-- Cachear resultados para optimización (15 min refresh)
+- Usar timestamps de spymarket como fuente de verdad temporal
 
 Filosofía:
 - Separation of concerns: timestamps de spymarket, no de flowhistory
 - Robustez: marcadores funcionan aunque flow esté vacío
-- Eficiencia: cálculo cada 15 min, no cada frame
+- Eficiencia: índice en memoria (array ordenado de epochs), alimentado en cada
+  ingest de spymarket; cada cálculo es O(log n) con bisect, sin query a storage
+  (la ventana se hidrata una vez en el arranque, en background desde el
+  lifespan, y se une con lo ya recibido por ingest)
+- Frescura: el índice solo ve el ingest de ESTA réplica. calculate() vuelve a
+  hidratar desde storage si en horario de mercado el último epoch tiene más
+  de `_STALE_SECONDS` (el ingest llega a otra réplica)
+
+Índices: posiciones dentro de las últimas `window_hours` horas de spymarket,
+más reciente primero (mismo orden que StorageClient.get_spymarket).
 """
 
-from datetime import datetime, timezone, timedelta
-from typing import Dict, Optional, List
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, Optional
 import logging
+import time
+
+from utils.timezone_utils import is_market_hours_cet
 
 logger = logging.getLogger(__name__)
 
@@ -25,71 +38,98 @@ class AnnotationCalculator:
     Calcula índices de annotations basándose en timestamps de spymarket.
     
     Estrategia:
-    1. Check cada 15 min: ¿debemos mostrar marcadores ahora?
-    2. Si sí → calcular índices basados en spymarket timestamps
+    1. record(ts) en cada ingest de spymarket → array ordenado de epochs (int)
+    2. ¿Debemos mostrar marcadores ahora? Si sí → bisect sobre el array
     3. Retornar índices o dict vacío
     """
     
-    def __init__(self, storage_client):
+    # Compactar el array cuando hay al menos este nº de epochs fuera de ventana
+    _PRUNE_BATCH = 1024
+    
+    # Antigüedad máxima del último epoch en horario de mercado (el detector escanea cada ~2s)
+    _STALE_SECONDS = 10
+    
+    def __init__(self, storage_client, window_hours: int = 4):
         self.storage = storage_client
+        self.window_seconds = window_hours * 3600
+        self._epochs = array('q')  # Epochs (segundos) de spymarket, orden ASC
         self.last_indices: Dict[str, int] = {}
         self.last_check: Optional[datetime] = None
-        self.cache_duration = timedelta(minutes=15)  # Refresh cada 15 min
+        self._last_refresh = 0.0  # time.monotonic() de la última hidratación por índice obsoleto
+    
+    def record(self, ts: float) -> None:
+        """Añade el timestamp de un snapshot de spymarket (ingest)."""
+        epoch = int(ts)
+        epochs = self._epochs
+        if not epochs or epoch > epochs[-1]:
+            epochs.append(epoch)
+        elif epochs[bisect_left(epochs, epoch)] != epoch:
+            insort(epochs, epoch)  # Fuera de orden (raro)
+        else:
+            return  # Ya presente (upsert del mismo RowKey)
+        
+        stale = bisect_left(epochs, epochs[-1] - self.window_seconds)
+        if stale >= self._PRUNE_BATCH:
+            del epochs[:stale]
+    
+    async def hydrate(self, storage) -> None:
+        """
+        Carga la ventana desde storage (arranque) y la une con los epochs ya
+        recibidos por ingest mientras la query estaba en curso.
+        
+        Args:
+            storage: AsyncStorageClient (get_spymarket awaitable)
+        """
+        try:
+            spy_history = await storage.get_spymarket(hours=self.window_seconds // 3600)
+        except Exception as e:
+            logger.error(f"Error fetching spymarket history: {e}")
+            return
+        loaded = {int(self.storage._rev_key_to_timestamp(item['RowKey'])) for item in spy_history}
+        self._epochs = array('q', sorted(loaded.union(self._epochs)))
+        logger.info(f"Annotation index hydrated: {len(self._epochs)} spymarket timestamps")
+    
+    def is_stale(self) -> bool:
+        """True si en horario de mercado el índice no recibe ingest reciente."""
+        if not is_market_hours_cet():
+            return False
+        return not self._epochs or time.time() - self._epochs[-1] > self._STALE_SECONDS
+    
+    async def calculate(self, storage, force: bool = False) -> Dict[str, int]:
+        """
+        check_and_calculate() con el índice al día: si está obsoleto, vuelve a
+        hidratar desde storage (como mucho una vez cada `_STALE_SECONDS`).
+        
+        Args:
+            storage: AsyncStorageClient (get_spymarket awaitable)
+        """
+        if self.is_stale() and time.monotonic() - self._last_refresh >= self._STALE_SECONDS:
+            self._last_refresh = time.monotonic()
+            await self.hydrate(storage)
+        return self.check_and_calculate(force)
     
     def check_and_calculate(self, force: bool = False) -> Dict[str, int]:
         """
-        Calcula índices de annotations si es necesario.
+        Calcula índices de annotations (O(log n), sin query a storage).
+        Con varias réplicas usar calculate(), que refresca un índice obsoleto.
         
         Args:
-            force: Forzar recálculo ignorando caché
+            force: Se mantiene por compatibilidad (el cálculo ya no se cachea)
             
         Returns:
             Dict con índices: {'marketOpenIndex': 234, 'closeZoneStart': 890, ...}
             o dict vacío si no hay marcadores activos
         """
         now = datetime.now(timezone.utc)
-        
-        # Optimización: usar caché si no han pasado 15 min
-        if not force and self.last_check:
-            time_since_check = (now - self.last_check).total_seconds()
-            if time_since_check < self.cache_duration.total_seconds():
-                logger.debug(f"Using cached annotations (age: {time_since_check:.0f}s)")
-                return self.last_indices
-        
         self.last_check = now
         
-        # Obtener timestamps de spymarket (fuente de verdad temporal)
-        try:
-            spy_history = self.storage.get_spymarket(hours=4)
-            if not spy_history:
-                logger.warning("No spymarket history available for annotation calculation")
-                self.last_indices = {}
-                return {}
-        except Exception as e:
-            logger.error(f"Error fetching spymarket history: {e}")
-            self.last_indices = {}
-            return {}
-        
-        # Convertir timestamps a datetime objects
-        try:
-            timestamps = [
-                datetime.fromisoformat(item['timestamp'].replace('Z', '+00:00'))
-                if isinstance(item['timestamp'], str)
-                else item['timestamp']
-                for item in spy_history
-            ]
-        except Exception as e:
-            logger.error(f"Error parsing timestamps: {e}")
-            self.last_indices = {}
-            return {}
-        
-        if not timestamps:
-            logger.warning("Empty timestamps array after parsing")
+        if not self._epochs:
+            logger.warning("No spymarket history available for annotation calculation")
             self.last_indices = {}
             return {}
         
         # Calcular índices basados en hora actual (CET assumed in detector)
-        indices = self._calculate_indices(now, timestamps)
+        indices = self._calculate_indices(now)
         
         self.last_indices = indices
         
@@ -100,7 +140,7 @@ class AnnotationCalculator:
         
         return indices
     
-    def _calculate_indices(self, now: datetime, timestamps: List[datetime]) -> Dict[str, int]:
+    def _calculate_indices(self, now: datetime) -> Dict[str, int]:
         """
         Lógica de cálculo de índices.
         Usa conversión dinámica ET <-> CET para soportar DST.
@@ -128,7 +168,7 @@ class AnnotationCalculator:
             target_open_et = now_et.replace(hour=9, minute=30, second=0, microsecond=0)
             target_open_cet = target_open_et.astimezone(CET)
             
-            open_idx = self._find_closest_index(timestamps, target_open_cet)
+            open_idx = self._find_closest_index(target_open_cet)
             
             if open_idx >= 0:
                 indices['marketOpenIndex'] = open_idx
@@ -142,8 +182,8 @@ class AnnotationCalculator:
             target_close_start_cet = target_close_start_et.astimezone(CET)
             target_close_end_cet = target_close_end_et.astimezone(CET)
             
-            start_idx = self._find_closest_index(timestamps, target_close_start_cet)
-            end_idx = self._find_closest_index(timestamps, target_close_end_cet)
+            start_idx = self._find_closest_index(target_close_start_cet)
+            end_idx = self._find_closest_index(target_close_end_cet)
             
             if start_idx >= 0 and end_idx >= 0:
                 indices['closeZoneStart'] = start_idx
@@ -152,32 +192,32 @@ class AnnotationCalculator:
         
         return indices
     
-    def _find_closest_index(self, timestamps: List[datetime], target: datetime) -> int:
+    def _find_closest_index(self, target: datetime) -> int:
         """
-        Encuentra el índice del timestamp más cercano al objetivo.
+        Encuentra el índice del timestamp más cercano al objetivo (bisect, O(log n)).
         
         Args:
-            timestamps: Lista de datetime objects
             target: Timestamp objetivo
             
         Returns:
-            Índice (0-based) o -1 si no hay match cercano (>30 min)
+            Índice (0-based, más reciente primero) o -1 si no hay match cercano (>30 min).
+            En empate gana el timestamp más reciente.
         """
-        if not timestamps:
+        epochs = self._epochs
+        n = len(epochs)
+        if n == 0:
             return -1
         
-        min_diff = float('inf')
-        closest_idx = -1
+        # Ventana: últimas N horas respecto al registro más reciente
+        lo = bisect_left(epochs, epochs[-1] - self.window_seconds)
+        t = target.timestamp()
+        pos = bisect_left(epochs, t, lo)
         
-        for i, ts in enumerate(timestamps):
-            try:
-                diff = abs((ts - target).total_seconds())
-                if diff < min_diff:
-                    min_diff = diff
-                    closest_idx = i
-            except Exception as e:
-                logger.warning(f"Error comparing timestamp at index {i}: {e}")
-                continue
+        # Candidatos: vecinos a izquierda y derecha del punto de inserción
+        candidates = [p for p in (pos, pos - 1) if lo <= p < n]
+        closest = min(candidates, key=lambda p: (abs(epochs[p] - t), -p))
+        min_diff = abs(epochs[closest] - t)
+        closest_idx = n - 1 - closest
         
         # Tolerancia: 30 minutos (1800 segundos)
         # Si el punto más cercano está a más de 30 min, no es válido
@@ -188,8 +228,4 @@ class AnnotationCalculator:
             return -1
         
         return closest_idx
-    
-    def invalidate_cache(self):
-        """Fuerza recálculo en próxima llamada"""
-        self.last_check = None
-        logger.debug("Annotation cache invalidated")
+
@@ -0,0 +1,161 @@
+"""
+Archive - Tier frío: ficheros Parquet diarios con los datos que salen de la tabla.
+
+Tiers de almacenamiento:
+    caliente  ring buffers en memoria (services/recent_history.py)
+    templado  Azure Tables / SQLite (retención settings.retention_days_*)
+    frío      Parquet diario por tabla (este módulo)
+
+Con settings.archive_enabled, la retención (services/retention.py) compacta
+primero los días expirados en `{archive_path}/{tabla}/{YYYYMMDD}.parquet` y solo
+después los borra de la tabla. StorageClient enruta las lecturas con límite
+inferior anterior al archivo (query_window) a ambos tiers, así que los rangos
+largos se leen sin saber dónde vive cada día.
+
+- Un fichero por (tabla, día UTC), filas en orden cronológico, zstd. Las
+  estadísticas de RowKey por row group permiten filtrar rangos sin leer todo.
+- Escritura atómica (tmp + rename) e idempotente: si el día ya existe, se une
+  por RowKey con lo nuevo (una purga interrumpida se puede repetir).
+- Almacén: sistema de ficheros local (volumen compartido entre réplicas, o un
+  montaje de blob storage).
+
+Requiere pyarrow (dependencia opcional: sin él, archive_enabled falla al arrancar).
+"""
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = pq = None
+
+from metrics import archive_rows_written_total, archive_rows_read_total
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = ".parquet"
+
+
+def _rev_key(ts: float) -> str:
+    """RowKey invertido (mismo formato que StorageClient._to_rev_key_new)."""
+    return str(10**19 - 1 - int(ts * 10000000)).zfill(19)
+
+
+def _day_start(day: str) -> float:
+    return datetime.strptime(day, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+class ParquetArchive:
+    """Ficheros Parquet diarios por tabla bajo un directorio raíz."""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Directorio raíz del archivo (se crea al escribir)
+        """
+        if pq is None:
+            raise RuntimeError("archive_enabled requiere pyarrow (pip install pyarrow)")
+        self.root = root
+
+    def _path(self, table: str, day: str) -> str:
+        return os.path.join(self.root, table, day + _SUFFIX)
+
+    def days(self, table: str) -> List[str]:
+        """Días archivados de una tabla (YYYYMMDD, orden ascendente)."""
+        try:
+            names = os.listdir(os.path.join(self.root, table))
+        except FileNotFoundError:
+            return []
+        return sorted(name[: -len(_SUFFIX)] for name in names if name.endswith(_SUFFIX))
+
+    def archived_until(self, table: str) -> Optional[float]:
+        """
+        Fin (exclusivo) del último día archivado: lo anterior vive en el archivo.
+        Se lee del directorio en cada llamada (otra réplica puede haber archivado).
+        """
+        days = self.days(table)
+        if not days:
+            return None
+        return _day_start(days[-1]) + 86400
+
+    # --- ESCRITURA ---
+
+    def _write_day(self, table: str, day: str, rows: List[Dict[str, Any]]) -> None:
+        path = self._path(table, day)
+        merged = {row["RowKey"]: row for row in rows}
+        if os.path.exists(path):
+            for row in pq.read_table(path).to_pylist():
+                merged.setdefault(row["RowKey"], row)
+        # RowKey invertido descendente = orden cronológico
+        ordered = [merged[key] for key in sorted(merged, reverse=True)]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        pq.write_table(pa.Table.from_pylist(ordered), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        archive_rows_written_total.labels(table=table).inc(len(rows))
+        logger.info(f"🧊 Archive {table}/{day}: {len(rows)} registros ({len(ordered)} en el fichero)")
+
+    def compact(self, table: str, records: Iterable[Tuple[float, Dict[str, Any]]]) -> int:
+        """
+        Escribe registros (timestamp, entidad) en sus ficheros diarios.
+
+        Los registros de un mismo día deben llegar contiguos (p. ej. más recientes
+        primero, como StorageClient._scan): en memoria solo hay un día a la vez.
+
+        Returns:
+            Nº de registros archivados
+        """
+        total = 0
+        day: Optional[str] = None
+        rows: List[Dict[str, Any]] = []
+        for ts, entity in records:
+            entity_day = f"{datetime.fromtimestamp(ts, tz=timezone.utc):%Y%m%d}"
+            if entity_day != day:
+                if rows:
+                    self._write_day(table, day, rows)
+                    total += len(rows)
+                day, rows = entity_day, []
+            rows.append(dict(entity))
+        if rows:
+            self._write_day(table, day, rows)
+            total += len(rows)
+        return total
+
+    # --- LECTURA ---
+
+    def scan(
+        self,
+        table: str,
+        start_ts: float,
+        end_ts: Optional[float] = None,
+        select: Optional[List[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Registros archivados con start_ts <= ts < end_ts, más recientes primero.
+        Perezoso: solo se abre el fichero del día anterior si se sigue iterando.
+        """
+        first = f"{datetime.fromtimestamp(start_ts, tz=timezone.utc):%Y%m%d}"
+        last = None
+        if end_ts is not None:
+            last = f"{datetime.fromtimestamp(end_ts, tz=timezone.utc) - timedelta(microseconds=1):%Y%m%d}"
+        filters = [("RowKey", "<=", _rev_key(start_ts))]
+        if end_ts is not None:
+            filters.append(("RowKey", ">", _rev_key(end_ts)))
+
+        for day in reversed(self.days(table)):
+            if last is not None and day > last:
+                continue
+            if day < first:
+                break
+            path = self._path(table, day)
+            columns = None
+            if select is not None:
+                names = pq.read_schema(path).names
+                columns = [field for field in dict.fromkeys(list(select) + ["RowKey"]) if field in names]
+            rows = pq.read_table(path, columns=columns, filters=filters).to_pylist()
+            archive_rows_read_total.labels(table=table).inc(len(rows))
+            rows.reverse()
+            yield from rows
@@ -0,0 +1,130 @@
+"""
+Async Storage Client - Fachada awaitable sobre StorageClient.
+
+El SDK azure.data.tables es síncrono: llamarlo desde un endpoint `async def`
+bloquea el event loop (y con él los broadcasts SignalR) durante toda la query.
+AsyncStorageClient ejecuta cada operación en un ThreadPoolExecutor dedicado y
+acotado (settings.storage_executor_workers), de modo que:
+
+- El event loop nunca espera a Azure.
+- La concurrencia contra Azure queda limitada (no satura el pool HTTP del SDK
+  ni el threadpool por defecto de Starlette).
+
+Uso:
+    from services.async_storage import async_storage
+    history = await async_storage.get_flow(limit=4000)
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from models import AnomaliesSnapshot, SpymarketSnapshot, VolumesSnapshot
+from metrics import storage_executor_inflight
+from services.storage_client import StorageClient, storage_client
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStorageClient:
+    """Versiones awaitable de todos los métodos públicos de StorageClient."""
+
+    def __init__(self, storage: StorageClient, max_workers: int = 8):
+        self._storage = storage
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def storage(self) -> StorageClient:
+        """Cliente síncrono subyacente (para código que ya corre en un thread)."""
+        return self._storage
+
+    def start(self) -> None:
+        """Crea el executor acotado. Llamar desde FastAPI startup."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="storage",
+            )
+            logger.info(f"✅ Storage executor iniciado ({self._max_workers} workers)")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Detiene el executor. Llamar desde FastAPI shutdown."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            logger.info("Storage executor detenido")
+
+    async def _run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta `func` en el executor de storage sin bloquear el event loop."""
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        storage_executor_inflight.inc()
+        try:
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        finally:
+            storage_executor_inflight.dec()
+
+    # --- CONEXIÓN ---
+
+    async def connect(self) -> None:
+        await self._run(self._storage.connect)
+
+    # --- ESCRITURA ---
+
+    async def save_spymarket(self, market: SpymarketSnapshot) -> bool:
+        return await self._run(self._storage.save_spymarket, market)
+
+    async def save_flow(self, flow_data: dict) -> bool:
+        return await self._run(self._storage.save_flow, flow_data)
+
+    async def save_gamma_metrics(self, gamma: dict) -> bool:
+        return await self._run(self._storage.save_gamma_metrics, gamma)
+
+    async def save_anomalies(self, anomaly: AnomaliesSnapshot) -> bool:
+        return await self._run(self._storage.save_anomalies, anomaly)
+
+    async def save_volumes(self, volume: VolumesSnapshot) -> bool:
+        return await self._run(self._storage.save_volumes, volume)
+
+    async def save_rollup(self, alias: str, entity: dict) -> bool:
+        return await self._run(self._storage.save_rollup, alias, entity)
+
+    async def save_market_event(self, event: dict) -> bool:
+        return await self._run(self._storage.save_market_event, event)
+
+    # --- LECTURA ---
+
+    async def get_spymarket_latest(self) -> Dict:
+        return await self._run(self._storage.get_spymarket_latest)
+
+    async def get_spymarket(self, hours: int = 4) -> List[Dict]:
+        return await self._run(self._storage.get_spymarket, hours=hours)
+
+    async def get_flow(self, limit: int = 4000, since: Optional[float] = None) -> List[Dict]:
+        return await self._run(self._storage.get_flow, limit=limit, since=since)
+
+    async def get_anomalies(self, limit: int = 20, since: Optional[float] = None) -> List[Dict]:
+        return await self._run(self._storage.get_anomalies, limit=limit, since=since)
+
+    async def get_gamma_metrics(self, limit: int = 1, since: Optional[float] = None) -> List[Dict]:
+        return await self._run(self._storage.get_gamma_metrics, limit=limit, since=since)
+
+    async def get_volumes(self, hours: int = 72, max_results: int = 10000) -> List[Dict]:
+        return await self._run(self._storage.get_volumes, hours=hours, max_results=max_results)
+
+    async def get_market_events(self, limit: int = 100, since: Optional[float] = None) -> List[Dict]:
+        return await self._run(self._storage.get_market_events, limit=limit, since=since)
+
+    async def get_rollups(self, alias: str, since_ts: float, max_results: int = 10000) -> List[Dict]:
+        return await self._run(self._storage.get_rollups, alias, since_ts, max_results=max_results)
+
+    async def get_recent(self, alias: str, limit: int) -> List[Dict]:
+        return await self._run(self._storage.get_recent, alias, limit)
+
+
+# Singleton instance
+async_storage = AsyncStorageClient(storage_client, max_workers=settings.storage_executor_workers)
@@ -0,0 +1,145 @@
+"""
+SignalR Broadcaster - Multiplexor de broadcasts hacia Azure SignalR.
+
+Antes cada evento era un POST independiente, esperado en serie por el caller
+(create_anomaly hacía un await por anomalía). El broadcaster:
+
+- Acumula los eventos publicados durante una ventana corta
+  (settings.signalr_coalesce_window_ms) — el "tick" de ingesta.
+- Latest-value-wins para los canales de estado (marketState, gammaUpdate):
+  solo se envía el último valor del tick.
+- Agrupa las anomalías del tick en un único mensaje 'anomalyBatch' (lista).
+- Envía los mensajes resultantes de forma concurrente, con fan-out acotado
+  (settings.signalr_max_concurrency).
+
+El token JWT del hub se cachea en SignalRRestClient; la latencia de cada envío
+se registra en signalr_broadcast_latency_seconds{event_name}.
+
+Uso:
+    from services.broadcaster import broadcaster
+    await broadcaster.publish([("marketState", data), ("flow", flow_data)])
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from metrics import signalr_events_coalesced_total
+from services.signalr_rest import SignalRRestClient, signalr_rest
+
+logger = logging.getLogger(__name__)
+
+HUB_NAME = "spyoptions"
+
+# Canales de estado: solo importa el último valor del tick
+LATEST_WINS_EVENTS = ("marketState", "gammaUpdate")
+
+# Eventos agrupados: evento individual → mensaje batch (argumento = lista)
+BATCHED_EVENTS = {"anomalyDetected": "anomalyBatch"}
+
+Event = Tuple[str, Any]  # (event_name, data)
+
+
+class _Tick:
+    """Eventos pendientes de una ventana de coalescing."""
+
+    def __init__(self, done: asyncio.Future):
+        self.done = done
+        self.latest: Dict[str, Any] = {}
+        self.batches: Dict[str, List[Any]] = {}
+        self.ordered: List[Event] = []
+
+    def add(self, event_name: str, data: Any) -> None:
+        if event_name in LATEST_WINS_EVENTS:
+            if event_name in self.latest:
+                signalr_events_coalesced_total.labels(event_name=event_name).inc()
+            self.latest[event_name] = data
+        elif event_name in BATCHED_EVENTS:
+            self.batches.setdefault(BATCHED_EVENTS[event_name], []).append(data)
+        else:
+            self.ordered.append((event_name, data))
+
+    def messages(self) -> List[Event]:
+        return self.ordered + list(self.latest.items()) + list(self.batches.items())
+
+
+class SignalRBroadcaster:
+    """Coalescing por tick + envío concurrente acotado sobre SignalRRestClient."""
+
+    def __init__(
+        self,
+        client: SignalRRestClient,
+        hub_name: str = HUB_NAME,
+        window_seconds: float = 0.02,
+        max_concurrency: int = 8,
+    ):
+        """
+        Args:
+            client: Cliente REST de SignalR (broadcast_async)
+            hub_name: Hub destino
+            window_seconds: Ventana de coalescing (0 = solo la iteración actual del loop)
+            max_concurrency: Máximo de POST simultáneos hacia SignalR
+        """
+        self._client = client
+        self.hub_name = hub_name
+        self.window_seconds = window_seconds
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tick: Optional[_Tick] = None
+
+    async def publish(self, events: List[Event]) -> bool:
+        """
+        Añade eventos al tick actual y espera a que el tick se haya enviado.
+
+        Returns:
+            True si todos los mensajes del tick se enviaron correctamente
+        """
+        if not events:
+            return True
+
+        if self._tick is None:
+            loop = asyncio.get_running_loop()
+            self._tick = _Tick(loop.create_future())
+            loop.call_later(self.window_seconds, lambda: asyncio.ensure_future(self._flush()))
+
+        tick = self._tick
+        for event_name, data in events:
+            tick.add(event_name, data)
+        return await asyncio.shield(tick.done)
+
+    async def _flush(self) -> None:
+        tick, self._tick = self._tick, None
+        if tick is None:
+            return
+        try:
+            ok = await self._send_all(tick.messages())
+        except Exception as e:
+            logger.error(f"❌ Broadcaster flush error: {e}")
+            ok = False
+        if not tick.done.done():
+            tick.done.set_result(ok)
+
+    async def _send_all(self, messages: List[Event]) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _send(event_name: str, data: Any) -> bool:
+            async with self._semaphore:
+                return await self._client.broadcast_async(
+                    hub_name=self.hub_name, event_name=event_name, data=data
+                )
+
+        results = await asyncio.gather(*(_send(name, data) for name, data in messages))
+        return all(results)
+
+    async def close(self) -> None:
+        """Envía el tick pendiente. Llamar desde FastAPI shutdown (antes de cerrar httpx)."""
+        await self._flush()
+
+
+# Singleton instance
+broadcaster = SignalRBroadcaster(
+    signalr_rest,
+    window_seconds=settings.signalr_coalesce_window_ms / 1000,
+    max_concurrency=settings.signalr_max_concurrency,
+)
@@ -0,0 +1,178 @@
+"""
+Read Cache - Caché de lectura en memoria (pod-local) para los GET del backend.
+
+Sustituye los dicts sueltos de app.py (_flow_cache, _anomalies_cache, ...):
+
+- TTL por entrada (cada endpoint elige la suya).
+- LRU acotado por tamaño en bytes (tamaño estimado = JSON serializado).
+- Single-flight: con N peticiones concurrentes sobre la misma clave caducada
+  solo se lanza UNA query a Azure; las demás esperan su resultado.
+- Stale-while-revalidate: durante `stale_ttl` tras caducar se sirve el valor
+  anterior y se refresca en background.
+- invalidate(namespace) tras un ingest que deja obsoleto el dato.
+
+Claves: (namespace, key), p. ej. ("flow", "limit=4000"). El namespace es la
+etiqueta `cache` de las métricas.
+
+Uso:
+    from services.read_cache import read_cache
+    result = await read_cache.get_or_load("flow", f"limit={limit}", _load, ttl=60)
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from config import settings
+from metrics import (
+    read_cache_requests_total,
+    read_cache_load_duration_seconds,
+    read_cache_bytes,
+    read_cache_evictions_total,
+)
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]  # (namespace, key)
+Loader = Callable[[], Awaitable[Any]]
+
+
+class _Entry(NamedTuple):
+    value: Any
+    size: int
+    expires: float       # monotonic: fresco hasta aquí
+    stale_until: float   # monotonic: servible (con refresh) hasta aquí
+
+
+class ReadCache:
+    """TTL + LRU por bytes + single-flight + stale-while-revalidate."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, default_stale_ttl: float = 30.0):
+        """
+        Args:
+            max_bytes: Tamaño máximo estimado del caché (suma de entradas)
+            default_stale_ttl: Segundos que una entrada caducada puede servirse mientras se refresca
+        """
+        self.max_bytes = max_bytes
+        self.default_stale_ttl = default_stale_ttl
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        # Generación por namespace: una carga iniciada antes de invalidate() no se guarda
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 1024
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Loader,
+        ttl: float,
+        stale_ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Devuelve el valor cacheado de (namespace, key) o lo carga con `loader`.
+
+        Args:
+            namespace: Grupo de claves (endpoint); etiqueta de métricas
+            key: Clave dentro del namespace (parámetros de la query)
+            loader: Corrutina sin argumentos que obtiene el valor (p. ej. de Azure)
+            ttl: Segundos que el valor se considera fresco
+            stale_ttl: Segundos extra servibles con refresh en background (default del caché)
+
+        Raises:
+            La excepción del loader si no hay valor (fresco o stale) que servir
+        """
+        cache_key = (namespace, key)
+        now = time.monotonic()
+        entry = self._entries.get(cache_key)
+
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(cache_key)
+            if now < entry.expires:
+                read_cache_requests_total.labels(cache=namespace, result="hit").inc()
+            else:
+                read_cache_requests_total.labels(cache=namespace, result="stale").inc()
+                self._load(cache_key, loader, ttl, stale_ttl)
+            return entry.value
+
+        if cache_key in self._inflight:
+            read_cache_requests_total.labels(cache=namespace, result="coalesced").inc()
+        else:
+            read_cache_requests_total.labels(cache=namespace, result="miss").inc()
+        return await asyncio.shield(self._load(cache_key, loader, ttl, stale_ttl))
+
+    def _load(self, cache_key: CacheKey, loader: Loader, ttl: float, stale_ttl: Optional[float]) -> asyncio.Future:
+        """Lanza la carga de la clave (o devuelve la que ya está en curso)."""
+        future = self._inflight.get(cache_key)
+        if future is None:
+            future = asyncio.ensure_future(self._run_loader(cache_key, loader, ttl, stale_ttl))
+            self._inflight[cache_key] = future
+            future.add_done_callback(lambda f: self._on_loaded(cache_key, f))
+        return future
+
+    async def _run_loader(self, cache_key: CacheKey, loader: Loader, ttl: float, stale_ttl: Optional[float]) -> Any:
+        namespace = cache_key[0]
+        generation = self._generations.get(namespace, 0)
+        start = time.monotonic()
+        try:
+            value = await loader()
+        finally:
+            read_cache_load_duration_seconds.labels(cache=namespace).observe(time.monotonic() - start)
+
+        if self._generations.get(namespace, 0) == generation:
+            now = time.monotonic()
+            stale = self.default_stale_ttl if stale_ttl is None else stale_ttl
+            self._store(cache_key, _Entry(value, self._estimate_size(value), now + ttl, now + ttl + stale))
+        return value
+
+    def _on_loaded(self, cache_key: CacheKey, future: asyncio.Future) -> None:
+        if self._inflight.get(cache_key) is future:
+            del self._inflight[cache_key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"⚠️ Read cache load failed {cache_key}: {future.exception()}")
+
+    def _store(self, cache_key: CacheKey, entry: _Entry) -> None:
+        old = self._entries.pop(cache_key, None)
+        if old is not None:
+            self._bytes -= old.size
+        if entry.size > self.max_bytes:
+            logger.warning(f"⚠️ Read cache entry {cache_key} ({entry.size} bytes) exceeds max_bytes, not cached")
+            self._update_bytes()
+            return
+
+        self._entries[cache_key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            read_cache_evictions_total.labels(cache=evicted_key[0]).inc()
+        self._update_bytes()
+
+    def _update_bytes(self) -> None:
+        read_cache_bytes.set(self._bytes)
+
+    def invalidate(self, namespace: str) -> None:
+        """Elimina todas las entradas del namespace (p. ej. tras un ingest)."""
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        for cache_key in [k for k in self._entries if k[0] == namespace]:
+            self._bytes -= self._entries.pop(cache_key).size
+        # Las cargas en curso ya no se comparten: la siguiente petición lanza una nueva
+        for cache_key in [k for k in self._inflight if k[0] == namespace]:
+            del self._inflight[cache_key]
+        self._update_bytes()
+
+
+# Singleton instance
+read_cache = ReadCache(
+    max_bytes=settings.read_cache_max_mb * 1024 * 1024,
+    default_stale_ttl=settings.read_cache_stale_seconds,
+)
@@ -0,0 +1,224 @@
+"""
+Recent History - Ring buffers write-through con el histórico reciente por stream.
+
+GET /flow leía hasta 20000 entidades de Azure que el propio backend había
+recibido por POST segundos antes. Ahora cada ingest (spymarket, flow, gamma,
+anomalies) se escribe también en un RingBuffer en memoria, y los endpoints de
+histórico/snapshot se sirven desde ahí:
+
+- Hidratación desde Azure solo en arranque en frío (hydrate(), en background).
+- Un stream "cubre" una petición si tiene suficientes registros o si contiene
+  la tabla entera (la hidratación devolvió menos filas que su capacidad y el
+  ring aún no ha descartado ningún registro).
+- Si no la cubre (arranque aún en curso, rango más antiguo que el buffer), el
+  método devuelve None y el endpoint cae a Azure (vía read_cache).
+- Lecturas incrementales (`since`): cubiertas si el registro más antiguo en
+  memoria no es posterior al cursor; se devuelve el slice posterior al cursor.
+- Frescura: la memoria solo ve el ingest que llega a ESTA réplica. En horario
+  de mercado, si la réplica lleva más de settings.history_max_ingest_lag_seconds
+  sin recibir ingest (el detector escribe en otra réplica), sus buffers se
+  consideran obsoletos y se lee de Azure. El despliegue asume una sola réplica
+  de backend recibiendo el ingest (helm: backend.replicaCount = 1).
+
+Los registros tienen el mismo formato que las entidades persistidas
+(StorageClient.*_entity), así que memoria y Azure son intercambiables.
+
+Uso:
+    from services.recent_history import recent_history
+    history = recent_history.flow(limit)   # None → leer de Azure
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from metrics import recent_history_records, recent_history_reads_total
+from models import AnomaliesSnapshot, SpymarketSnapshot
+from services.ring_buffer import RingBuffer
+from services.storage_client import StorageClient, storage_client
+from utils.timezone_utils import is_market_hours_cet
+
+logger = logging.getLogger(__name__)
+
+# Campos que devuelve cada endpoint (mismos `select` que StorageClient.get_*)
+FLOW_FIELDS = ("timestamp", "cum_call_flow", "cum_put_flow", "spy_price")
+ANOMALY_FIELDS = ("timestamp", "strike", "option_type", "mid_price", "expected_price", "deviation_percent", "severity")
+GAMMA_FIELDS = ("timestamp", "net_gex", "gamma_regime", "pinning_risk", "gamma_walls")
+
+
+class _Stream:
+    """Ring buffer de un stream + estado de cobertura."""
+
+    def __init__(self, name: str, alias: str, capacity: int):
+        self.name = name
+        self.alias = alias          # Alias de tabla en StorageClient
+        self.ring = RingBuffer(capacity)
+        self.hydrated = False
+        self.complete = False       # True = contiene toda la tabla (se pierde al descartar registros)
+
+    def covers(self, count: int, since: Optional[float] = None, fresh: bool = True) -> bool:
+        if since is None:
+            enough = len(self.ring) >= count
+        else:
+            enough = self.ring.oldest_ts is not None and self.ring.oldest_ts <= since
+        covered = fresh and self.hydrated and (enough or self.complete)
+        recent_history_reads_total.labels(stream=self.name, source="memory" if covered else "storage").inc()
+        return covered
+
+
+class RecentHistory:
+    """Histórico reciente en memoria de spymarket, flow, gamma y anomalies."""
+
+    def __init__(self, storage: StorageClient, capacities: Dict[str, int], max_ingest_lag: float = 30.0):
+        """
+        Args:
+            storage: Cliente de storage (constructores de entidades y conversión RowKey → timestamp)
+            capacities: Capacidad del ring buffer por stream
+            max_ingest_lag: Segundos sin ingest local (en horario de mercado) tras los que la memoria no se sirve
+        """
+        self._storage = storage
+        self._max_ingest_lag = max_ingest_lag
+        self._last_ingest: Optional[float] = None  # time.time() del último ingest recibido por esta réplica
+        self._streams = {
+            "spymarket": _Stream("spymarket", "market", capacities["spymarket"]),
+            "flow": _Stream("flow", "flow", capacities["flow"]),
+            "gamma": _Stream("gamma", "gamma", capacities["gamma"]),
+            "anomalies": _Stream("anomalies", "anomalies", capacities["anomalies"]),
+        }
+
+    # --- ESCRITURA (ingest) ---
+
+    def _append(self, name: str, entity: Dict[str, Any]) -> None:
+        stream = self._streams[name]
+        if stream.ring.full:
+            stream.complete = False  # el append descarta el más antiguo: ya no es la tabla entera
+        stream.ring.append(self._storage._rev_key_to_timestamp(entity["RowKey"]), entity)
+        self._last_ingest = time.time()
+        recent_history_records.labels(stream=name).set(len(stream.ring))
+
+    def record_spymarket(self, market: SpymarketSnapshot) -> None:
+        try:
+            self._append("spymarket", self._storage.spymarket_entity(market))
+        except Exception as e:
+            logger.warning(f"⚠️ recent_history spymarket: {e}")
+
+    def record_flow(self, flow_data: dict) -> None:
+        try:
+            self._append("flow", self._storage.flow_entity(flow_data))
+        except Exception as e:
+            logger.warning(f"⚠️ recent_history flow: {e}")
+
+    def record_gamma(self, gamma: dict) -> None:
+        try:
+            entity = self._storage.gamma_entity(gamma)
+            entity["gamma_walls"] = gamma.get("gamma_walls", [])
+            self._append("gamma", entity)
+        except Exception as e:
+            logger.warning(f"⚠️ recent_history gamma: {e}")
+
+    def record_anomalies(self, anomalies: List[AnomaliesSnapshot]) -> None:
+        try:
+            for anomaly in anomalies:
+                self._append("anomalies", self._storage.anomaly_entity(anomaly))
+        except Exception as e:
+            logger.warning(f"⚠️ recent_history anomalies: {e}")
+
+    # --- HIDRATACIÓN ---
+
+    async def hydrate(self, storage) -> None:
+        """
+        Carga desde Azure los registros más recientes de cada stream (arranque en frío).
+
+        Args:
+            storage: AsyncStorageClient (get_recent awaitable)
+        """
+        for stream in self._streams.values():
+            try:
+                entities = await storage.get_recent(stream.alias, stream.ring.capacity)
+            except Exception as e:
+                logger.error(f"❌ recent_history hydrate {stream.name}: {e}")
+                continue
+            if stream.name == "gamma":
+                for entity in entities:
+                    entity["gamma_walls"] = StorageClient.parse_gamma_walls(
+                        entity.get("gamma_walls"), entity.get("gamma_walls_v")
+                    )
+            stream.ring.prepend_history(
+                (self._storage._rev_key_to_timestamp(entity["RowKey"]), entity) for entity in entities
+            )
+            stream.complete = len(entities) < stream.ring.capacity and not stream.ring.full
+            stream.hydrated = True
+            recent_history_records.labels(stream=stream.name).set(len(stream.ring))
+            logger.info(f"✅ recent_history {stream.name}: {len(stream.ring)} registros en memoria")
+
+    # --- LECTURA (None = no cubierto, leer de Azure) ---
+
+    def _fresh(self) -> bool:
+        """
+        False si en horario de mercado esta réplica no recibe ingest: lo que
+        tiene en memoria puede ir por detrás de Azure (ingest en otra réplica).
+        """
+        if not is_market_hours_cet():
+            return True
+        return self._last_ingest is not None and time.time() - self._last_ingest <= self._max_ingest_lag
+
+    def newest_ts(self, name: str) -> Optional[float]:
+        """Timestamp del registro más reciente en memoria del stream (None si vacío)."""
+        return self._streams[name].ring.newest_ts
+
+    @staticmethod
+    def _project(entity: Dict[str, Any], fields) -> Dict[str, Any]:
+        return {field: entity.get(field) for field in fields}
+
+    @staticmethod
+    def _newest(stream: _Stream, limit: int, since: Optional[float]) -> List[Dict[str, Any]]:
+        """Últimos `limit` registros (posteriores a `since` si se indica), más reciente primero."""
+        if since is None:
+            return stream.ring.latest(limit)
+        newer = stream.ring.after(since)[-limit:]
+        newer.reverse()
+        return newer
+
+    def spymarket_latest(self) -> Optional[Dict]:
+        stream = self._streams["spymarket"]
+        if not stream.covers(1, fresh=self._fresh()):
+            return None
+        latest = stream.ring.latest(1)
+        return dict(latest[0]) if latest else {}
+
+    def flow(self, limit: int, since: Optional[float] = None) -> Optional[List[Dict]]:
+        """Últimos `limit` puntos de flow (posteriores a `since`) en orden ASC (como StorageClient.get_flow)."""
+        stream = self._streams["flow"]
+        if not stream.covers(limit, since, fresh=self._fresh()):
+            return None
+        history = [self._project(e, FLOW_FIELDS) for e in self._newest(stream, limit, since)]
+        history.reverse()
+        return history
+
+    def anomalies(self, limit: int, since: Optional[float] = None) -> Optional[List[Dict]]:
+        """Últimas anomalías por tipo entre los `limit * 2` registros más recientes (como get_anomalies)."""
+        stream = self._streams["anomalies"]
+        if not stream.covers(limit * 2, since, fresh=self._fresh()):
+            return None
+        recent = (self._project(e, ANOMALY_FIELDS) for e in self._newest(stream, limit * 2, since))
+        return StorageClient.select_anomalies(recent)
+
+    def gamma(self, limit: int, since: Optional[float] = None) -> Optional[List[Dict]]:
+        """Últimas `limit` métricas gamma (posteriores a `since`), más recientes primero (como get_gamma_metrics)."""
+        stream = self._streams["gamma"]
+        if not stream.covers(limit, since, fresh=self._fresh()):
+            return None
+        return [self._project(e, GAMMA_FIELDS) for e in self._newest(stream, limit, since)]
+
+
+# Singleton instance
+recent_history = RecentHistory(
+    storage_client,
+    capacities={
+        "spymarket": settings.history_spymarket_capacity,
+        "flow": settings.history_flow_capacity,
+        "gamma": settings.history_gamma_capacity,
+        "anomalies": settings.history_anomalies_capacity,
+    },
+    max_ingest_lag=settings.history_max_ingest_lag_seconds,
+)
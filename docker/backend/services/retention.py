@@ -0,0 +1,230 @@
+"""
+Retention - Purga de datos expirados por tabla, en streaming y fuera del event loop.
+
+Sustituye a StorageClient.purge_old_data, que cargaba con list() todas las
+claves expiradas, borraba lote a lote en serie y solo cubría market, flow y
+volumes (anomalies, gammametrics y marketevents crecían sin límite):
+
+- Política por tabla: días de retención por alias (settings.retention_days_*).
+- Streaming: las claves expiradas (RowKey > rev(cutoff) en 'SPY', particiones
+  diarias 'SPY|YYYYMMDD' anteriores al corte) se leen página a página (solo
+  PartitionKey/RowKey); nunca se materializa la tabla entera.
+- Paralelismo acotado: las claves se agrupan en transacciones de hasta 100
+  deletes de una misma partición que se envían en un pool de `max_parallel` threads; como mucho `max_parallel`
+  lotes en vuelo (backpressure sobre la lectura).
+- Fuera del loop: run_async() ejecuta la purga en su propio executor.
+- Archivo frío (settings.archive_enabled): antes de borrar, los días expirados
+  se compactan a Parquet (StorageClient.archive_expired). El corte se alinea al
+  inicio del día UTC para archivar días completos; si el archivado falla, la
+  tabla no se purga en esa pasada (nunca se borra nada sin archivar).
+- Backends locales (settings.storage_backend != azure): la purga es un DELETE
+  por rango de RowKey en el propio backend (StorageClient.delete_expired).
+- Reanudable: el rango expirado se recalcula en cada ejecución y los borrados son
+  idempotentes; si se interrumpe (stop() / reinicio), la siguiente ejecución
+  continúa con lo que quede.
+
+Uso:
+    from services.retention import retention
+    await retention.run_async()
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Set
+
+from config import settings
+from metrics import (
+    retention_deleted_total,
+    retention_batch_failures_total,
+    retention_run_duration_seconds,
+    retention_last_success_timestamp,
+)
+from services.storage_client import StorageClient, storage_client
+from services.write_behind import MAX_TRANSACTION_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionEngine:
+    """Purga por tabla con paginado en streaming y deletes concurrentes acotados."""
+
+    def __init__(
+        self,
+        storage: StorageClient,
+        policies: Dict[str, int],
+        max_parallel: int = 4,
+        page_size: int = 1000,
+    ):
+        """
+        Args:
+            storage: Cliente de storage (tablas y RowKey invertido)
+            policies: Días de retención por alias de tabla
+            max_parallel: Transacciones de borrado en vuelo simultáneamente
+            page_size: Claves por página de la query de expirados
+        """
+        self._storage = storage
+        self.policies = policies
+        self.max_parallel = max(1, max_parallel)
+        self.page_size = page_size
+        self._driver: Optional[ThreadPoolExecutor] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._running = threading.Lock()
+
+    def _executors(self):
+        if self._driver is None:
+            self._driver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retention")
+            self._pool = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="retention-batch")
+        return self._driver, self._pool
+
+    def _delete_batch(self, alias: str, keys: List[dict]) -> int:
+        """Borra un lote (misma partición, <= 100) en una transacción; entidad a entidad si falla."""
+        client = self._storage._get_table(alias)
+        try:
+            client.submit_transaction([("delete", key) for key in keys])
+        except Exception as e:
+            # Un 404 (borrado por otra ejecución/réplica) invalida la transacción entera
+            logger.warning(f"⚠️ Retention {alias}: lote de {len(keys)} falló ({e}); borrando uno a uno")
+            retention_batch_failures_total.labels(table=alias).inc()
+            deleted = 0
+            for key in keys:
+                try:
+                    client.delete_entity(partition_key=key["PartitionKey"], row_key=key["RowKey"])
+                    deleted += 1
+                except Exception as item_error:
+                    logger.error(f"❌ Retention {alias}: delete {key['RowKey']}: {item_error}")
+            retention_deleted_total.labels(table=alias).inc(deleted)
+            return deleted
+        retention_deleted_total.labels(table=alias).inc(len(keys))
+        return len(keys)
+
+    def purge_table(self, alias: str, days: int) -> int:
+        """
+        Borra las entidades de `alias` más antiguas que `days` días.
+
+        Returns:
+            Nº de entidades borradas
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        start = time.monotonic()
+        if self._storage.archive is not None:
+            cutoff = cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+            archived = self._storage.archive_expired(alias, cutoff.timestamp())
+            if archived:
+                logger.info(f"🧊 Retention {alias}: {archived} registros archivados antes de purgar")
+        if self._storage.backend != "azure":
+            deleted = self._storage.delete_expired(alias, cutoff.timestamp())
+            retention_deleted_total.labels(table=alias).inc(deleted)
+            return self._finish(alias, days, deleted, start)
+
+        _, pool = self._executors()
+        client = self._storage._get_table(alias)
+        deleted = 0
+        inflight: Set[Future] = set()
+
+        def _drain(block_until: int) -> None:
+            nonlocal deleted
+            while len(inflight) > block_until:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    inflight.discard(future)
+                    deleted += future.result()
+
+        def _submit(batch: List[dict]) -> None:
+            _drain(self.max_parallel - 1)  # Backpressure: como mucho max_parallel en vuelo
+            inflight.add(pool.submit(self._delete_batch, alias, batch))
+
+        try:
+            # RowKey MAYOR que cutoff = datos ANTIGUOS (SÍ borrar); una query por rango de particiones
+            for query in self._storage._expired_queries(cutoff.timestamp()):
+                pages = client.query_entities(
+                    query, select=["PartitionKey", "RowKey"], results_per_page=self.page_size
+                ).by_page()
+                batch: List[dict] = []
+                for page in pages:
+                    for entity in page:
+                        # Una transacción solo admite entidades de una misma partición
+                        if batch and entity["PartitionKey"] != batch[0]["PartitionKey"]:
+                            _submit(batch)
+                            batch = []
+                        batch.append({"PartitionKey": entity["PartitionKey"], "RowKey": entity["RowKey"]})
+                        if len(batch) == MAX_TRANSACTION_SIZE:
+                            _submit(batch)
+                            batch = []
+                    if self._stop.is_set():
+                        break
+                if self._stop.is_set():
+                    logger.info(f"⏸️ Retention {alias}: interrumpida ({deleted} borrados); se reanudará en la próxima ejecución")
+                    break
+                if batch:
+                    _submit(batch)
+        finally:
+            _drain(0)
+        return self._finish(alias, days, deleted, start)
+
+    def _finish(self, alias: str, days: int, deleted: int, start: float) -> int:
+        """Métricas y log de fin de purga de una tabla. Devuelve `deleted`."""
+        retention_run_duration_seconds.labels(table=alias).observe(time.monotonic() - start)
+        if not self._stop.is_set():
+            retention_last_success_timestamp.labels(table=alias).set(time.time())
+        if deleted:
+            logger.info(f"🧹 Retention {alias}: {deleted} registros > {days}d eliminados")
+        return deleted
+
+    def run(self) -> Dict[str, int]:
+        """Aplica todas las políticas (síncrono, en el thread del executor). Devuelve borrados por tabla."""
+        if not self._running.acquire(blocking=False):
+            logger.warning("⚠️ Retention ya en ejecución, se omite esta pasada")
+            return {}
+        try:
+            self._stop.clear()
+            results = {}
+            for alias, days in self.policies.items():
+                if self._stop.is_set():
+                    break
+                if days <= 0:
+                    continue  # 0 = sin retención (se conserva todo)
+                try:
+                    results[alias] = self.purge_table(alias, days)
+                except Exception as e:
+                    logger.error(f"❌ Retention {alias}: {e}")
+            return results
+        finally:
+            self._running.release()
+
+    async def run_async(self) -> Dict[str, int]:
+        """Ejecuta run() en el executor propio (no ocupa el event loop ni el executor de storage)."""
+        driver, _ = self._executors()
+        return await asyncio.get_running_loop().run_in_executor(driver, self.run)
+
+    def stop(self) -> None:
+        """Interrumpe la purga en curso tras la página actual y libera los executors."""
+        self._stop.set()
+        if self._driver is not None:
+            self._driver.shutdown(wait=True)
+            self._pool.shutdown(wait=True)
+            self._driver = self._pool = None
+
+
+# Singleton instance
+retention = RetentionEngine(
+    storage_client,
+    policies={
+        "market": settings.retention_days_market,
+        "flow": settings.retention_days_flow,
+        "volumes": settings.retention_days_volumes,
+        "anomalies": settings.retention_days_anomalies,
+        "gamma": settings.retention_days_gamma,
+        "events": settings.retention_days_events,
+        "market_10s": settings.retention_days_rollup_10s,
+        "flow_10s": settings.retention_days_rollup_10s,
+        "market_1m": settings.retention_days_rollup_1m,
+        "flow_1m": settings.retention_days_rollup_1m,
+        "market_5m": settings.retention_days_rollup_5m,
+        "flow_5m": settings.retention_days_rollup_5m,
+    },
+    max_parallel=settings.retention_max_parallel_batches,
+)
@@ -0,0 +1,118 @@
+"""
+Ring Buffer - Buffer circular de capacidad fija, ordenado por timestamp.
+
+Almacenamiento preasignado (lista de slots + array('d') de timestamps): append
+O(1), sin realocaciones; al llenarse sobrescribe el registro más antiguo.
+
+Los registros se mantienen en orden cronológico. Un registro con el mismo
+timestamp que uno existente lo reemplaza (misma semántica que el upsert
+REPLACE por RowKey en Azure); uno fuera de orden se inserta en su posición.
+"""
+from array import array
+from typing import Any, Iterable, List, Optional, Tuple
+
+
+class RingBuffer:
+    """Registros (timestamp, record) en orden cronológico, capacidad fija."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._records: List[Any] = [None] * self.capacity
+        self._ts = array('d', bytes(8 * self.capacity))
+        self._start = 0   # slot físico del registro más antiguo
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count == self.capacity
+
+    def _slot(self, i: int) -> int:
+        """Índice lógico (0 = más antiguo) → slot físico."""
+        return (self._start + i) % self.capacity
+
+    def timestamp(self, i: int) -> float:
+        return self._ts[self._slot(i)]
+
+    @property
+    def oldest_ts(self) -> Optional[float]:
+        return self.timestamp(0) if self._count else None
+
+    @property
+    def newest_ts(self) -> Optional[float]:
+        return self.timestamp(self._count - 1) if self._count else None
+
+    def _bisect(self, ts: float, right: bool = False) -> int:
+        """Primer índice lógico con timestamp >= ts (> ts si right)."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < ts or (right and self.timestamp(mid) == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def append(self, ts: float, record: Any) -> None:
+        newest = self.newest_ts
+        if newest is None or ts > newest:
+            if self.full:
+                self._start = (self._start + 1) % self.capacity
+                self._count -= 1
+            slot = self._slot(self._count)
+            self._records[slot] = record
+            self._ts[slot] = ts
+            self._count += 1
+            return
+
+        i = self._bisect(ts)
+        if i < self._count and self.timestamp(i) == ts:
+            self._records[self._slot(i)] = record
+            return
+        if i == 0 and self.full:
+            return  # Más antiguo que todo lo que cabe
+        # Fuera de orden (raro): reconstruir con el registro en su posición
+        items = self.items()
+        items.insert(i, (ts, record))
+        self._load(items[-self.capacity:])
+
+    def _load(self, items: List[Tuple[float, Any]]) -> None:
+        self._start = 0
+        self._count = len(items)
+        for slot, (ts, record) in enumerate(items):
+            self._ts[slot] = ts
+            self._records[slot] = record
+        for slot in range(self._count, self.capacity):
+            self._records[slot] = None
+
+    def prepend_history(self, items: Iterable[Tuple[float, Any]]) -> None:
+        """
+        Añade registros históricos (p. ej. hidratación desde Azure) anteriores al
+        más antiguo actual; los registros ya presentes tienen prioridad.
+        """
+        oldest = self.oldest_ts
+        older = sorted(
+            (item for item in items if oldest is None or item[0] < oldest),
+            key=lambda item: item[0],
+        )
+        deduped = [item for n, item in enumerate(older) if n + 1 == len(older) or older[n + 1][0] != item[0]]
+        self._load((deduped + self.items())[-self.capacity:])
+
+    def items(self) -> List[Tuple[float, Any]]:
+        """Todos los (timestamp, record), más antiguo primero."""
+        return [(self.timestamp(i), self._records[self._slot(i)]) for i in range(self._count)]
+
+    def latest(self, n: int) -> List[Any]:
+        """Los últimos `n` registros, más reciente primero."""
+        n = min(n, self._count)
+        return [self._records[self._slot(self._count - 1 - k)] for k in range(n)]
+
+    def since(self, ts: float) -> List[Any]:
+        """Registros con timestamp >= ts, más antiguo primero."""
+        return [self._records[self._slot(i)] for i in range(self._bisect(ts), self._count)]
+
+    def after(self, ts: float) -> List[Any]:
+        """Registros con timestamp > ts, más antiguo primero."""
+        return [self._records[self._slot(i)] for i in range(self._bisect(ts, right=True), self._count)]
@@ -0,0 +1,181 @@
+"""
+Rollups - Agregados multi-resolución (10s, 1m, 5m) de flow y spymarket.
+
+Las lecturas de histórico largo (horas/días) recorrían decenas de miles de
+filas crudas. El RollupEngine mantiene, en cada ingest, un bucket abierto por
+(stream, resolución) con agregados OHLC de cada campo numérico:
+
+    <campo>_open, <campo>_high, <campo>_low y <campo> (= close)
+
+más los campos "de estado" (último valor) y `count`. Cuando llega un registro
+de un bucket posterior, el bucket anterior se cierra y se persiste en su propia
+tabla (flowrollup10s, spymarketrollup1m, ...) vía async_storage (write-behind).
+Los registros con timestamp anterior al bucket abierto no se agregan (ya se
+persistió ese bucket).
+
+Un único escritor: los buckets se persisten con REPLACE, así que el engine
+asume que una sola réplica recibe el ingest (helm: backend.replicaCount = 1).
+En shutdown, flush() persiste los buckets abiertos (parciales); al arrancar,
+hydrate() reabre el último bucket persistido de cada (stream, resolución) para
+que el ingest posterior al reinicio se agregue sobre él en vez de
+sobrescribirlo con un bucket vacío del mismo RowKey.
+
+Lectura: select_resolution() elige la resolución más fina que devuelve como
+máximo `max_points` filas para el intervalo pedido; el bucket abierto y los
+últimos cerrados (recent_buckets) se añaden desde memoria al histórico
+persistido: un bucket recién cerrado puede no estar aún en la tabla
+(write-behind) ni en la lista cacheada.
+
+Uso:
+    from services.rollups import rollups
+    closed = rollups.update("flow", ts, flow_data)    # [(alias, entity), ...] a persistir
+"""
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Tuple
+
+from metrics import rollup_buckets_closed_total
+from services.storage_client import StorageClient, storage_client
+
+logger = logging.getLogger(__name__)
+
+# Resoluciones (etiqueta → segundos), de más fina a más gruesa
+RESOLUTIONS = {"10s": 10, "1m": 60, "5m": 300}
+
+# Buckets cerrados que se conservan en memoria por (stream, resolución): cubren
+# el TTL + stale de la lista persistida cacheada y el retardo del write-behind
+RECENT_CLOSED_BUCKETS = 16
+
+# Stream → alias de tabla base en StorageClient
+STREAM_ALIASES = {"flow": "flow", "spymarket": "market"}
+
+# Campos con agregado OHLC por stream
+OHLC_FIELDS = {
+    "flow": ("cum_call_flow", "cum_put_flow", "net_flow", "spy_price"),
+    "spymarket": ("price",),
+}
+
+# Campos de estado (se guarda el último valor del bucket)
+CLOSE_FIELDS = {
+    "flow": (),
+    "spymarket": ("previous_close", "spy_change_pct", "volume", "market_status"),
+}
+
+
+def rollup_alias(stream: str, label: str) -> str:
+    """Alias de tabla de un rollup (p. ej. 'flow_1m')."""
+    return f"{STREAM_ALIASES[stream]}_{label}"
+
+
+def select_resolution(span_seconds: float, max_points: int) -> str:
+    """Resolución más fina cuyo número de buckets para `span_seconds` no supera `max_points`."""
+    for label, seconds in RESOLUTIONS.items():
+        if span_seconds / seconds <= max_points:
+            return label
+    return list(RESOLUTIONS)[-1]
+
+
+class RollupEngine:
+    """Buckets OHLC abiertos por (stream, resolución), cerrados al avanzar el tiempo."""
+
+    def __init__(self, storage: StorageClient):
+        self._storage = storage
+        self._open: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._closed: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+
+    def _new_bucket(self, stream: str, label: str, start: float) -> Dict[str, Any]:
+        return {
+            "PartitionKey": self._storage._partition_key(start),
+            "RowKey": self._storage._to_rev_key_new(start),
+            "timestamp": datetime.fromtimestamp(start, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "bucket_start": start,
+            "resolution": label,
+            "count": 0,
+        }
+
+    @staticmethod
+    def _merge(bucket: Dict[str, Any], stream: str, ts: float, record: Dict[str, Any]) -> None:
+        for field in OHLC_FIELDS[stream]:
+            value = record.get(field)
+            if value is None:
+                continue
+            value = float(value)
+            if f"{field}_open" not in bucket:
+                bucket[f"{field}_open"] = bucket[f"{field}_high"] = bucket[f"{field}_low"] = value
+            else:
+                bucket[f"{field}_high"] = max(bucket[f"{field}_high"], value)
+                bucket[f"{field}_low"] = min(bucket[f"{field}_low"], value)
+            bucket[field] = value
+        for field in CLOSE_FIELDS[stream]:
+            if record.get(field) is not None:
+                bucket[field] = record[field]
+        bucket["count"] += 1
+        bucket["last_ts"] = ts
+
+    def update(self, stream: str, ts: float, record: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Agrega un registro en los buckets abiertos del stream.
+
+        Returns:
+            Buckets cerrados a persistir: [(alias de tabla, entidad), ...]
+        """
+        closed = []
+        for label, seconds in RESOLUTIONS.items():
+            start = float(int(ts // seconds) * seconds)
+            key = (stream, label)
+            bucket = self._open.get(key)
+            if bucket is not None and start < bucket["bucket_start"]:
+                continue  # Registro atrasado: su bucket ya está cerrado
+            if bucket is None or start > bucket["bucket_start"]:
+                if bucket is not None:
+                    closed.append((rollup_alias(stream, label), bucket))
+                    self._closed.setdefault(key, deque(maxlen=RECENT_CLOSED_BUCKETS)).append(bucket)
+                    rollup_buckets_closed_total.labels(stream=stream, resolution=label).inc()
+                bucket = self._open[key] = self._new_bucket(stream, label, start)
+            self._merge(bucket, stream, ts, record)
+        return closed
+
+    async def hydrate(self, storage) -> None:
+        """
+        Reabre el último bucket persistido de cada (stream, resolución) (arranque).
+        Debe terminar antes de aceptar ingest (ver lifespan en app.py).
+
+        Args:
+            storage: AsyncStorageClient (get_recent awaitable)
+        """
+        for stream in STREAM_ALIASES:
+            for label in RESOLUTIONS:
+                key = (stream, label)
+                if key in self._open:
+                    continue
+                try:
+                    saved = await storage.get_recent(rollup_alias(stream, label), 1)
+                except Exception as e:
+                    logger.error(f"❌ rollups hydrate {rollup_alias(stream, label)}: {e}")
+                    continue
+                if saved and saved[0].get("bucket_start") is not None:
+                    bucket = dict(saved[0])
+                    bucket["bucket_start"] = float(bucket["bucket_start"])
+                    bucket["count"] = int(bucket.get("count") or 0)
+                    self._open[key] = bucket
+                    logger.info(f"✅ rollups {rollup_alias(stream, label)}: bucket {bucket['timestamp']} reabierto")
+
+    def recent_buckets(self, stream: str, label: str) -> List[Dict[str, Any]]:
+        """Copias de los últimos buckets cerrados y del abierto de (stream, resolución), en orden ASC."""
+        key = (stream, label)
+        buckets = [dict(bucket) for bucket in self._closed.get(key, ())]
+        if key in self._open:
+            buckets.append(dict(self._open[key]))
+        return buckets
+
+    def flush(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Cierra todos los buckets abiertos (shutdown): [(alias, entidad), ...]."""
+        closed = [(rollup_alias(stream, label), bucket) for (stream, label), bucket in self._open.items()]
+        self._open.clear()
+        self._closed.clear()
+        return closed
+
+
+# Singleton instance
+rollups = RollupEngine(storage_client)
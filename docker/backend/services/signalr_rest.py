@@ -4,11 +4,13 @@ Replaces Python SDK for broadcast-only operations.
 
 v2: añadido broadcast_async() con httpx.AsyncClient para eliminar
     la sobrecarga de threads (asyncio.to_thread) en el backend FastAPI.
+v3: token JWT cacheado por hub hasta poco antes de expirar (no se firma
+    uno nuevo por broadcast). Coalescing/fan-out en services/broadcaster.py.
 """
 import asyncio
 import jwt
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import logging
 
 import httpx
@@ -26,6 +28,10 @@ _HTTPX_LIMITS = httpx.Limits(
     keepalive_expiry=30,
 )
 
+# Vida del token de hub y margen de renovación antes de exp
+_TOKEN_TTL_SECONDS = 3600
+_TOKEN_REFRESH_MARGIN_SECONDS = 300
+
 
 class SignalRRestClient:
     """REST API client for Azure SignalR serverless broadcast.
@@ -40,6 +46,8 @@ class SignalRRestClient:
         self.access_key = settings.azure_signalr_access_key
         # Cliente async compartido con connection pooling (se inicializa en startup)
         self._async_client: httpx.AsyncClient | None = None
+        # ✅ OPT: Token por hub cacheado → {hub_name: (token, exp)}
+        self._tokens: Dict[str, Tuple[str, int]] = {}
         logger.info(f"SignalR REST client initialized: {self.endpoint}")
 
     async def init_async_client(self):
@@ -67,11 +75,21 @@ class SignalRRestClient:
         }
         return jwt.encode(payload, self.access_key, algorithm="HS256")
 
+    def _get_token(self, hub_name: str) -> str:
+        """Token cacheado del hub; se regenera cuando le quedan < 5 min."""
+        cached = self._tokens.get(hub_name)
+        if cached is not None and cached[1] - time.time() > _TOKEN_REFRESH_MARGIN_SECONDS:
+            return cached[0]
+        exp = int(time.time()) + _TOKEN_TTL_SECONDS
+        token = self._generate_token(hub_name, ttl_seconds=_TOKEN_TTL_SECONDS)
+        self._tokens[hub_name] = (token, exp)
+        return token
+
     def broadcast(self, hub_name: str, event_name: str, data: Dict[Any, Any]) -> bool:
         """Broadcast síncrono (requests). Usado por el detector/threads."""
         try:
             url = f"{self.endpoint}/api/v1/hubs/{hub_name}"
-            token = self._generate_token(hub_name)
+            token = self._get_token(hub_name)
             headers = {
                 "Authorization": f"Bearer {token}",
                 "Content-Type": "application/json",
@@ -101,7 +119,7 @@ class SignalRRestClient:
 
         try:
             url = f"{self.endpoint}/api/v1/hubs/{hub_name}"
-            token = self._generate_token(hub_name)
+            token = self._get_token(hub_name)
             headers = {
                 "Authorization": f"Bearer {token}",
                 "Content-Type": "application/json",
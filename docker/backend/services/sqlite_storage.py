@@ -0,0 +1,167 @@
+"""
+SQLite Storage - Backend embebido (SQLite en modo WAL) con la interfaz de StorageClient.
+
+Con settings.storage_backend = "sqlite" el singleton storage_client es un
+SQLiteStorageClient: mismos save_*/get_*, mismas entidades y mismo RowKey
+invertido que en Azure, pero las queries de histórico van a un fichero local
+(milisegundos, sin latencia WAN). Sirve para despliegues de un solo nodo, para
+arrancar el stack sin conexión y como sustituto de Azure en benchmarks y pruebas.
+
+- Una tabla por alias: (RowKey PRIMARY KEY, PartitionKey, data JSON), WITHOUT
+  ROWID. El RowKey invertido es el índice temporal: ORDER BY RowKey = más
+  reciente primero, y `since` / ventanas son rangos sobre la clave primaria.
+- WAL: lectores concurrentes (executor de storage) sin bloquear al writer
+  (write-behind). Una conexión por thread.
+- Write-behind: los lotes del buffer se escriben con executemany en una sola
+  transacción.
+
+Uso:
+    STORAGE_BACKEND=sqlite STORAGE_SQLITE_PATH=data/spy_options.db
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from metrics import storage_operations_total
+from services.storage_client import StorageClient
+
+logger = logging.getLogger(__name__)
+
+# Filas por DELETE de la retención (acota la duración del lock de escritura)
+_DELETE_CHUNK = 5000
+
+
+class SQLiteStorageClient(StorageClient):
+    """StorageClient sobre un fichero SQLite local (WAL)."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Ruta del fichero de base de datos (se crea si no existe)
+        """
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Conexión del thread actual (sqlite3 no comparte conexiones entre threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, alias: str) -> str:
+        return self._tables.get(alias, alias)
+
+    def connect(self):
+        """Crea el fichero y las tablas si no existen."""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._conn()
+            for name in self._tables.values():
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} ("
+                    "RowKey TEXT PRIMARY KEY, PartitionKey TEXT NOT NULL, data TEXT NOT NULL"
+                    ") WITHOUT ROWID"
+                )
+            logger.info(f"✅ Connected to SQLite storage ({self.path}, WAL)")
+            storage_operations_total.labels(operation="connect", status="success").inc()
+            if self._write_buffer is not None:
+                self._write_buffer.start()
+        except Exception as e:
+            logger.error(f"❌ SQLite Storage Connection Error: {e}")
+            storage_operations_total.labels(operation="connect", status="error").inc()
+
+    @staticmethod
+    def _row(entity: dict) -> tuple:
+        data = {k: v for k, v in entity.items() if k not in ("PartitionKey", "RowKey")}
+        return entity["RowKey"], entity["PartitionKey"], json.dumps(data, separators=(",", ":"), default=str)
+
+    def _write(self, alias: str, entity: dict) -> None:
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self._table(alias)} (RowKey, PartitionKey, data) VALUES (?, ?, ?)",
+            self._row(entity),
+        )
+
+    def _flush_batch(self, alias: str, entities: List[dict]) -> None:
+        """Escribe un lote del write-behind buffer en una transacción."""
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self._table(alias)} (RowKey, PartitionKey, data) VALUES (?, ?, ?)",
+                    [self._row(e) for e in entities],
+                )
+            storage_operations_total.labels(operation=f"flush_{alias}", status="success").inc()
+        except Exception as e:
+            logger.error(f"❌ Error SQLite flush {alias} ({len(entities)} entities): {e}")
+            storage_operations_total.labels(operation=f"flush_{alias}", status="error").inc()
+
+    def _scan(
+        self,
+        alias: str,
+        since_ts: Optional[float] = None,
+        inclusive: bool = False,
+        select: Optional[List[str]] = None,
+        results_per_page: int = 1000,
+    ) -> Iterator[Dict]:
+        """Entidades más recientes primero (rango sobre la clave primaria RowKey)."""
+        sql = f"SELECT RowKey, PartitionKey, data FROM {self._table(alias)}"
+        params: tuple = ()
+        if since_ts is not None:
+            sql += f" WHERE RowKey {'<=' if inclusive else '<'} ?"
+            params = (self._to_rev_key_new(since_ts),)
+        sql += " ORDER BY RowKey"
+        yield from self._rows(sql, params, select, results_per_page)
+
+    def _rows(self, sql: str, params: tuple, select: Optional[List[str]], results_per_page: int) -> Iterator[Dict]:
+        cursor = self._conn().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(results_per_page)
+                if not rows:
+                    return
+                for row_key, partition_key, data in rows:
+                    entity = json.loads(data)
+                    if select is not None:
+                        entity = {field: entity[field] for field in select if field in entity}
+                    else:
+                        entity["PartitionKey"] = partition_key
+                    entity["RowKey"] = row_key
+                    yield entity
+        finally:
+            cursor.close()
+
+    def _expired_entities(self, alias: str, cutoff_ts: float) -> Iterator[Dict]:
+        sql = f"SELECT RowKey, PartitionKey, data FROM {self._table(alias)} WHERE RowKey > ? ORDER BY RowKey"
+        yield from self._rows(sql, (self._to_rev_key_new(cutoff_ts),), None, 1000)
+
+    def delete_expired(self, alias: str, cutoff_ts: float) -> int:
+        """
+        Borra las entidades anteriores a cutoff_ts (retención) en bloques de
+        _DELETE_CHUNK filas. Returns: Nº de entidades borradas.
+        """
+        table = self._table(alias)
+        conn = self._conn()
+        rev_cutoff = self._to_rev_key_new(cutoff_ts)
+        deleted = 0
+        while True:
+            cursor = conn.execute(
+                f"DELETE FROM {table} WHERE RowKey IN "
+                f"(SELECT RowKey FROM {table} WHERE RowKey > ? LIMIT {_DELETE_CHUNK})",
+                (rev_cutoff,),
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < _DELETE_CHUNK:
+                return deleted
@@ -1,16 +1,47 @@
-﻿import logging
-from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any
+﻿import ast
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Iterable, Iterator
 from itertools import islice
 from azure.data.tables import TableServiceClient, TableClient, UpdateMode
 
 from config import settings
 from models import AnomaliesSnapshot, SpymarketSnapshot, VolumesSnapshot
-from metrics import storage_operations_total, storage_operation_duration_seconds
+from metrics import storage_operations_total, storage_operation_duration_seconds, gamma_walls_legacy_decodes_total
+from services.archive import ParquetArchive
+from services.write_behind import WriteBehindBuffer
 
 logger = logging.getLogger(__name__)
 
+# Versión de codificación de gamma_walls (columna gamma_walls_v):
+#   sin columna → legado str(list), se decodifica con ast.literal_eval
+#   2           → JSON compacto
+GAMMA_WALLS_VERSION = 2
+
+# Esquemas de PartitionKey (settings.storage_partition_scheme):
+#   single → 'SPY' (una partición por tabla, formato original)
+#   daily  → 'SPY|YYYYMMDD' (símbolo + día de trading UTC)
+PARTITION_SYMBOL = "SPY"
+PARTITION_SCHEMES = ("single", "daily")
+
 class StorageClient:
+    """
+    Persistencia en Azure Table Storage.
+
+    Backends alternativos (services/sqlite_storage.py) heredan de esta clase:
+    reutilizan los constructores de entidades, RowKey invertido, watermarks y
+    todos los save_*/get_*, y sustituyen solo las primitivas de I/O
+    (connect, _write, _flush_batch, _scan, _expired_entities, delete_expired).
+
+    Con settings.archive_enabled, los datos expirados pasan al archivo Parquet
+    (services/archive.py) y query_window une ambos tiers de forma transparente.
+    """
+
+    # Backend (settings.storage_backend)
+    backend = "azure"
+
     def __init__(self):
         self.connection_string = settings.azure_storage_connection_string
         # Estandarización de nombres de tablas
@@ -20,11 +51,41 @@ class StorageClient:
             "flow": "flow",
             "volumes": "volumes",
             "events": "marketevents",
-            "gamma": "gammametrics"  # Gamma exposure metrics (v2.0)
+            "gamma": "gammametrics",  # Gamma exposure metrics (v2.0)
+            # Rollups OHLC multi-resolución (services/rollups.py)
+            "flow_10s": "flowrollup10s",
+            "flow_1m": "flowrollup1m",
+            "flow_5m": "flowrollup5m",
+            "market_10s": "spymarketrollup10s",
+            "market_1m": "spymarketrollup1m",
+            "market_5m": "spymarketrollup5m",
         }
         # ✅ OPT: TableServiceClient compartido — se crea UNA vez y se reutiliza
         # Evita abrir una conexión TCP nueva en cada operación de lectura/escritura.
         self._service_client: TableServiceClient | None = None
+        # ✅ OPT: Write-behind — los save_* de alta frecuencia encolan la entidad y un
+        # thread la envía con submit_transaction (hasta 100 por request) en vez de un
+        # upsert_entity (un round trip) por registro.
+        self._write_buffer: WriteBehindBuffer | None = None
+        # ✅ OPT: Watermark "último timestamp" por tabla (escrituras y lecturas):
+        # las lecturas por ventana acotan el RowKey sin una query previa del último registro.
+        self._watermarks: Dict[str, float] = {}
+        # Esquema de PartitionKey ('single' | 'daily') y alcance del fan-out de lectura
+        if settings.storage_partition_scheme not in PARTITION_SCHEMES:
+            raise ValueError(f"storage_partition_scheme inválido: {settings.storage_partition_scheme!r}")
+        self._partition_scheme = settings.storage_partition_scheme
+        self._max_lookback_days = settings.storage_partition_max_lookback_days
+        # Tier frío: Parquet diario (None = los expirados se borran sin archivar)
+        self.archive: ParquetArchive | None = None
+        if settings.archive_enabled:
+            self.archive = ParquetArchive(settings.archive_path)
+        if settings.storage_write_behind:
+            self._write_buffer = WriteBehindBuffer(
+                self._flush_batch,
+                batch_size=settings.storage_flush_batch_size,
+                flush_interval=settings.storage_flush_interval_seconds,
+                max_pending=settings.storage_write_buffer_max,
+            )
 
     # ✅ MÉTODOS AUXILIARES
     def _to_rev_key_new(self, ts: float) -> str:
@@ -43,6 +104,129 @@ class StorageClient:
         except Exception:
             return 0.0
 
+    @staticmethod
+    def _day_partition(ts: float) -> str:
+        """PartitionKey diaria: 'SPY|YYYYMMDD' (día UTC de ts)."""
+        return f"{PARTITION_SYMBOL}|{datetime.fromtimestamp(ts, tz=timezone.utc):%Y%m%d}"
+
+    def _partition_key(self, ts: float) -> str:
+        """PartitionKey de una entidad con timestamp ts según el esquema configurado."""
+        if self._partition_scheme == "daily":
+            return self._day_partition(ts)
+        return PARTITION_SYMBOL
+
+    def _partitions(self, alias: str, since_ts: Optional[float] = None) -> Iterator[str]:
+        """
+        Particiones a leer de más reciente a más antigua.
+
+        single: solo 'SPY'. daily: un día por partición, desde el día del último
+        registro conocido (watermark) o de hoy hasta el día de since_ts, o hasta
+        storage_partition_max_lookback_days si no hay límite inferior.
+        """
+        if self._partition_scheme != "daily":
+            yield PARTITION_SYMBOL
+            return
+        newest = max(time.time(), self._watermarks.get(alias, 0.0))
+        oldest = since_ts if since_ts is not None else newest - self._max_lookback_days * 86400
+        day = datetime.fromtimestamp(newest, tz=timezone.utc).date()
+        last = datetime.fromtimestamp(max(oldest, 0.0), tz=timezone.utc).date()
+        while day >= last:
+            yield f"{PARTITION_SYMBOL}|{day:%Y%m%d}"
+            day -= timedelta(days=1)
+
+    def _scan(
+        self,
+        alias: str,
+        since_ts: Optional[float] = None,
+        inclusive: bool = False,
+        select: Optional[List[str]] = None,
+        results_per_page: int = 1000,
+    ) -> Iterator[Dict]:
+        """
+        Entidades de `alias` más recientes primero (posteriores a since_ts si se indica).
+
+        ✅ OPT: fan-out perezoso por partición: con el esquema diario cada día es
+        una query propia y solo se lanza la del día anterior si el consumidor sigue
+        iterando (islice/break cortan también el fan-out). Dentro de una partición,
+        RowKey invertido = orden más reciente primero.
+
+        Args:
+            alias: Alias de tabla
+            since_ts: Límite inferior (timestamp Unix); exclusivo salvo inclusive=True
+            inclusive: Incluir el registro con timestamp == since_ts
+            select: Campos a recuperar (RowKey se añade siempre)
+            results_per_page: Tamaño de página de cada query
+        """
+        row_filter = ""
+        if since_ts is not None:
+            op = "le" if inclusive else "lt"
+            row_filter = f" and RowKey {op} '{self._to_rev_key_new(since_ts)}'"
+        if select is not None and "RowKey" not in select:
+            select = list(select) + ["RowKey"]
+
+        client = self._get_table(alias)
+        for partition in self._partitions(alias, since_ts):
+            yield from client.query_entities(
+                f"PartitionKey eq '{partition}'" + row_filter,
+                results_per_page=results_per_page,
+                select=select,
+            )
+
+    def _tiered_scan(
+        self, alias: str, since_ts: Optional[float], select: Optional[List[str]] = None
+    ) -> Iterator[Dict]:
+        """
+        Router de tiers: como _scan(since_ts, inclusive=True), pero si el límite
+        inferior es anterior al archivo frío, continúa con los días archivados.
+
+        El tramo [archived_until, ...) se lee de la tabla y lo anterior del
+        Parquet, así que un día archivado pero aún no purgado no se duplica.
+        """
+        boundary = None
+        if self.archive is not None and since_ts is not None:
+            boundary = self.archive.archived_until(self._tables.get(alias, alias))
+        if boundary is None or since_ts >= boundary:
+            yield from self._scan(alias, since_ts=since_ts, inclusive=True, select=select)
+            return
+        yield from self._scan(alias, since_ts=boundary, inclusive=True, select=select)
+        yield from self.archive.scan(self._tables.get(alias, alias), since_ts, boundary, select=select)
+
+    def archive_expired(self, alias: str, cutoff_ts: float) -> int:
+        """
+        Compacta en el archivo frío las entidades anteriores a cutoff_ts (antes de
+        que la retención las borre). Returns: Nº de registros archivados.
+        """
+        if self.archive is None:
+            return 0
+        records = (
+            (self._rev_key_to_timestamp(entity["RowKey"]), entity)
+            for entity in self._expired_entities(alias, cutoff_ts)
+        )
+        return self.archive.compact(self._tables.get(alias, alias), records)
+
+    def _expired_entities(self, alias: str, cutoff_ts: float) -> Iterator[Dict]:
+        """Entidades anteriores a cutoff_ts: exactamente las que purga la retención."""
+        client = self._get_table(alias)
+        for query in self._expired_queries(cutoff_ts):
+            yield from client.query_entities(query, results_per_page=1000)
+
+    def _expired_queries(self, cutoff_ts: float) -> List[str]:
+        """
+        Filtros de las entidades anteriores a cutoff_ts (retención).
+
+        Cubre ambos esquemas sea cual sea el activo, para purgar también lo que
+        quede del otro durante/tras un repartition (scripts/migrar.py):
+        la partición 'SPY', las particiones diarias enteras anteriores al día de
+        corte y la parte expirada de la partición del día de corte.
+        """
+        rev_cutoff = self._to_rev_key_new(cutoff_ts)
+        cutoff_day = self._day_partition(cutoff_ts)
+        return [
+            f"PartitionKey eq '{PARTITION_SYMBOL}' and RowKey gt '{rev_cutoff}'",
+            f"PartitionKey gt '{PARTITION_SYMBOL}|' and PartitionKey lt '{cutoff_day}'",
+            f"PartitionKey eq '{cutoff_day}' and RowKey gt '{rev_cutoff}'",
+        ]
+
     def _to_rev_key(self, ts: float) -> str:
         """Formato antiguo (solo para compatibilidad con datos existentes)"""
         return str(9999999999999 - int(ts * 10000000))
@@ -75,6 +259,8 @@ class StorageClient:
                 self._service_client.create_table_if_not_exists(name)
             logger.info("✅ Connected to Azure Table Storage (All Tables)")
             storage_operations_total.labels(operation="connect", status="success").inc()
+            if self._write_buffer is not None:
+                self._write_buffer.start()
         except Exception as e:
             logger.error(f"❌ Storage Connection Error: {e}")
             storage_operations_total.labels(operation="connect", status="error").inc()
@@ -87,29 +273,122 @@ class StorageClient:
             self._service_client = TableServiceClient.from_connection_string(self.connection_string)
         return self._service_client.get_table_client(table_name)
 
+    def _note_watermark(self, alias: str, ts: float) -> None:
+        if ts > self._watermarks.get(alias, 0.0):
+            self._watermarks[alias] = ts
+
+    def _upsert(self, alias: str, entity: dict) -> None:
+        """Upsert (REPLACE) vía write-behind buffer si está activo, directo si no."""
+        self._note_watermark(alias, self._rev_key_to_timestamp(entity["RowKey"]))
+        if self._write_buffer is not None:
+            self._write_buffer.add(alias, entity)
+        else:
+            self._write(alias, entity)
+
+    def _write(self, alias: str, entity: dict) -> None:
+        """Upsert (REPLACE) directo de una entidad, sin write-behind."""
+        self._get_table(alias).upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+
+    def _flush_batch(self, alias: str, entities: List[dict]) -> None:
+        """
+        Escribe un lote del write-behind buffer (misma tabla y partición, <= 100).
+
+        Una transacción falla entera si falla una entidad: en ese caso se reintenta
+        entidad a entidad para no perder el resto del lote.
+        """
+        client = self._get_table(alias)
+        try:
+            client.submit_transaction([("upsert", e, {"mode": UpdateMode.REPLACE}) for e in entities])
+            storage_operations_total.labels(operation=f"flush_{alias}", status="success").inc()
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Write-behind transaction failed on {alias} ({len(entities)} entities), retrying one by one: {e}")
+            storage_operations_total.labels(operation=f"flush_{alias}", status="error").inc()
+
+        for entity in entities:
+            try:
+                client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+            except Exception as e:
+                logger.error(f"❌ Error write-behind upsert {alias} RowKey={entity.get('RowKey')}: {e}")
+
+    def close(self) -> None:
+        """Vacía el write-behind buffer (flush final). Llamar desde FastAPI shutdown."""
+        if self._write_buffer is not None:
+            self._write_buffer.stop()
+
+    # --- ENTIDADES (mismo formato que se persiste; también para los ring buffers) ---
+
+    def spymarket_entity(self, market: SpymarketSnapshot) -> Dict[str, Any]:
+        return {
+            "PartitionKey": self._partition_key(market.timestamp),
+            "RowKey": self._to_rev_key_new(market.timestamp),  # 🔴 CAMBIADO a nuevo formato
+            "timestamp": datetime.fromtimestamp(market.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "price": float(market.price),
+            "bid": float(market.bid) if market.bid else None,
+            "ask": float(market.ask) if market.ask else None,
+            "last": float(market.last) if market.last else None,
+            "volume": int(market.volume) if market.volume else None,
+            "previous_close": float(market.previous_close),
+            "market_status": market.market_status,
+            "spy_change_pct": float(market.spy_change_pct),
+            "atm_center": int(market.atm_center),
+            "atm_min": int(market.atm_min),
+            "atm_max": int(market.atm_max)
+        }
+
+    def flow_entity(self, flow_data: dict) -> Dict[str, Any]:
+        ts = flow_data.get("timestamp", datetime.now().timestamp())
+        return {
+            "PartitionKey": self._partition_key(ts),
+            "RowKey": self._to_rev_key_new(ts),  # 🔴 CAMBIADO a nuevo formato
+            "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "spy_price": float(flow_data["spy_price"]),
+            "cum_call_flow": float(flow_data["cum_call_flow"]),
+            "cum_put_flow": float(flow_data["cum_put_flow"]),
+            "net_flow": float(flow_data["net_flow"])
+        }
+
+    def gamma_entity(self, gamma: dict) -> Dict[str, Any]:
+        ts = gamma.get("timestamp", datetime.now().timestamp())
+        return {
+            "PartitionKey": self._partition_key(ts),
+            "RowKey": self._to_rev_key_new(ts),
+            "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "net_gex": float(gamma["net_gex"]),
+            "gamma_regime": float(gamma["gamma_regime"]),
+            "pinning_risk": float(gamma["pinning_risk"]),
+            "atm_flow": float(gamma["atm_flow"]),
+            "net_flow": float(gamma["net_flow"]),
+            "gamma_weighted_flow": float(gamma["gamma_weighted_flow"]),
+            # Gamma walls as JSON string (Azure Tables don't support arrays)
+            "gamma_walls": self.encode_gamma_walls(gamma.get("gamma_walls", [])),
+            "gamma_walls_v": GAMMA_WALLS_VERSION,
+        }
+
+    def anomaly_entity(self, anomaly: AnomaliesSnapshot) -> Dict[str, Any]:
+        return {
+            "PartitionKey": self._partition_key(anomaly.timestamp),
+            "RowKey": self._to_rev_key_new(anomaly.timestamp),
+            "timestamp": datetime.fromtimestamp(anomaly.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "strike": float(anomaly.strike),
+            "option_type": anomaly.option_type,
+            "bid": float(anomaly.bid) if anomaly.bid else None,
+            "ask": float(anomaly.ask) if anomaly.ask else None,
+            "mid_price": float(anomaly.mid_price),
+            "expected_price": float(anomaly.expected_price),
+            "deviation_percent": float(anomaly.deviation_percent),
+            "volume": int(anomaly.volume) if anomaly.volume else 0,
+            "open_interest": int(anomaly.open_interest) if anomaly.open_interest else 0,
+            "severity": anomaly.severity
+        }
+
     # --- ESCRITURA (POST) --- TODOS USAN _to_rev_key_new AHORA
 
     def save_spymarket(self, market: SpymarketSnapshot) -> bool:
         try:
-            client = self._get_table("market")
-            entity = {
-                "PartitionKey": "SPY",
-                "RowKey": self._to_rev_key_new(market.timestamp),  # 🔴 CAMBIADO a nuevo formato
-                "timestamp": datetime.fromtimestamp(market.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
-                "price": float(market.price),
-                "bid": float(market.bid) if market.bid else None,
-                "ask": float(market.ask) if market.ask else None,
-                "last": float(market.last) if market.last else None,
-                "volume": int(market.volume) if market.volume else None,
-                "previous_close": float(market.previous_close),
-                "market_status": market.market_status,
-                "spy_change_pct": float(market.spy_change_pct),
-                "atm_center": int(market.atm_center),
-                "atm_min": int(market.atm_min),
-                "atm_max": int(market.atm_max)
-            }
+            entity = self.spymarket_entity(market)
             with storage_operation_duration_seconds.labels(operation="save_market").time():
-                client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+                self._upsert("market", entity)
             storage_operations_total.labels(operation="save_market", status="success").inc()
             return True
         except Exception as e:
@@ -118,18 +397,8 @@ class StorageClient:
 
     def save_flow(self, flow_data: dict) -> bool:
         try:
-            client = self._get_table("flow")
-            ts = flow_data.get("timestamp", datetime.now().timestamp())
-            entity = {
-                "PartitionKey": "SPY",
-                "RowKey": self._to_rev_key_new(ts),  # 🔴 CAMBIADO a nuevo formato
-                "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
-                "spy_price": float(flow_data["spy_price"]),
-                "cum_call_flow": float(flow_data["cum_call_flow"]),
-                "cum_put_flow": float(flow_data["cum_put_flow"]),
-                "net_flow": float(flow_data["net_flow"])
-            }
-            client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+            entity = self.flow_entity(flow_data)
+            self._upsert("flow", entity)
             return True
         except Exception as e:
             logger.error(f"❌ Error save_flow: {e}")
@@ -146,25 +415,9 @@ class StorageClient:
             True if saved successfully, False if error
         """
         try:
-            client = self._get_table("gamma")
-            ts = gamma.get("timestamp", datetime.now().timestamp())
-            
-            entity = {
-                "PartitionKey": "SPY",
-                "RowKey": self._to_rev_key_new(ts),
-                "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
-                "net_gex": float(gamma["net_gex"]),
-                "gamma_regime": float(gamma["gamma_regime"]),
-                "pinning_risk": float(gamma["pinning_risk"]),
-                "atm_flow": float(gamma["atm_flow"]),
-                "net_flow": float(gamma["net_flow"]),
-                "gamma_weighted_flow": float(gamma["gamma_weighted_flow"]),
-                # Gamma walls as JSON string (Azure Tables don't support arrays)
-                "gamma_walls": str(gamma.get("gamma_walls", []))
-            }
-            
+            entity = self.gamma_entity(gamma)
             with storage_operation_duration_seconds.labels(operation="save_gamma").time():
-                client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+                self._upsert("gamma", entity)
             
             storage_operations_total.labels(operation="save_gamma", status="success").inc()
             logger.debug(f"✅ Gamma metrics saved: NetGEX={gamma['net_gex']:.3f}")
@@ -179,23 +432,8 @@ class StorageClient:
 
     def save_anomalies(self, anomaly: AnomaliesSnapshot) -> bool:
         try:
-            client = self._get_table("anomalies")
-            entity = {
-                "PartitionKey": "SPY",  # ← FIJO, como en flow
-                "RowKey": self._to_rev_key_new(anomaly.timestamp),
-                "timestamp": datetime.fromtimestamp(anomaly.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
-                "strike": float(anomaly.strike),
-                "option_type": anomaly.option_type,
-                "bid": float(anomaly.bid) if anomaly.bid else None,
-                "ask": float(anomaly.ask) if anomaly.ask else None,
-                "mid_price": float(anomaly.mid_price),
-                "expected_price": float(anomaly.expected_price),
-                "deviation_percent": float(anomaly.deviation_percent),
-                "volume": int(anomaly.volume) if anomaly.volume else 0,
-                "open_interest": int(anomaly.open_interest) if anomaly.open_interest else 0,
-                "severity": anomaly.severity
-            }
-            client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+            entity = self.anomaly_entity(anomaly)
+            self._upsert("anomalies", entity)
             return True
         except Exception as e:
             logger.error(f"❌ Error save_anomalies: {e}")
@@ -203,29 +441,35 @@ class StorageClient:
 
     def save_volumes(self, volume: VolumesSnapshot) -> bool:
         try:
-            client = self._get_table("volumes")
             entity = {
-                "PartitionKey": "SPY",
+                "PartitionKey": self._partition_key(volume.timestamp),
                 "RowKey": self._to_rev_key_new(volume.timestamp),  # 🔴 CAMBIADO a nuevo formato
                 "timestamp": datetime.fromtimestamp(volume.timestamp, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
                 "put_vol": float(volume.put_vol),
                 "call_vol": float(volume.call_vol),
                 "total_vol": float(volume.total_vol)
             }
-            client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+            self._upsert("volumes", entity)
             return True
         except Exception as e:
             logger.error(f"❌ Error save_volumes: {e}")
             return False
 
+    def save_rollup(self, alias: str, entity: dict) -> bool:
+        """Guarda un bucket de rollup cerrado (services/rollups.py) en su tabla."""
+        try:
+            self._upsert(alias, entity)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error save_rollup ({alias}): {e}")
+            return False
+
     def save_market_event(self, event: dict) -> bool:
         """
         Saves a Market Event (e.g. TradingView Signal) to the marketevents table.
-        Standardized with reversed timestamp RowKey and PartitionKey='SPY'.
+        Standardized with reversed timestamp RowKey and the configured PartitionKey scheme.
         """
         try:
-            client = self._get_table("events")
-            
             logger.info(f"🔍 save_market_event INPUT: {repr(event)}")
             
             # ✅ NUEVO: Detectar y parsear timestamp (TradingView envía ISO 8601)
@@ -238,7 +482,7 @@ class StorageClient:
                 ts = float(raw_ts)
             
             entity = {
-                "PartitionKey": "SPY",
+                "PartitionKey": self._partition_key(ts),
                 "RowKey": self._to_rev_key_new(ts),
                 "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
                 "event_type": "TV_SIGNAL",
@@ -247,7 +491,7 @@ class StorageClient:
                 "option_type": event.get("option_type", "N/A"),
                 "symbol": event.get("symbol", "SPY")
             }
-            client.upsert_entity(mode=UpdateMode.REPLACE, entity=entity)
+            self._write("events", entity)
             logger.info(f"✅ Market event saved: {event.get('action')} @ {event.get('price')}")
             return True
         except Exception as e:
@@ -256,6 +500,57 @@ class StorageClient:
         
     # --- LECTURAS OPTIMIZADAS (TODAS USAN _to_rev_key_new) ---
 
+    def query_window(
+        self,
+        alias: str,
+        hours: Optional[float] = None,
+        since_ts: Optional[float] = None,
+        max_results: Optional[int] = None,
+        select: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        Registros de una ventana temporal en UNA query paginada (más recientes primero).
+
+        Sustituye el patrón "query del último RowKey + query de rango" (dos round
+        trips secuenciales):
+
+        - since_ts: ventana de reloj, límite inferior absoluto (RowKey le rev(since_ts)).
+          Si es anterior al archivo frío, los días archivados se leen del Parquet.
+        - hours: últimas N horas REALES de datos (relativas al registro más reciente,
+          independiente de NOW). El límite inferior se acota en servidor con el
+          watermark de la tabla (si existe) y se ajusta exacto en cliente con el
+          primer registro recibido, cortando la iteración al salir de la ventana.
+
+        Args:
+            alias: Alias de tabla
+            hours: Ventana relativa al último registro
+            since_ts: Límite inferior absoluto (timestamp Unix)
+            max_results: Máximo de registros
+            select: Campos a recuperar (RowKey se añade siempre)
+        """
+        lower = since_ts
+        if hours is not None and alias in self._watermarks:
+            # Un watermark atrasado (escrituras de otra réplica) solo ensancha la ventana
+            hint = self._watermarks[alias] - hours * 3600
+            lower = hint if lower is None else max(lower, hint)
+
+        results = self._tiered_scan(alias, lower, select=select)
+
+        entities: List[Dict] = []
+        cutoff = None
+        for entity in results:
+            if hours is not None:
+                ts = self._rev_key_to_timestamp(entity["RowKey"])
+                if cutoff is None:
+                    self._note_watermark(alias, ts)
+                    cutoff = ts - hours * 3600
+                elif ts < cutoff:
+                    break
+            entities.append(dict(entity))
+            if max_results is not None and len(entities) >= max_results:
+                break
+        return entities
+
     
     def get_spymarket_latest(self) -> Dict:
         """
@@ -263,12 +558,9 @@ class StorageClient:
         ✅ OPTIMIZADO: Usa RowKey invertido (ya funciona bien)
         """
         try:
-            client = self._get_table("market")
-            
             # Query sin filtro temporal - solo PartitionKey
             # Con reversed timestamps: primer resultado = más reciente (RowKey más pequeño)
-            query = "PartitionKey eq 'SPY'"
-            page_results = client.query_entities(query, results_per_page=1)
+            page_results = self._scan("market", results_per_page=1)
             
             # Retornar primer elemento sin convertir a lista
             for entity in page_results:
@@ -288,29 +580,11 @@ class StorageClient:
         Garantiza ventana temporal de N horas calendario, aunque los datos sean antiguos.
         """
         try:
-            client = self._get_table("market")
-                
-            # 1. Obtener registro más reciente disponible
-            query_latest = "PartitionKey eq 'SPY'"
-            latest_entities = list(client.query_entities(query_latest, results_per_page=1))
-                
-            if not latest_entities:
+            result = self.query_window("market", hours=hours)
+            if not result:
                 logger.warning("⚠️ No hay datos en spymarket")
                 return []
                 
-            # 2. Decodificar RowKey → timestamp
-            latest_rowkey = latest_entities[0]['RowKey']
-            latest_ts = self._rev_key_to_timestamp(latest_rowkey)
-                
-            # 3. Calcular cutoff (N horas antes del último registro)
-            cutoff_ts = latest_ts - (hours * 3600)
-            cutoff_rowkey = self._to_rev_key_new(cutoff_ts)
-                
-            # 4. Query rango temporal REAL
-            query = f"PartitionKey eq 'SPY' and RowKey >= '{latest_rowkey}' and RowKey <= '{cutoff_rowkey}'"
-            entities = list(client.query_entities(query))
-            result = [dict(e) for e in entities]
-                
             logger.info(f"📊 spymarket: {len(result)} registros en últimas {hours}h reales")
             return result
                 
@@ -318,40 +592,27 @@ class StorageClient:
             logger.error(f"❌ Error get_spymarket: {e}")
             return []
 
-    def get_flow(self, limit: int = 4000) -> List[Dict]:
+    def get_flow(self, limit: int = 4000, since: Optional[float] = None) -> List[Dict]:
         """
-        Devuelve los últimos 'limit' registros de flow.
+        Devuelve los últimos 'limit' registros de flow (posteriores a `since` si se indica).
         ✅ OPTIMIZADO:
         - Field selection para reducir peso del payload.
         - Iteración automática con resultados_per_page=1000.
-        - Decimation inteligente si supera los 4000 puntos.
+        - Sin decimation: el downsampling (minmax/LTTB) se aplica en /flow.
+        - since: rango de RowKey (solo se leen las filas nuevas).
         """
         try:
-            client = self._get_table("flow")
-            query = "PartitionKey eq 'SPY'"
             fields = ["timestamp", "cum_call_flow", "cum_put_flow", "spy_price"]
             
             # ✅ HARD LIMIT: islice() corta iterador en limit exacto (no lee más allá)
-            results = client.query_entities(
-                query, 
-                results_per_page=1000,
-                select=fields
-            )
+            results = self._scan("flow", since_ts=since, select=fields)
             all_entities = [dict(e) for e in islice(results, limit)]
 
             total_fetched = len(all_entities)
             if total_fetched == 0:
                 return []
 
-            # 2. DECIMATION INTELIGENTE
-            target_points = 4000
-            if total_fetched > target_points:
-                step = total_fetched // target_points
-                if step < 1: step = 1
-                all_entities = all_entities[::step]
-                logger.info(f"✂️ Decimation: {total_fetched} -> {len(all_entities)} (step {step})")
-            
-            # 3. Ordenar ASC para frontend
+            # 2. Ordenar ASC para frontend (el downsampling se hace en /flow)
             all_entities.reverse()
             return all_entities
             
@@ -359,68 +620,96 @@ class StorageClient:
             logger.error(f"❌ Error get_flow: {e}")
             return []
 
-    def get_anomalies(self, limit: int = 20) -> List[Dict]:
+    def get_anomalies(self, limit: int = 20, since: Optional[float] = None) -> List[Dict]:
         """
         Devuelve las últimas 'limit' anomalías (por defecto 50).
-        SIN filtrar por tiempo, SIN lógica de mercado.
+        SIN filtrar por tiempo (salvo `since`: solo posteriores), SIN lógica de mercado.
         Ordenadas por timestamp (más recientes primero en la selección,
         pero el frontend ya las gestiona).
         """
         try:
-            client = self._get_table("anomalies")
-            
-            # 1. Query: registros con PartitionKey 'SPY'
+            # 1. Query: registros de las particiones SPY (más reciente primero)
             #    Los RowKey más pequeños = más recientes
-            query = "PartitionKey eq 'SPY'"
-            
             fields = ["timestamp", "strike", "option_type", "mid_price", "expected_price", "deviation_percent", "severity"]
             
             # 2. ✅ HARD LIMIT: islice() corta en limit*2 exacto (no lee toda la tabla)
             entities = list(islice(
-                client.query_entities(query, results_per_page=limit * 2, select=fields),
+                self._scan("anomalies", since_ts=since, select=fields, results_per_page=limit * 2),
                 limit * 2
             ))
             if not entities:
                 return []
             
             # 3. Separar por tipo (ya vienen ordenados por timestamp descendente)
-            calls = []
-            puts = []
-            
-            for entity in entities:
-                e = dict(entity)
-                if e.get('option_type') == 'CALL':
-                    calls.append(e)
-                elif e.get('option_type') == 'PUT':
-                    puts.append(e)
-                
-                # Limitamos a 5 de cada tipo (o el valor que quieras)
-                if len(calls) >= 5 and len(puts) >= 5:
-                    break
-                        
-            logger.info(f"📊 anomalies: {len(calls)} calls, {len(puts)} puts (últimas {limit} registros)")
-            return calls[:5] + puts[:5]  # 5 de cada tipo = 10 total
+            result = self.select_anomalies(dict(entity) for entity in entities)
+            logger.info(f"📊 anomalies: {len(result)} (últimas {limit} registros)")
+            return result
             
         except Exception as e:
             logger.error(f"❌ Error get_anomalies: {e}", exc_info=True)
             return []
     
-    def get_gamma_metrics(self, limit: int = 1) -> List[Dict]:
+    @staticmethod
+    def select_anomalies(entities: Iterable[Dict], per_type: int = 5) -> List[Dict]:
+        """Las `per_type` anomalías más recientes de cada tipo (entrada: más recientes primero)."""
+        calls = []
+        puts = []
+        for e in entities:
+            if e.get('option_type') == 'CALL':
+                calls.append(e)
+            elif e.get('option_type') == 'PUT':
+                puts.append(e)
+            
+            # Limitamos a 5 de cada tipo (o el valor que quieras)
+            if len(calls) >= per_type and len(puts) >= per_type:
+                break
+        return calls[:per_type] + puts[:per_type]  # 5 de cada tipo = 10 total
+
+    @staticmethod
+    def encode_gamma_walls(walls: Any) -> str:
+        """gamma_walls → JSON compacto (versión GAMMA_WALLS_VERSION)."""
+        return json.dumps(walls if walls is not None else [], separators=(",", ":"), default=str)
+
+    @staticmethod
+    def parse_gamma_walls(value: Any, version: Optional[int] = None) -> List:
+        """
+        gamma_walls persistido como string → lista.
+
+        Filas con gamma_walls_v = 2 → json.loads. Filas antiguas (sin versión,
+        str(list)) se decodifican al leerlas con ast.literal_eval hasta que el
+        backfill (scripts/backfill_gamma_walls.py) las reescriba.
+        """
+        if not isinstance(value, str):
+            return value if value is not None else []
+        if version == GAMMA_WALLS_VERSION:
+            try:
+                return json.loads(value)
+            except ValueError:
+                return []
+        gamma_walls_legacy_decodes_total.inc()
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return []
+
+    def get_gamma_metrics(self, limit: int = 1, since: Optional[float] = None) -> List[Dict]:
         """
         Obtiene últimas métricas gamma (similar a get_anomalies).
         RowKey invertidos = primeros son más recientes.
         
+        Args:
+            limit: Máximo de registros
+            since: Solo registros posteriores a este timestamp Unix
+        
         Returns:
             List of gamma metrics dicts with parsed gamma_walls
         """
         try:
-            client = self._get_table("gamma")
-            query = "PartitionKey eq 'SPY'"
-            fields = ["timestamp", "net_gex", "gamma_regime", "pinning_risk", "gamma_walls"]
+            fields = ["timestamp", "net_gex", "gamma_regime", "pinning_risk", "gamma_walls", "gamma_walls_v"]
             
             # ✅ HARD LIMIT: Solo necesitamos el snapshot más reciente
             entities = list(islice(
-                client.query_entities(query, results_per_page=limit, select=fields),
+                self._scan("gamma", since_ts=since, select=fields, results_per_page=limit),
                 limit
             ))
             
@@ -431,13 +720,11 @@ class StorageClient:
             result = []
             for e in entities:
                 entity_dict = dict(e)
-                # Convertir string de gamma_walls a lista
-                if 'gamma_walls' in entity_dict and isinstance(entity_dict['gamma_walls'], str):
-                    import ast
-                    try:
-                        entity_dict['gamma_walls'] = ast.literal_eval(entity_dict['gamma_walls'])
-                    except:
-                        entity_dict['gamma_walls'] = []
+                # Convertir string de gamma_walls a lista (JSON, o legado vía literal_eval)
+                if 'gamma_walls' in entity_dict:
+                    entity_dict['gamma_walls'] = self.parse_gamma_walls(
+                        entity_dict['gamma_walls'], entity_dict.pop('gamma_walls_v', None)
+                    )
                 result.append(entity_dict)
             
             logger.info(f"✅ gamma_metrics: {len(result)} registros recuperados")
@@ -453,45 +740,12 @@ class StorageClient:
         ✅ CORREGIDO: Usa mismo patrón que flow
         """
         try:
-            client = self._get_table("volumes")
-            
-            # 1. Obtener registro más reciente
-            latest = list(client.query_entities("PartitionKey eq 'SPY'", results_per_page=1))
-            if not latest:
+            all_entities = self.query_window("volumes", hours=hours, max_results=max_results)
+            if not all_entities:
                 logger.warning("⚠️ No hay datos en volumes")
                 return []
             
-            # 2. Decodificar RowKey → timestamp
-            latest_rk = latest[0]['RowKey']
-            latest_ts = self._rev_key_to_timestamp(latest_rk)
-            
-            # 3. Calcular cutoff
-            cutoff_ts = latest_ts - (hours * 3600)
-            cutoff_rk = self._to_rev_key_new(cutoff_ts)
-            
-            # 4. ✅ QUERY CORREGIDA: mismo patrón que flow
-            query_filter = f"PartitionKey eq 'SPY' and RowKey ge '{cutoff_rk}' and RowKey le '{latest_rk}'"
-            
-            # 5. Ejecutar query con paginación
-            all_entities = []
-            continuation_token = None
-            
-            while len(all_entities) < max_results:
-                if continuation_token:
-                    page_results = client.query_entities(query_filter, results_per_page=1000, continuation_token=continuation_token)
-                else:
-                    page_results = client.query_entities(query_filter, results_per_page=1000)
-                
-                for entity in page_results:
-                    all_entities.append(dict(entity))
-                    if len(all_entities) >= max_results:
-                        break
-                
-                continuation_token = page_results.continuation_token
-                if not continuation_token:
-                    break
-            
-            # 6. Invertir para tener recientes primero
+            # Invertir: orden cronológico (ASC)
             all_entities.reverse()
             
             logger.info(f"📊 volumes: {len(all_entities)} registros en últimas {hours}h")
@@ -501,15 +755,13 @@ class StorageClient:
             logger.error(f"❌ Error get_volumes: {e}")
             return []
         
-    def get_market_events(self, limit: int = 100) -> List[Dict]:
+    def get_market_events(self, limit: int = 100, since: Optional[float] = None) -> List[Dict]:
         """
-        Retrieves recent market events (TradingView signals).
+        Retrieves recent market events (TradingView signals), optionally only those after `since`.
         """
         try:
-            client = self._get_table("events")
-            query = "PartitionKey eq 'SPY'"
             # RowKey invertidos: los primeros son los más recientes
-            entities = client.query_entities(query, results_per_page=limit)
+            entities = self._scan("events", since_ts=since, results_per_page=limit)
             
             result = []
             for e in entities:
@@ -523,42 +775,44 @@ class StorageClient:
             logger.error(f"❌ Error get_market_events: {e}")
             return []
 
-    def purge_old_data(self, days: int = 7):
-        """Elimina datos más antiguos que N días usando batch deletes (hasta 100 por request)."""
+    def get_rollups(self, alias: str, since_ts: float, max_results: int = 10000) -> List[Dict]:
+        """
+        Buckets de rollup con inicio >= since_ts, en orden ASC (cronológico).
+        RowKey invertido: bucket más reciente = RowKey más pequeño.
+        """
         try:
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-            rev_cutoff = self._to_rev_key_new(cutoff_date.timestamp())
-
-            for alias in ["market", "flow", "volumes"]:
-                client = self._get_table(alias)
-                # RowKey MAYOR que cutoff = datos ANTIGUOS (SÍ borrar)
-                query = f"PartitionKey eq 'SPY' and RowKey gt '{rev_cutoff}'"
-                entities = list(client.query_entities(query_filter=query, select=["RowKey", "PartitionKey"]))
-
-                if not entities:
-                    continue
-
-                # ✅ OPT: Batch delete — hasta 100 entidades por request
-                count = 0
-                batch_size = 100
-                for i in range(0, len(entities), batch_size):
-                    batch = entities[i : i + batch_size]
-                    operations = [
-                        ("delete", {"PartitionKey": e["PartitionKey"], "RowKey": e["RowKey"]})
-                        for e in batch
-                    ]
-                    client.submit_transaction(operations)
-                    count += len(batch)
-
-                if count > 0:
-                    logger.info(f"🧹 Purge: {count} registros eliminados de {alias}")
+            entities = self.query_window(alias, since_ts=since_ts, max_results=max_results)
+            entities.reverse()
+            logger.info(f"📊 {alias}: {len(entities)} buckets")
+            return entities
+        except Exception as e:
+            logger.error(f"❌ Error get_rollups({alias}): {e}")
+            return []
 
-            return True
+    def get_recent(self, alias: str, limit: int) -> List[Dict]:
+        """
+        Últimos `limit` registros completos de una tabla (más recientes primero).
+        Usado para hidratar los ring buffers en memoria al arrancar.
+        """
+        try:
+            entities = [dict(e) for e in islice(self._scan(alias), limit)]
+            logger.info(f"📊 {alias}: {len(entities)} registros recientes recuperados")
+            return entities
         except Exception as e:
-            logger.error(f"❌ Error en purge_old_data: {e}")
-            return False
+            logger.error(f"❌ Error get_recent({alias}): {e}")
+            return []
+
+def create_storage_client() -> StorageClient:
+    """StorageClient del backend configurado (settings.storage_backend)."""
+    if settings.storage_backend == "sqlite":
+        from services.sqlite_storage import SQLiteStorageClient
+        return SQLiteStorageClient(settings.storage_sqlite_path)
+    if settings.storage_backend != "azure":
+        raise ValueError(f"storage_backend inválido: {settings.storage_backend!r}")
+    return StorageClient()
+
 
 # Singleton instance
-storage_client = StorageClient()
+storage_client = create_storage_client()
 
     
@@ -0,0 +1,140 @@
+"""
+Write-Behind Buffer - Escrituras diferidas y agrupadas hacia Azure Table Storage.
+
+En vez de un upsert_entity (un round trip) por registro, StorageClient deja las
+entidades en este buffer, que las agrupa por (tabla, PartitionKey) y las envía
+con submit_transaction en lotes de hasta 100 (límite de Azure para un
+entity-group transaction).
+
+- Flush por tamaño (un grupo llega a `batch_size`) o por tiempo (`flush_interval`).
+- Deduplicación por RowKey dentro del buffer (última escritura gana): una
+  transacción con RowKeys repetidas es rechazada por Azure.
+- Memoria acotada: por encima de `max_pending` entidades se descarta la más
+  antigua del grupo más grande y se cuenta en métricas.
+- stop() hace un flush final (llamado desde el lifespan de FastAPI).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from metrics import (
+    storage_flush_duration_seconds,
+    storage_flush_entities,
+    storage_write_buffer_pending,
+    storage_write_buffer_dropped_total,
+)
+
+logger = logging.getLogger(__name__)
+
+# Límite de Azure Table Storage por entity-group transaction
+MAX_TRANSACTION_SIZE = 100
+
+BufferKey = Tuple[str, str]  # (table alias, PartitionKey)
+
+
+class WriteBehindBuffer:
+    """Buffer de entidades por (tabla, partición) con flush en background."""
+
+    def __init__(
+        self,
+        flush_fn: Callable[[str, List[dict]], None],
+        batch_size: int = MAX_TRANSACTION_SIZE,
+        flush_interval: float = 1.0,
+        max_pending: int = 5000,
+    ):
+        """
+        Args:
+            flush_fn: Escribe un lote (<= 100 entidades, misma partición) en la tabla `alias`
+            batch_size: Entidades por grupo que disparan un flush inmediato (<= 100)
+            flush_interval: Segundos máximos que una entidad espera en el buffer
+            max_pending: Máximo de entidades en memoria (todas las tablas)
+        """
+        self._flush_fn = flush_fn
+        self.batch_size = min(batch_size, MAX_TRANSACTION_SIZE)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._buffers: Dict[BufferKey, "OrderedDict[str, dict]"] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="storage-write-behind", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"✅ Write-behind buffer iniciado (batch={self.batch_size}, "
+            f"interval={self.flush_interval}s, max_pending={self.max_pending})"
+        )
+
+    def stop(self) -> None:
+        """Detiene el thread de flush y vacía el buffer (flush final síncrono)."""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+        logger.info("Write-behind buffer detenido (flush final completado)")
+
+    def add(self, alias: str, entity: dict) -> None:
+        """Encola una entidad para upsert (REPLACE) diferido."""
+        key = (alias, entity["PartitionKey"])
+        with self._lock:
+            buffer = self._buffers.setdefault(key, OrderedDict())
+            if entity["RowKey"] in buffer:
+                del buffer[entity["RowKey"]]  # Última escritura gana (y pasa al final)
+            else:
+                self._pending += 1
+            buffer[entity["RowKey"]] = entity
+
+            if self._pending > self.max_pending:
+                self._drop_oldest()
+
+            storage_write_buffer_pending.set(self._pending)
+            full = len(buffer) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def _drop_oldest(self) -> None:
+        """Descarta la entidad más antigua del grupo más grande (con el lock tomado)."""
+        key = max(self._buffers, key=lambda k: len(self._buffers[k]))
+        self._buffers[key].popitem(last=False)
+        self._pending -= 1
+        storage_write_buffer_dropped_total.labels(table=key[0]).inc()
+        logger.warning(f"⚠️ Write-behind buffer lleno ({self.max_pending}), descartando entidad de {key[0]}")
+
+    def _run(self) -> None:
+        while self._running:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Write-behind flush error: {e}")
+
+    def flush(self) -> None:
+        """Envía todo lo pendiente en transacciones de hasta 100 entidades."""
+        with self._flush_lock:
+            with self._lock:
+                buffers, self._buffers = self._buffers, {}
+                self._pending = 0
+                storage_write_buffer_pending.set(0)
+
+            for (alias, _), entities in buffers.items():
+                batch = list(entities.values())
+                for i in range(0, len(batch), MAX_TRANSACTION_SIZE):
+                    chunk = batch[i : i + MAX_TRANSACTION_SIZE]
+                    start = time.time()
+                    self._flush_fn(alias, chunk)
+                    storage_flush_duration_seconds.labels(table=alias).observe(time.time() - start)
+                    storage_flush_entities.labels(table=alias).observe(len(chunk))
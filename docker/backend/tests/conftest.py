@@ -0,0 +1,16 @@
+"""Configuración común de tests: settings mínimos y backend importable."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings obligatorios (config.Settings) con valores de prueba
+for _name, _value in {
+    "AZURE_SIGNALR_CONNECTION_STRING": "Endpoint=https://test.service.signalr.net;AccessKey=dGVzdA==;Version=1.0;",
+    "AZURE_STORAGE_CONNECTION_STRING": "UseDevelopmentStorage=true",
+    "APPINSIGHTS_INSTRUMENTATIONKEY": "test",
+    "TV_WEBHOOK_SECRET": "test",
+    "IBKR_USERNAME": "test",
+    "IBKR_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(_name, _value)
@@ -0,0 +1,45 @@
+"""recent_history: cobertura de lecturas incrementales cuando el ring descarta registros."""
+import pytest
+
+import services.recent_history as recent_history_module
+from services.recent_history import RecentHistory
+from services.storage_client import storage_client
+
+CAPACITY = 5
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Histórico hidratado desde una tabla vacía (complete=True) y con ingest local reciente."""
+    monkeypatch.setattr(recent_history_module, "is_market_hours_cet", lambda: False)
+    history = RecentHistory(storage_client, {name: CAPACITY for name in ("spymarket", "flow", "gamma", "anomalies")})
+    for stream in history._streams.values():
+        stream.hydrated = True
+        stream.complete = True
+    return history
+
+
+def _flow(ts):
+    return {"timestamp": ts, "cum_call_flow": ts, "cum_put_flow": -ts, "net_flow": 0.0, "spy_price": 600.0}
+
+
+def test_since_older_than_ring_falls_back_to_storage(history):
+    t0 = 1_700_000_000.0
+    for n in range(20):
+        history.record_flow(_flow(t0 + n))
+
+    # El ring solo conserva 15..19: un cursor anterior no está cubierto
+    assert history.flow(100, since=t0 + 2) is None
+    assert history.flow(100) is None
+
+    # Un cursor dentro del ring sí se sirve desde memoria
+    assert [p["cum_call_flow"] - t0 for p in history.flow(100, since=t0 + 16)] == [17, 18, 19]
+
+
+def test_complete_while_ring_not_full(history):
+    t0 = 1_700_000_000.0
+    for n in range(3):
+        history.record_flow(_flow(t0 + n))
+
+    # Tabla entera en memoria: cualquier cursor o límite está cubierto
+    assert [p["cum_call_flow"] - t0 for p in history.flow(100, since=t0 - 10)] == [0, 1, 2]
@@ -0,0 +1,106 @@
+"""_rollup_history: buckets recién cerrados y cursor `since` con la lista persistida cacheada."""
+import asyncio
+import time
+
+import pytest
+
+import app as backend
+from services.async_storage import async_storage
+from services.read_cache import read_cache
+from services.rollups import rollups
+
+HOURS = 1
+POINTS = 2000  # 1h / 10s = 360 buckets → resolución 10s
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Tabla de rollups simulada: solo contiene lo que el test persiste explícitamente."""
+    table = {}
+
+    async def get_rollups(alias, since_ts, max_results=10000):
+        buckets = [b for b in table.values() if b["bucket_start"] >= since_ts]
+        return sorted(buckets, key=lambda b: b["bucket_start"])
+
+    monkeypatch.setattr(async_storage, "get_rollups", get_rollups)
+    monkeypatch.setattr(backend.recent_history, "newest_ts", lambda stream: None)
+    rollups._open.clear()
+    rollups._closed.clear()
+    read_cache.invalidate("flow_rollup")
+    yield table
+    rollups._open.clear()
+    rollups._closed.clear()
+    read_cache.invalidate("flow_rollup")
+
+
+def _ingest(base, offset, value, table=None):
+    closed = rollups.update("flow", base + offset, {
+        "cum_call_flow": value, "cum_put_flow": -value, "net_flow": 0.0, "spy_price": 600.0,
+    })
+    for alias, entity in closed:
+        if table is not None and alias == "flow_10s":
+            table[entity["RowKey"]] = dict(entity)
+
+
+def _read(since=None):
+    return asyncio.run(backend._rollup_history("flow", HOURS, POINTS, since))
+
+
+def test_closed_buckets_visible_before_cache_refresh(stored):
+    base = float(int(time.time() // 300) * 300 - 600)
+    _ingest(base, 0, 1.0)
+    _ingest(base, 10, 2.0, stored)           # cierra 0 (persistido)
+    assert [b["bucket_start"] - base for b in _read()["history"]] == [0, 10]
+
+    # 20 y 30 se cierran sin llegar a la tabla (write-behind) y con la lista cacheada
+    _ingest(base, 20, 3.0)
+    _ingest(base, 30, 4.0)
+    _ingest(base, 40, 5.0)
+    starts = [b["bucket_start"] - base for b in _read()["history"]]
+    assert starts == [0, 10, 20, 30, 40]
+
+
+def test_since_cursor_never_skips_undelivered_buckets(stored):
+    base = float(int(time.time() // 300) * 300 - 600)
+    _ingest(base, 0, 1.0)
+    _ingest(base, 10, 2.0, stored)           # cierra 0 (persistido)
+    first = _read()
+    assert first["cursor"] == base           # último bucket persistido, no el abierto
+
+    # Entre dos lecturas incrementales se cierran 10, 20 y 30 con valores finales
+    _ingest(base, 15, 2.5)
+    _ingest(base, 20, 3.0)
+    _ingest(base, 30, 4.0)
+    _ingest(base, 40, 5.0)
+    second = _read(first["cursor"])
+    by_start = {b["bucket_start"] - base: b for b in second["history"]}
+    assert sorted(by_start) == [0, 10, 20, 30, 40]
+    assert by_start[10]["cum_call_flow"] == 2.5    # valor final del bucket 10
+    assert second["cursor"] <= base + 20            # no salta buckets no persistidos
+
+    # Los buckets se persisten y la caché se refresca: el cursor avanza sin huecos
+    for bucket in rollups.recent_buckets("flow", "10s")[:-1]:
+        stored[bucket["RowKey"]] = bucket
+    read_cache.invalidate("flow_rollup")
+    third = _read(second["cursor"])
+    assert [b["bucket_start"] - base for b in third["history"]][-2:] == [30, 40]
+    assert third["cursor"] == base + 30
+
+
+def test_restart_reopens_flushed_bucket(stored):
+    base = float(int(time.time() // 300) * 300 - 600)
+    _ingest(base, 1, 5.0)
+    _ingest(base, 2, 1.0)
+    saved = {alias: dict(entity) for alias, entity in rollups.flush()}   # shutdown: buckets parciales
+
+    class Storage:
+        async def get_recent(self, alias, limit):
+            return [saved[alias]] if alias in saved else []
+
+    asyncio.run(rollups.hydrate(Storage()))
+    _ingest(base, 3, 3.0)                    # mismo bucket tras el reinicio
+    bucket = rollups.recent_buckets("flow", "10s")[-1]
+    assert bucket["RowKey"] == saved["flow_10s"]["RowKey"]
+    assert bucket["count"] == 3
+    assert (bucket["cum_call_flow_open"], bucket["cum_call_flow_high"], bucket["cum_call_flow_low"]) == (5.0, 5.0, 1.0)
+    assert bucket["cum_call_flow"] == 3.0
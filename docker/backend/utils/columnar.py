@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar - Formato de respuesta columnar (struct-of-arrays) para históricos.
+
+Una respuesta de /flow con 8000 filas repite en cada dict las claves
+(`cum_call_flow`, `cum_put_flow`, ...) y un timestamp ISO de 20 caracteres.
+En formato columnar cada campo aparece una sola vez con la lista de valores,
+y los timestamps van como epoch (segundos, enteros):
+
+    filas:     [{"timestamp": "2026-01-02T15:30:00Z", "cum_call_flow": 1.5}, ...]
+    columnar:  {"timestamp": [1767367800, ...], "cum_call_flow": [1.5, ...]}
+
+Opt-in por petición: `?format=columnar` o cabecera
+`Accept: application/vnd.columnar+json`.
+
+Uso:
+    from utils.columnar import to_columns
+    payload["history"] = to_columns(payload["history"])
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from utils.downsampling import to_epoch
+
+FORMATS = ("rows", "columnar")
+COLUMNAR_MEDIA_TYPE = "application/vnd.columnar+json"
+
+# Claves internas de Azure que no se envían
+_SKIP_FIELDS = ("PartitionKey", "RowKey")
+
+
+def wants_columnar(fmt: Optional[str], accept: Optional[str]) -> bool:
+    """True si la petición pide formato columnar (`format=` tiene prioridad sobre `Accept`)."""
+    if fmt is not None:
+        return fmt == "columnar"
+    return bool(accept) and COLUMNAR_MEDIA_TYPE in accept
+
+
+def _epoch_int(value: Any) -> Optional[int]:
+    ts = to_epoch(value)
+    return int(ts) if math.isfinite(ts) else None
+
+
+def to_columns(records: List[Dict[str, Any]], time_key: str = "timestamp") -> Dict[str, List[Any]]:
+    """
+    Convierte una lista de registros en un dict campo → lista de valores.
+
+    Args:
+        records: Registros (mismo orden en todas las columnas)
+        time_key: Campo de timestamp a convertir a epoch entero
+
+    Returns:
+        Columnas en orden de primera aparición; None donde un registro no tiene el campo
+    """
+    fields: Dict[str, None] = {}
+    for record in records:
+        for field in record:
+            if field not in fields and field not in _SKIP_FIELDS:
+                fields[field] = None
+
+    columns = {field: [record.get(field) for record in records] for field in fields}
+    if time_key in columns:
+        columns[time_key] = [_epoch_int(value) for value in columns[time_key]]
+    return columns
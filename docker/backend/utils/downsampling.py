@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Downsampling - Reducción de series temporales conservando la forma visual.
+
+Sustituye la decimación por stride (entities[::step]), que descarta los picos
+de flow que el dashboard tiene que mostrar, por dos métodos vectorizados (NumPy):
+
+- minmax: envolvente por bucket. En cada bucket se conservan, para cada
+  columna, el punto mínimo y el máximo (además del primero y el último de
+  la serie). Ningún pico de ninguna columna se pierde.
+- lttb: Largest-Triangle-Three-Buckets por columna; se conserva la unión de
+  los puntos elegidos. Sigue la forma con menos puntos que minmax.
+
+Los buckets pueden ser por número de puntos (`points`) o por tiempo
+(`resolution`, segundos por bucket; solo minmax).
+
+Uso:
+    from utils.downsampling import downsample_records
+    history = downsample_records(history, ("cum_call_flow", "cum_put_flow", "spy_price"), points=2000)
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def to_epoch(value: Any) -> float:
+    """Timestamp de un registro (epoch o ISO 8601 'Z') → segundos epoch."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return np.nan
+
+
+def _column(records: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    """Columna numérica (None → NaN)."""
+    return np.array([r.get(key) for r in records], dtype=np.float64)
+
+
+def minmax_indices(buckets: np.ndarray, columns: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Índices de los puntos mínimo y máximo de cada columna dentro de cada bucket.
+
+    Args:
+        buckets: Id de bucket por fila (no decreciente)
+        columns: Columnas numéricas (NaN se ignora)
+
+    Returns:
+        Índices ordenados y únicos, incluyendo primera y última fila
+    """
+    n = len(buckets)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Primera fila de cada bucket dentro del orden (bucket, valor)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    selected = [np.array([0, n - 1])]
+    for values in columns:
+        low = np.where(np.isnan(values), np.inf, values)
+        high = np.where(np.isnan(values), -np.inf, values)
+        # lexsort estable por (bucket, valor): el primero de cada bucket es el mínimo
+        selected.append(np.lexsort((low, buckets))[starts])
+        selected.append(np.lexsort((high, buckets))[ends])
+    return np.unique(np.concatenate(selected))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets sobre una serie (x creciente).
+
+    El área del triángulo se evalúa vectorizada sobre todo el bucket; solo el
+    recorrido de buckets es secuencial (cada elección depende de la anterior).
+
+    Returns:
+        `threshold` índices ordenados (todos si la serie es más corta)
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    # Buckets interiores (la primera y la última fila van fijas)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    sum_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sum_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    mean_x = np.r_[sum_x / counts, x[-1]]
+    mean_y = np.r_[sum_y / counts, y[-1]]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Área (x2) del triángulo (prev, candidato, media del bucket siguiente)
+        area = np.abs(
+            (x[prev] - mean_x[b + 1]) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (mean_y[b + 1] - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+def downsample_records(
+    records: List[Dict[str, Any]],
+    columns: Sequence[str],
+    points: Optional[int] = None,
+    resolution: Optional[float] = None,
+    method: str = "minmax",
+    time_key: str = "timestamp",
+) -> List[Dict[str, Any]]:
+    """
+    Reduce una lista de registros (orden cronológico) conservando picos y forma.
+
+    Args:
+        records: Registros en orden ASC
+        columns: Campos numéricos cuya forma hay que conservar
+        points: Máximo de puntos a devolver (buckets por número de filas)
+        resolution: Segundos por bucket (minmax; si se indica, ignora points)
+        method: "minmax" (envolvente por bucket) o "lttb"
+        time_key: Campo con el timestamp (epoch o ISO 8601)
+
+    Returns:
+        Subconjunto de `records` en el mismo orden
+    """
+    n = len(records)
+    if n <= 2 or (resolution is None and (points is None or n <= points)):
+        return records
+
+    values = [_column(records, key) for key in columns]
+
+    if method == "lttb" and resolution is None:
+        x = np.array([to_epoch(r.get(time_key)) for r in records])
+        if not np.isfinite(x).all() or np.any(np.diff(x) < 0):
+            x = np.arange(n, dtype=np.float64)
+        per_column = max(points // max(len(columns), 1), 3)
+        idx = np.unique(np.concatenate([lttb_indices(x, y, per_column) for y in values]))
+    else:
+        t = None
+        if resolution is not None:
+            t = np.array([to_epoch(r.get(time_key)) for r in records])
+        if t is not None and np.isfinite(t).all():
+            buckets = np.floor(t / resolution).astype(np.int64)
+            buckets = np.maximum.accumulate(buckets)  # Robustez ante desorden
+        else:
+            # Hasta 2 puntos (mín/máx) por columna y bucket → <= points en total
+            n_buckets = max((points or n) // (2 * max(len(columns), 1)), 1)
+            buckets = np.arange(n, dtype=np.int64) * n_buckets // n
+        idx = minmax_indices(buckets, values)
+
+    return [records[i] for i in idx]
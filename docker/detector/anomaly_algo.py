@@ -3,70 +3,78 @@ Detects pricing anomalies based on expected exponential decay from ATM.
 
 This implementation uses ATM-centered analysis with exponential regression
 to detect mispriced options in 0DTE SPY contracts.
+
+Calls and puts are fitted together: each side is one row of a padded
+(sides x strikes) matrix and the exponential decay is solved in closed form
+(weighted log-linear least squares), so detection is a handful of array ops
+regardless of how many strikes are in the window.
+
+The fit is warm-started across scans: each side keeps an ExponentialFitState
+with the accumulated normal equations of previous scans (exponential
+forgetting). A scan only refits from scratch when the ATM strike moves or the
+new prices drift too far from the previous curve.
 """
 import logging
-from typing import List, Dict, Any, Optional
-import pandas as pd
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from scipy import stats
-from scipy.optimize import curve_fit
 
 from config import settings
+from metrics import anomaly_fit_updates_total
+from option_chain import OptionChainSnapshot, RIGHT_CALL, RIGHT_PUT
 
 
 logger = logging.getLogger(__name__)
 
 
-def detect_anomalies(options_data: List[Dict[str, Any]], spy_price: float) -> List[Dict[str, Any]]:
-    """Detect pricing anomalies in options data.
+def detect_anomalies(
+    chain: OptionChainSnapshot,
+    spy_price: float,
+    mask: Optional[np.ndarray] = None
+) -> List[Dict[str, Any]]:
+    """Detect pricing anomalies in the option chain snapshot.
     
     Args:
-        options_data: List of option data dicts (strike, bid, ask, etc)
+        chain: Columnar option chain (strike, bid, ask, mid, volume arrays)
         spy_price: Current SPY price for moneyness calculation
+        mask: Rows to analyse (default: chain.valid_mask())
         
     Returns:
         list: Detected anomalies with deviation metrics
     """
-    if not options_data:
+    if mask is None:
+        mask = chain.valid_mask()
+    
+    if not mask.any():
         logger.warning("No options data provided for anomaly detection")
         return []
     
-    # Convert to DataFrame for analysis
-    df = pd.DataFrame(options_data)
+    # Build the ATM-centered series per side (need at least 5 points for stable exponential fit)
+    sides: List[Tuple[str, np.ndarray]] = []
+    for right, code, label in (('C', RIGHT_CALL, 'CALL'), ('P', RIGHT_PUT, 'PUT')):
+        idx = np.flatnonzero(mask & (chain.right == code))
+        if len(idx) < 5:
+            logger.debug(f"Insufficient {label} data points ({len(idx)}) for ATM-centered detection")
+            continue
+        series = _select_atm_series(chain, idx, spy_price, right)
+        if series is not None:
+            sides.append((right, series))
     
-    # Separate calls and puts
-    calls = df[df['option_type'] == 'C'].copy()
-    puts = df[df['option_type'] == 'P'].copy()
-    
-    anomalies = []
-    
-    # Detect anomalies in calls (need at least 5 points for stable exponential fit)
-    if len(calls) >= 5:
-        call_anomalies = _detect_in_series_atm_centered(calls, spy_price, 'C')
-        anomalies.extend(call_anomalies)
-    else:
-        logger.debug(f"Insufficient CALL data points ({len(calls)}) for ATM-centered detection")
-    
-    # Detect anomalies in puts
-    if len(puts) >= 5:
-        put_anomalies = _detect_in_series_atm_centered(puts, spy_price, 'P')
-        anomalies.extend(put_anomalies)
-    else:
-        logger.debug(f"Insufficient PUT data points ({len(puts)}) for ATM-centered detection")
+    anomalies = _detect_batch(chain, sides, spy_price) if sides else []
     
     logger.info(f"Detected {len(anomalies)} anomalies (threshold: {settings.anomaly_threshold})")
     return anomalies
 
 
-def _exponential_decay(x: np.ndarray, a: float, b: float) -> np.ndarray:
+def _exponential_decay(x: np.ndarray, a, b) -> np.ndarray:
     """Exponential decay function for option pricing from ATM.
     
     Formula: price = a * exp(-b * distance_from_atm)
     
     Args:
         x: Distance from ATM strike (in number of strikes)
-        a: Initial price at ATM
-        b: Decay rate
+        a: Initial price at ATM (scalar, or per-side column array to broadcast)
+        b: Decay rate (scalar, or per-side column array to broadcast)
         
     Returns:
         Expected prices following exponential decay
@@ -74,243 +82,421 @@ def _exponential_decay(x: np.ndarray, a: float, b: float) -> np.ndarray:
     return a * np.exp(-b * x)
 
 
-def _detect_in_series_atm_centered(df: pd.DataFrame, spy_price: float, right: str) -> List[Dict[str, Any]]:
-    """Detect anomalies using ATM-centered exponential regression approach.
+def _select_atm_series(
+    chain: OptionChainSnapshot,
+    idx: np.ndarray,
+    spy_price: float,
+    right: str
+) -> Optional[np.ndarray]:
+    """Select and order one side of the chain from ATM towards the extremes.
     
     This method:
     1. Identifies ATM strike (closest integer to SPY price)
     2. Orders strikes from ATM towards extremes
-    3. Fits exponential decay curve to the series
-    4. Detects options that are significantly cheaper than expected
+    3. Drops options with invalid pricing (mid <= 0, spread > 50% of mid)
     
     Args:
-        df: DataFrame with option data (must have strike, mid, volume)
+        chain: Option chain snapshot
+        idx: Row indices of this side (calls or puts) in the chain
         spy_price: Current SPY price
         right: 'C' for calls, 'P' for puts
         
     Returns:
-        list: Anomalies detected in this series
+        Ordered row indices, or None if fewer than 5 usable points remain
     """
     # ATM strike is the nearest integer strike to SPY price
     atm_strike = round(spy_price)
     
     # Filter and order from ATM towards extremes
+    strikes = chain.strike[idx]
     if right == 'C':
         # CALLs: Take strikes >= ATM, order ascending
-        df = df[df['strike'] >= atm_strike].sort_values('strike').copy()
+        idx = idx[strikes >= atm_strike]
+        idx = idx[np.argsort(chain.strike[idx], kind='stable')]
     else:
         # PUTs: Take strikes <= ATM, order descending (away from ATM)
-        df = df[df['strike'] <= atm_strike].sort_values('strike', ascending=False).copy()
+        idx = idx[strikes <= atm_strike]
+        idx = idx[np.argsort(-chain.strike[idx], kind='stable')]
     
     # Need minimum data points for stable regression
-    if len(df) < 5:
-        logger.debug(f"Insufficient {right} data from ATM ({len(df)} points)")
-        return []
-    
-    # Calculate distance from ATM (in number of strikes)
-    df['distance_from_atm'] = abs(df['strike'] - atm_strike)
+    if len(idx) < 5:
+        logger.debug(f"Insufficient {right} data from ATM ({len(idx)} points)")
+        return None
     
     # Pre-filter: Remove options with invalid pricing
     # - Spread too wide (> 50% of mid)
     # - Mid price <= 0
-    df = df[df['mid'] > 0].copy()
-    spread = df['ask'] - df['bid']
-    spread_pct = spread / df['mid']
-    df = df[spread_pct < 0.5].copy()  # Filter spreads > 50%
+    idx = idx[chain.mid[idx] > 0]
+    spread_pct = (chain.ask[idx] - chain.bid[idx]) / chain.mid[idx]
+    idx = idx[spread_pct < 0.5]  # Filter spreads > 50%
     
-    if len(df) < 5:
+    if len(idx) < 5:
         logger.debug(f"Insufficient {right} data after filtering spreads")
-        return []
+        return None
     
-    # Try exponential regression approach
-    try:
-        anomalies = _fit_and_detect_anomalies(df, spy_price, right, atm_strike)
-        return anomalies
-        
-    except Exception as e:
-        logger.warning(f"Exponential fit failed for {right}: {e}, using fallback method")
-        return _fallback_detection(df, spy_price, right)
+    return idx
 
 
-def _fit_and_detect_anomalies(df: pd.DataFrame, spy_price: float, right: str, atm_strike: float) -> List[Dict[str, Any]]:
-    """Fit exponential decay and detect deviations.
+# Columns of the per-row normal equation sums (weighted log-linear LS)
+_N, _S0, _SX, _SXX, _SZ, _SXZ, _SZZ = range(7)
+
+
+def _normal_equations(x: np.ndarray, y: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Weighted sums of the line ln(y) = ln(a) - b*x, one row per side.
+    
+    Weights are y² (first-order correction so residuals are weighted as in
+    price space, like the former curve_fit).
     
     Args:
-        df: Preprocessed DataFrame with distance_from_atm
-        spy_price: Current SPY price
-        right: Option type
-        atm_strike: ATM strike price
+        x: (rows, n) distances from ATM
+        y: (rows, n) mid prices
+        valid: (rows, n) mask of real points (rows are padded to the same n)
         
     Returns:
-        List of detected anomalies
+        (rows, 7) array: count, S0, Sx, Sxx, Sz, Sxz, Szz
     """
-    x_data = df['distance_from_atm'].values
-    y_data = df['mid'].values
-    
-    # Initial parameter guess: a = price at ATM, b = 0.1 (reasonable decay rate)
-    # Bounds: a must be positive, b must be positive (decay, not growth)
-    initial_guess = [y_data[0], 0.1]
-    bounds = ([0, 0], [np.inf, 1.0])
-    
-    # Fit exponential decay curve
-    popt, pcov = curve_fit(
-        _exponential_decay, 
-        x_data, 
-        y_data,
-        p0=initial_guess,
-        bounds=bounds,
-        maxfev=5000
-    )
-    
-    a_fit, b_fit = popt
-    logger.debug(f"{right} exponential fit: a={a_fit:.3f}, b={b_fit:.3f}")
+    w = np.where(valid, y * y, 0.0)
+    log_y = np.log(np.where(valid, y, 1.0))
+    wx = w * x
+    wz = w * log_y
+    return np.stack([
+        valid.sum(axis=1).astype(np.float64),
+        w.sum(axis=1),
+        wx.sum(axis=1),
+        (wx * x).sum(axis=1),
+        wz.sum(axis=1),
+        (wx * log_y).sum(axis=1),
+        (wz * log_y).sum(axis=1),
+    ], axis=1)
+
+
+def _solve_exponential(sums: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Solve y = a * exp(-b * x) in closed form from the normal equation sums.
     
-    # Calculate expected prices and deviations
-    df['expected_price'] = _exponential_decay(df['distance_from_atm'], a_fit, b_fit)
-    df['deviation_pct'] = ((df['mid'] - df['expected_price']) / df['expected_price']) * 100
+    The decay rate keeps the old curve_fit bounds 0 <= b <= 1; when b is
+    clipped, ln(a) is re-solved for the clipped slope.
+    
+    Returns:
+        (a, b, ok): fitted parameters per row and a mask of finite, well-posed fits
+    """
+    s0, sx, sxx = sums[:, _S0], sums[:, _SX], sums[:, _SXX]
+    sz, sxz = sums[:, _SZ], sums[:, _SXZ]
+    det = s0 * sxx - sx * sx
+    
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        slope = (s0 * sxz - sx * sz) / det
+        b = np.clip(-slope, 0.0, 1.0)
+        a = np.exp((sz + b * sx) / s0)
     
-    # Calculate z-scores for deviation detection
-    if len(df) > 3:
-        mean_dev = df['deviation_pct'].mean()
-        std_dev = df['deviation_pct'].std()
+    ok = (det > 0) & np.isfinite(a) & np.isfinite(b)
+    return a, b, ok
+
+
+class ExponentialFitState:
+    """Warm-start state of the exponential fit for one side (C or P).
+    
+    Keeps the accumulated normal equations of previous scans, so each scan is
+    a recursive least-squares update with forgetting factor λ:
+    
+        sums_t = λ * sums_{t-1} + sums_scan
+    
+    The state is discarded (full refit from the current scan only) when the
+    ATM strike changes, since distances are measured from ATM, or when the
+    weighted RMS of the log residuals of the new scan against the previous
+    curve exceeds the drift threshold.
+    """
+    
+    def __init__(self, right: str, forgetting_factor: float, drift_threshold: float):
+        self.right = right
+        self.forgetting_factor = forgetting_factor
+        self.drift_threshold = drift_threshold
+        self.reset()
+    
+    def reset(self) -> None:
+        self.sums: Optional[np.ndarray] = None
+        self.atm_strike: Optional[float] = None
+        self.a: Optional[float] = None
+        self.b: Optional[float] = None
+    
+    @property
+    def is_warm(self) -> bool:
+        return self.sums is not None
+    
+    @property
+    def covariance(self) -> Optional[np.ndarray]:
+        """2x2 covariance of (ln a, b) from the accumulated normal equations."""
+        if not self.is_warm:
+            return None
+        s = self.sums
+        log_a = np.log(self.a)
+        # Weighted SSR of z = ln(a) - b*x expanded over the stored sums
+        ssr = (s[_SZZ] + log_a * log_a * s[_S0] + self.b * self.b * s[_SXX]
+               - 2 * log_a * s[_SZ] + 2 * self.b * s[_SXZ] - 2 * log_a * self.b * s[_SX])
+        sigma2 = max(ssr, 0.0) / max(s[_N] - 2.0, 1.0)
+        info = np.array([[s[_S0], -s[_SX]], [-s[_SX], s[_SXX]]])
+        try:
+            return sigma2 * np.linalg.inv(info)
+        except np.linalg.LinAlgError:
+            return None
+    
+    def drift(self, x: np.ndarray, y: np.ndarray, valid: np.ndarray) -> float:
+        """Weighted RMS of log residuals of (x, y) against the stored curve."""
+        w = np.where(valid, y * y, 0.0)
+        total = w.sum()
+        if total <= 0:
+            return np.inf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            residual = np.log(np.where(valid, y, 1.0)) - (np.log(self.a) - self.b * x)
+        return float(np.sqrt((w * residual * residual).sum() / total))
+    
+    def blend(
+        self,
+        scan_sums: np.ndarray,
+        atm_strike: float,
+        x: np.ndarray,
+        y: np.ndarray,
+        valid: np.ndarray
+    ) -> np.ndarray:
+        """Return the sums to solve for this scan (warm update or full refit)."""
+        if not self.is_warm:
+            reason = 'cold'
+        elif atm_strike != self.atm_strike:
+            reason = 'atm_change'
+        elif self.drift(x, y, valid) > self.drift_threshold:
+            reason = 'drift'
+        else:
+            anomaly_fit_updates_total.labels(option_type=self.right, mode='warm').inc()
+            return self.forgetting_factor * self.sums + scan_sums
         
-        if std_dev > 0:
-            df['z_score'] = (df['deviation_pct'] - mean_dev) / std_dev
+        logger.debug(f"{self.right} exponential fit: full refit ({reason})")
+        anomaly_fit_updates_total.labels(option_type=self.right, mode=reason).inc()
+        return scan_sums
+    
+    def store(self, sums: np.ndarray, atm_strike: float, a: float, b: float) -> None:
+        self.sums = sums
+        self.atm_strike = atm_strike
+        self.a = float(a)
+        self.b = float(b)
+
+
+_fit_states: Dict[str, ExponentialFitState] = {}
+
+
+def get_fit_state(right: str) -> ExponentialFitState:
+    """Gets the singleton ExponentialFitState of one side ('C' or 'P')."""
+    state = _fit_states.get(right)
+    if state is None:
+        state = ExponentialFitState(
+            right,
+            forgetting_factor=settings.fit_forgetting_factor,
+            drift_threshold=settings.fit_drift_threshold
+        )
+        _fit_states[right] = state
+    return state
+
+
+def _detect_batch(
+    chain: OptionChainSnapshot,
+    sides: List[Tuple[str, np.ndarray]],
+    spy_price: float
+) -> List[Dict[str, Any]]:
+    """Fit exponential decay for all sides at once and detect deviations.
+    
+    Args:
+        chain: Option chain snapshot
+        sides: [(right, ordered row indices), ...] from _select_atm_series
+        spy_price: Current SPY price
+        
+    Returns:
+        List of detected anomalies (side order preserved: calls, then puts)
+    """
+    atm_strike = round(spy_price)
+    n = max(len(idx) for _, idx in sides)
+    
+    # Padded (sides x n) matrices; padding is masked out by `valid`
+    rows = np.zeros((len(sides), n), dtype=np.intp)
+    valid = np.zeros((len(sides), n), dtype=bool)
+    for s, (_, idx) in enumerate(sides):
+        rows[s, :len(idx)] = idx
+        valid[s, :len(idx)] = True
+    
+    x = np.abs(chain.strike[rows] - atm_strike)
+    y = chain.mid[rows]
+    
+    # Warm-started fit: blend this scan's normal equations with each side's state
+    scan_sums = _normal_equations(x, y, valid)
+    states = [get_fit_state(right) for right, _ in sides]
+    sums = np.stack([
+        state.blend(scan_sums[s], atm_strike, x[s], y[s], valid[s])
+        for s, state in enumerate(states)
+    ])
+    a_fit, b_fit, ok = _solve_exponential(sums)
+    for s, state in enumerate(states):
+        if ok[s]:
+            state.store(sums[s], atm_strike, a_fit[s], b_fit[s])
         else:
-            df['z_score'] = 0
-    else:
-        df['z_score'] = 0
+            state.reset()
+    
+    # Calculate expected prices and deviations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_price = _exponential_decay(x, a_fit[:, None], b_fit[:, None])
+        deviation_pct = np.where(valid, ((y - expected_price) / expected_price) * 100, np.nan)
+    
+    # Calculate z-scores for deviation detection (sample std, ddof=1)
+    z_score = np.zeros_like(deviation_pct)
+    fitted = np.flatnonzero(ok)
+    if len(fitted):
+        dev = deviation_pct[fitted]
+        mean_dev = np.nanmean(dev, axis=1, keepdims=True)
+        std_dev = np.nanstd(dev, axis=1, ddof=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_score[fitted] = np.where(std_dev > 0, (dev - mean_dev) / std_dev, 0.0)
     
     # Detect anomalies: Options significantly CHEAPER than expected
     # Criteria:
-    # 1. Deviation < -30% (price is 30% cheaper than expected curve)
+    # 1. Deviation < -10% (price is cheaper than expected curve)
     # 2. Z-score < -threshold (statistical outlier in the cheap direction)
-    
-    anomalies = []
     threshold = settings.anomaly_threshold
-    
-    for idx, row in df.iterrows():
-        # Look for bargains: cheaper than expected
-        is_cheap_anomaly = row['deviation_pct'] < -10.0 and row['z_score'] < -threshold
-        
-        if is_cheap_anomaly:
-            anomaly = {
-                'timestamp': pd.Timestamp.now().isoformat(),
-                'strike': float(row['strike']),
-                'right': right,
-                'price': float(row['mid']),
-                'expected_price': float(row['expected_price']),
-                'bid': float(row['bid']),
-                'ask': float(row['ask']),
-                'volume': int(row['volume']),
-                'open_interest': 0,
-                'spy_price': float(spy_price),
-                'moneyness': float((row['strike'] - spy_price) / spy_price),
-                'deviation_pct': float(row['deviation_pct']),
-                'z_score': float(row['z_score']),
-                'severity': _calculate_severity(row['z_score'], abs(row['deviation_pct']))
-            }
-            anomalies.append(anomaly)
-            
-            logger.info(
-                f"💰 BARGAIN DETECTED: {right} ${row['strike']:.0f} @ ${row['mid']:.2f} "
-                f"(expected ${row['expected_price']:.2f}, {row['deviation_pct']:.1f}% cheaper, "
-                f"z={row['z_score']:.2f})"
-            )
-    
-    return anomalies
+    with np.errstate(invalid='ignore'):
+        is_cheap_anomaly = valid & ok[:, None] & (deviation_pct < -10.0) & (z_score < -threshold)
+    severity = _calculate_severity(z_score, deviation_pct)
+    
+    per_side: List[List[Dict[str, Any]]] = [[] for _ in sides]
+    for s, k in zip(*np.nonzero(is_cheap_anomaly)):
+        right = sides[s][0]
+        i = rows[s, k]
+        per_side[s].append(_build_anomaly(
+            chain, i, spy_price, right,
+            expected_price[s, k], deviation_pct[s, k], z_score[s, k], severity[s, k]
+        ))
+        logger.info(
+            f"💰 BARGAIN DETECTED: {right} ${chain.strike[i]:.0f} @ ${chain.mid[i]:.2f} "
+            f"(expected ${expected_price[s, k]:.2f}, {deviation_pct[s, k]:.1f}% cheaper, "
+            f"z={z_score[s, k]:.2f})"
+        )
+    
+    for s in np.flatnonzero(~ok):
+        right, idx = sides[s]
+        logger.warning(f"Exponential fit failed for {right}, using fallback method")
+        per_side[s] = _fallback_detection(chain, idx, spy_price, right)
+    
+    for s in fitted:
+        logger.debug(f"{sides[s][0]} exponential fit: a={a_fit[s]:.3f}, b={b_fit[s]:.3f}")
+    
+    return [anomaly for side in per_side for anomaly in side]
+
 
+def _build_anomaly(
+    chain: OptionChainSnapshot,
+    i: int,
+    spy_price: float,
+    right: str,
+    expected_price: float,
+    deviation_pct: float,
+    z_score: float,
+    severity: str
+) -> Dict[str, Any]:
+    """Builds the anomaly record consumed by detector._map_algo_anomaly_to_contract."""
+    strike = float(chain.strike[i])
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'strike': strike,
+        'right': right,
+        'price': float(chain.mid[i]),
+        'expected_price': float(expected_price),
+        'bid': float(chain.bid[i]),
+        'ask': float(chain.ask[i]),
+        'volume': int(chain.volume[i]),
+        'open_interest': 0,
+        'spy_price': float(spy_price),
+        'moneyness': float((strike - spy_price) / spy_price),
+        'deviation_pct': float(deviation_pct),
+        'z_score': float(z_score),
+        'severity': str(severity)
+    }
 
-def _fallback_detection(df: pd.DataFrame, spy_price: float, right: str) -> List[Dict[str, Any]]:
+
+def _fallback_detection(
+    chain: OptionChainSnapshot,
+    idx: np.ndarray,
+    spy_price: float,
+    right: str
+) -> List[Dict[str, Any]]:
     """Fallback detection method using simple statistics.
     
     Used when exponential regression fails (insufficient data, bad fit, etc).
     
     Args:
-        df: DataFrame with option data
+        chain: Option chain snapshot
+        idx: Row indices of this side
         spy_price: Current SPY price
         right: Option type
         
     Returns:
         List of detected anomalies
     """
-    df = df.sort_values('strike').copy()
+    idx = idx[np.argsort(chain.strike[idx], kind='stable')]
+    mid = chain.mid[idx]
     
-    # Calculate price change between consecutive strikes
-    df['price_change_pct'] = df['mid'].pct_change() * 100
+    # Calculate price change between consecutive strikes (first row has no change)
+    price_change_pct = np.full(len(idx), np.nan)
+    price_change_pct[1:] = (mid[1:] / mid[:-1] - 1.0) * 100
     
     # For PUTs ordered descending, pct_change will be negative when price increases
     # We want to detect when price DOESN'T decrease as much as expected
     # So we look at the absolute value and check statistical outliers
     
-    if len(df) > 3:
-        mean_change = df['price_change_pct'].mean()
-        std_change = df['price_change_pct'].std()
+    z_score = np.zeros(len(idx))
+    if len(idx) > 3:
+        mean_change = np.nanmean(price_change_pct)
+        std_change = np.nanstd(price_change_pct, ddof=1)
         
         if std_change > 0:
-            df['z_score'] = (df['price_change_pct'] - mean_change) / std_change
-        else:
-            df['z_score'] = 0
-    else:
-        df['z_score'] = 0
+            z_score = (price_change_pct - mean_change) / std_change
     
-    anomalies = []
+    # Detect statistical outliers in price decay
     threshold = settings.anomaly_threshold
+    with np.errstate(invalid='ignore'):
+        is_outlier = np.abs(z_score) > threshold
+    severity = _calculate_severity(z_score, price_change_pct)
     
-    # Detect statistical outliers in price decay
-    for idx, row in df.iterrows():
-        # Look for z-scores indicating unusual pricing
-        if abs(row['z_score']) > threshold:
-            expected_price = calculate_expected_price(float(row['strike']), spy_price, right)
-            
-            anomaly = {
-                'timestamp': pd.Timestamp.now().isoformat(),
-                'strike': float(row['strike']),
-                'right': right,
-                'price': float(row['mid']),
-                'expected_price': float(expected_price),
-                'bid': float(row['bid']),
-                'ask': float(row['ask']),
-                'volume': int(row['volume']),
-                'open_interest': 0,
-                'spy_price': float(spy_price),
-                'moneyness': float((row['strike'] - spy_price) / spy_price),
-                'deviation_pct': float(row['price_change_pct']),
-                'z_score': float(row['z_score']),
-                'severity': _calculate_severity(row['z_score'], abs(row['price_change_pct']))
-            }
-            anomalies.append(anomaly)
-            
-            logger.info(
-                f"⚠️ Fallback detection: {right} ${row['strike']:.0f} - "
-                f"pct_change={row['price_change_pct']:.2f}%, z={row['z_score']:.2f}"
-            )
+    anomalies = []
+    for k in np.flatnonzero(is_outlier):
+        i = idx[k]
+        expected_price = calculate_expected_price(float(chain.strike[i]), spy_price, right)
+        anomalies.append(_build_anomaly(
+            chain, i, spy_price, right,
+            expected_price, price_change_pct[k], z_score[k], severity[k]
+        ))
+        logger.info(
+            f"⚠️ Fallback detection: {right} ${chain.strike[i]:.0f} - "
+            f"pct_change={price_change_pct[k]:.2f}%, z={z_score[k]:.2f}"
+        )
     
     return anomalies
 
 
-def _calculate_severity(z_score: float, deviation_pct: float) -> str:
+def _calculate_severity(z_score: np.ndarray, deviation_pct: np.ndarray) -> np.ndarray:
     """Calculate anomaly severity based on z-score and deviation magnitude.
     
     Args:
-        z_score: Statistical z-score (can be negative)
-        deviation_pct: Percentage deviation (use absolute value)
+        z_score: Statistical z-scores (can be negative)
+        deviation_pct: Percentage deviations (absolute value is used)
         
     Returns:
-        str: 'LOW', 'MEDIUM', or 'HIGH'
+        np.ndarray of 'LOW', 'MEDIUM' or 'HIGH' (same shape as inputs)
     """
-    abs_z = abs(z_score)
-    abs_dev = abs(deviation_pct)
-    
-    # HIGH severity: Strong statistical signal OR very large deviation
-    if abs_z > 2.0 or abs_dev > 50:
-        return 'HIGH'
-    # MEDIUM severity: Moderate statistical signal OR significant deviation
-    elif abs_z > 1.0 or abs_dev > 30:
-        return 'MEDIUM'
+    abs_z = np.abs(z_score)
+    abs_dev = np.abs(deviation_pct)
+    
+    with np.errstate(invalid='ignore'):
+        # HIGH severity: Strong statistical signal OR very large deviation
+        high = (abs_z > 2.0) | (abs_dev > 50)
+        # MEDIUM severity: Moderate statistical signal OR significant deviation
+        medium = (abs_z > 1.0) | (abs_dev > 30)
+    
     # LOW severity: Weak signal
-    else:
-        return 'LOW'
+    return np.where(high, 'HIGH', np.where(medium, 'MEDIUM', 'LOW'))
 
 
 def calculate_expected_price(strike: float, spy_price: float, right: str) -> float:
@@ -27,9 +27,31 @@ class Settings(BaseSettings):
     max_strikes_limit: int = Field(default=5, alias="MAX_STRIKES_LIMIT")
     atm_fixed_strikes: int = Field(default=5, alias="ATM_FIXED_STRIKES")  # ±5 strikes fijos (no dinámico)
     spy_fallback_price: int = Field(default=700, alias="SPY_FALLBACK_PRICE")
+
+    # Anomaly fit warm-start (peso del scan anterior y umbral de refit completo)
+    fit_forgetting_factor: float = Field(default=0.7, alias="FIT_FORGETTING_FACTOR")
+    fit_drift_threshold: float = Field(default=0.25, alias="FIT_DRIFT_THRESHOLD")
+
+    # Greeks: "proxy" (1/(|K-S|+0.25), deltas fijos) o "bs" (Black-Scholes + IV implícita)
+    greeks_mode: str = Field(default="proxy", alias="GREEKS_MODE")
+    greeks_risk_free_rate: float = Field(default=0.0, alias="GREEKS_RISK_FREE_RATE")
+    greeks_spot_tolerance: float = Field(default=0.05, alias="GREEKS_SPOT_TOLERANCE")
+    
+    # Ingestion mode: "poll" (scan + sleep) o "stream" (pendingTickersEvent)
+    ingestion_mode: str = Field(default="poll", alias="INGESTION_MODE")
+    stream_market_debounce_ms: int = Field(default=2000, alias="STREAM_MARKET_DEBOUNCE_MS")
+    stream_flow_debounce_ms: int = Field(default=250, alias="STREAM_FLOW_DEBOUNCE_MS")
+    stream_gamma_debounce_ms: int = Field(default=1000, alias="STREAM_GAMMA_DEBOUNCE_MS")
+    stream_anomaly_debounce_ms: int = Field(default=2000, alias="STREAM_ANOMALY_DEBOUNCE_MS")
+    stream_idle_timeout_seconds: float = Field(default=5.0, alias="STREAM_IDLE_TIMEOUT_SECONDS")
     
     # Backend API (from ConfigMap bot-config)
     backend_url: str = Field(default="http://backend-service:8000", alias="BACKEND_URL")
+    publisher_workers: int = Field(default=4, alias="PUBLISHER_WORKERS")
+    publisher_queue_size: int = Field(default=1000, alias="PUBLISHER_QUEUE_SIZE")
+    publisher_max_retries: int = Field(default=2, alias="PUBLISHER_MAX_RETRIES")
+    # Publish mode: "single" (un POST por endpoint) o "batch" (un POST /ingest/batch por scan)
+    publish_mode: str = Field(default="single", alias="PUBLISH_MODE")
     
     # Azure SignalR (from Secret azure-credentials) - Optional for detector
     azure_signalr_connection_string: str = Field(default="", alias="AZURE_SIGNALR_CONNECTION_STRING")
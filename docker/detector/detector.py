@@ -18,13 +18,14 @@ import os
 import logging
 import time
 import signal
-from threading import Thread
 from datetime import datetime
 from typing import Dict, List
+import numpy as np
 from volume_aggregator import get_volume_tracker, get_flow_aggregator
 from pressure_engine import get_gamma_engine
+from tick_stream import StageDebouncer
+from publisher import get_publisher
 #from signalr_client import broadcast_flow
-import requests
 from pydantic import ValidationError
 from prometheus_client import start_http_server
 from config import settings
@@ -37,9 +38,9 @@ from metrics import (
     ibkr_tick_count_total,
     pipeline_latency_seconds,
     net_flow_current,
-    backend_requests_total,
 )
 from ibkr_client import IBKRClient
+from option_chain import OptionChainSnapshot
 from anomaly_algo import detect_anomalies
 # from volume_aggregator import aggregate_atm_volumes  # COMENTADO
 from models import AnomaliesSnapshot, AnomaliesResponse, VolumesSnapshot, SpymarketSnapshot
@@ -92,6 +93,10 @@ def _handle_sigterm(signum, frame):
         ibkr_client.shutdown()
     except Exception:
         pass
+    try:
+        get_publisher().close()
+    except Exception:
+        pass
 
 
 signal.signal(signal.SIGTERM, _handle_sigterm)
@@ -101,13 +106,6 @@ signal.signal(signal.SIGINT, _handle_sigterm)
 # Helpers
 # -----------------------------------------------------------------------------
 
-def _post_async(func, *args, **kwargs):
-    """
-    Ejecuta POST en thread separado (fire-and-forget).
-    """
-    thread = Thread(target=func, args=args, kwargs=kwargs, daemon=True)
-    thread.start()
-
 def _get_market_status() -> str:
     """
     Calcula el estado del mercado basado en market_hours.py
@@ -154,37 +152,16 @@ def _post_anomalies(anomalies: List[AnomaliesSnapshot]) -> None:
         last_scan=datetime.utcnow(),
     )
 
-    url = f"{settings.backend_url}/anomalies"
-
     logger.info(
-        "Enviando %d anomalias al backend (%s)",
+        "Enviando %d anomalias al backend (/anomalies)",
         payload.count,
-        url,
     )
-    try:
-        response = requests.post(
-            url,
-            json=payload.model_dump(mode="json"),
-            timeout=5,
-        )
-        backend_requests_total.labels(
-            method="POST",
-            endpoint="/anomalies",
-            status=str(response.status_code)
-        ).inc()
-        
-        if response.status_code >= 400:
-            logger.error("Error enviando anomalias | status=%s", response.status_code)
-            response.raise_for_status()
-        
-        logger.info("Anomali­as enviadas correctamente")
-    
-    except requests.exceptions.Timeout:
-        logger.warning("Backend timeout (30s) - Anomalias no enviadas")
-    except Exception as e:
-        logger.error("Error enviando Anomalias: %s", e)
-
-
+    get_publisher().publish(
+        "/anomalies",
+        payload.model_dump(mode="json"),
+        timeout=5,
+        success_message="Anomali­as enviadas correctamente",
+    )
 
 
 def _post_volumes(volume_data: dict) -> None:
@@ -193,8 +170,6 @@ def _post_volumes(volume_data: dict) -> None:
     """
     # Cambiamos el mapeo para que el backend reciba el delta como volumen principal si asÃ­ lo deseas
     
-    url = f"{settings.backend_url}/volumes"
-    
     logger.info(
         "Actividad ATM (Deltas): CALLS +%d, PUTS +%d | SPY=%.2f",
         volume_data["calls_volume_delta"],
@@ -202,16 +177,8 @@ def _post_volumes(volume_data: dict) -> None:
         volume_data["spy_price"],
     )
     
-    try:
-        # Enviamos todo el snapshot que ya incluye los deltas calculados
-        response = requests.post(
-            url,
-            json=volume_data, 
-            timeout=5,
-        )
-        response.raise_for_status()
-    except Exception as e:
-        logger.error("Error enviando fluctuaciÃ³n: %s", e)
+    # Enviamos todo el snapshot que ya incluye los deltas calculados
+    get_publisher().publish("/volumes", volume_data, timeout=5)
 
         
 # -----------------------------------------------------------------------------
@@ -246,8 +213,6 @@ def _post_spymarket(
     - spy_change_pct
     - atm_center, atm_min, atm_max
     """
-    url = f"{settings.backend_url}/spymarket"
-    
     payload = {
         "timestamp": timestamp,
         "price": round(spy_price, 2),
@@ -259,20 +224,16 @@ def _post_spymarket(
         "volume": volume
     }
     
-    try:
-        response = requests.post(url, json=payload, timeout=2)
-        response.raise_for_status()
-        
-        logger.info(
+    get_publisher().publish(
+        "/spymarket",
+        payload,
+        timeout=2,
+        success_message=(
             f"📊 SPY market sent | "
             f"${spy_price:.2f} | "
             f"Status: {market_status}"
-        )
-        
-    except requests.exceptions.Timeout:
-        logger.warning("⏱️ Backend timeout sending SPY market")
-    except Exception as e:
-        logger.error(f"❌ Error sending SPY market: {e}")
+        ),
+    )
 
 
 def _post_gamma(gamma_metrics: Dict) -> None:
@@ -282,23 +243,156 @@ def _post_gamma(gamma_metrics: Dict) -> None:
     Args:
         gamma_metrics: Dict with net_gex, gamma_regime, pinning_risk, gamma_walls, etc.
     """
-    url = f"{settings.backend_url}/gamma"
-    
-    try:
-        response = requests.post(url, json=gamma_metrics, timeout=2)
-        response.raise_for_status()
-        
-        logger.info(
+    get_publisher().publish(
+        "/gamma",
+        gamma_metrics,
+        timeout=2,
+        success_message=(
             f"🌡️ Gamma metrics sent | "
             f"NetGEX: {gamma_metrics['net_gex']:.3f}, "
             f"Regime: {gamma_metrics['gamma_regime']:.3f}, "
             f"Pinning: {gamma_metrics['pinning_risk']:.3f}"
+        ),
+    )
+
+
+def _send_spymarket_tick(spy_price: float) -> None:
+    """Envia snapshot SPY con bid/ask/volumen del subyacente."""
+    if ibkr_client.spy_prev_close:
+        try:
+            _post_spymarket(
+                spy_price=spy_price,
+                timestamp=int(time.time()),
+                previous_close=ibkr_client.spy_prev_close,
+                market_status=_get_market_status(),
+                bid=getattr(ibkr_client, 'spy_bid', None),
+                ask=getattr(ibkr_client, 'spy_ask', None),
+                last=spy_price,
+                volume=getattr(ibkr_client, 'spy_volume', None)
+            )
+        except Exception as e:
+            logger.error(f"Error sending SPY market: {e}")
+
+
+def _ensure_market_state(spy_price: float) -> None:
+    """POST market/state (solo primera vez o cambio de sesión)."""
+    # ===== FALLBACK: Asegurar que hay previous_close =====
+    if ibkr_client.spy_prev_close is None:
+        ibkr_client.spy_prev_close = 693.15
+        logger.warning("⚠️ Usando previous_close por defecto: 693.15")
+    # =====================================================
+
+    if not hasattr(ibkr_client, '_market_state_sent') or not ibkr_client._market_state_sent:
+        if ibkr_client.spy_prev_close and ibkr_client.spy_prev_close > 0:
+            _post_spymarket(
+                spy_price=spy_price,  # cambio: current_price → spy_price
+                timestamp=int(time.time()),
+                previous_close=ibkr_client.spy_prev_close,
+                market_status=_get_market_status()
+            )
+            
+            ibkr_client._market_state_sent = True
+            ibkr_client._last_atm_center = round(spy_price)  # Inicializar
+
+
+def _run_anomaly_stage(chain: OptionChainSnapshot, valid_mask: np.ndarray, spy_price: float) -> None:
+    """Deteccion de Anomalias con datos validados."""
+    raw_anomalies = detect_anomalies(chain, spy_price, mask=valid_mask)
+    
+    if not raw_anomalies:
+        logger.info("No se detectaron Anomalias en %d contratos validos", int(valid_mask.sum()))
+        return
+
+    anomalies: List[AnomaliesSnapshot] = []
+    for raw in raw_anomalies:
+        try:
+            anomaly = _map_algo_anomaly_to_contract(raw)
+            anomalies.append(anomaly)
+        except Exception as e:
+            logger.error("Anomalia invalida | data=%s | error=%s", raw, e)
+
+    if anomalies:
+    # Incrementar métricas por severidad
+        for anomaly in anomalies:
+            anomalies_detected_total.labels(severity=anomaly.severity).inc()
+        _post_anomalies(anomalies)
+
+
+def _check_atm_change(spy_price: float) -> None:
+    """Envia market state con nuevo ATM range si el centro ATM ha cambiado."""
+    current_atm_center = round(spy_price)
+    if not hasattr(ibkr_client, '_last_atm_center') or ibkr_client._last_atm_center != current_atm_center:
+        # Enviar market state con nuevo ATM range
+        if ibkr_client.spy_prev_close and ibkr_client.spy_prev_close > 0:
+            _post_spymarket(
+                spy_price=spy_price,
+                timestamp=int(time.time()),
+                previous_close=ibkr_client.spy_prev_close,
+                market_status=_get_market_status()
+            )
+            ibkr_client._last_atm_center = current_atm_center
+            logger.info(f"ATM cambio: {current_atm_center} (enviado a backend)")
+
+
+def _run_flow_stage(chain: OptionChainSnapshot, mask: np.ndarray, spy_price: float) -> None:
+    """
+    PROCESAMIENTO DE SIGNED PREMIUM FLOW.
+
+    Calcula el signed premium de las filas de `mask` en una pasada y, si el
+    bucket de 1s cierra, envia los flujos acumulados al backend.
+    """
+    volume_tracker = get_volume_tracker()
+    flow_aggregator = get_flow_aggregator()
+
+    call_flow, put_flow = volume_tracker.process_chain(chain, mask)
+    
+    # Añadir al bucket temporal (cierra cada segundo)
+    bucket_result = flow_aggregator.add_signed_flow(call_flow, put_flow)
+    
+    # Si el bucket cierra, enviar datos acumulados
+    if bucket_result:
+        # FLOW LIMPIO - Solo opciones
+        flow_payload = {
+            "timestamp": bucket_result["timestamp"],
+            "cum_call_flow": round(volume_tracker.cum_call_flow, 2),
+            "cum_put_flow": round(volume_tracker.cum_put_flow, 2),
+            "net_flow": round(volume_tracker.cum_call_flow - volume_tracker.cum_put_flow, 2),
+            "spy_price": round(spy_price, 2)  # Para línea del chart
+        }
+        
+        logger.info(
+            f"Flow Update | Timestamp: {flow_payload['timestamp']} | "
+            f"Cum Calls: ${flow_payload['cum_call_flow']:,.0f} | "
+            f"Cum Puts: ${flow_payload['cum_put_flow']:,.0f} | "
+            f"Net: ${flow_payload['net_flow']:,.0f}"
+        )
+        # Enviar via SignalR al frontend
+        
+        get_publisher().publish("/flow", flow_payload, timeout=2)
+        
+        # Actualizar metrica de Prometheus
+        net_flow_current.set(flow_payload["net_flow"])
+
+
+def _run_gamma_stage(chain: OptionChainSnapshot, valid_mask: np.ndarray, spy_price: float) -> None:
+    """GAMMA EXPOSURE METRICS."""
+    try:
+        volume_tracker = get_volume_tracker()
+        gamma_engine = get_gamma_engine()
+        
+        gamma_metrics = gamma_engine.calculate_gamma_metrics(
+            chain=chain,
+            spy_price=spy_price,
+            cum_call_flow=volume_tracker.cum_call_flow,
+            cum_put_flow=volume_tracker.cum_put_flow,
+            mask=valid_mask
         )
         
-    except requests.exceptions.Timeout:
-        logger.warning("⏱️ Backend timeout sending gamma metrics")
+        # Send to backend (async, via publisher queue)
+        _post_gamma(gamma_metrics)
+        
     except Exception as e:
-        logger.error(f"❌ Error sending gamma metrics: {e}")
+        logger.error(f"Error calculating gamma metrics: {e}")
 
 
 def run_detector_loop() -> None:
@@ -308,6 +402,10 @@ def run_detector_loop() -> None:
     start_http_server(9100)
     logger.info("Prometheus metrics server iniciado en puerto 9100")
 
+    if settings.ingestion_mode == "stream":
+        run_detector_stream()
+        return
+
     while RUNNING:
         
         scan_start_time = time.time()
@@ -336,20 +434,7 @@ def run_detector_loop() -> None:
             spy_price = ibkr_client.get_spy_price()
             
             # ===== ENVIAR SPY MARKET SNAPSHOT =====
-            if ibkr_client.spy_prev_close:
-                try:
-                    _post_spymarket(
-                        spy_price=spy_price,
-                        timestamp=int(time.time()),
-                        previous_close=ibkr_client.spy_prev_close,
-                        market_status=_get_market_status(),
-                        bid=getattr(ibkr_client, 'spy_bid', None),
-                        ask=getattr(ibkr_client, 'spy_ask', None),
-                        last=spy_price,
-                        volume=getattr(ibkr_client, 'spy_volume', None)
-                    )
-                except Exception as e:
-                    logger.error(f"Error sending SPY market: {e}")
+            _send_spymarket_tick(spy_price)
             # ======================================
             
             if spy_price is None:
@@ -360,160 +445,54 @@ def run_detector_loop() -> None:
             logger.debug("Precio SPY: %.2f", spy_price)
             spy_price_current.set(spy_price)         
           
-            # POST market/state (solo primera vez o cambio de sesión)
+            _ensure_market_state(spy_price)
             
-            # ===== FALLBACK: Asegurar que hay previous_close =====
-            if ibkr_client.spy_prev_close is None:
-                ibkr_client.spy_prev_close = 693.15
-                logger.warning("⚠️ Usando previous_close por defecto: 693.15")
-            # =====================================================
-
-            if not hasattr(ibkr_client, '_market_state_sent') or not ibkr_client._market_state_sent:
-                if ibkr_client.spy_prev_close and ibkr_client.spy_prev_close > 0:
-                    _post_spymarket(
-                        spy_price=spy_price,  # cambio: current_price → spy_price
-                        timestamp=int(time.time()),
-                        previous_close=ibkr_client.spy_prev_close,
-                        market_status=_get_market_status()
-                    )
-                    
-                    ibkr_client._market_state_sent = True
-                    ibkr_client._last_atm_center = round(spy_price)  # Inicializar
-
-            
-            # 1. Obtener datos y actualizar suscripciones
-            options_data = ibkr_client.update_atm_subscriptions(spy_price)
+            # 1. Obtener datos y actualizar suscripciones (snapshot columnar in-place)
+            chain = ibkr_client.update_atm_subscriptions(spy_price)
             
             # 2. FILTRO CRITICO: Validar que existan datos reales antes de seguir.
             # Esto evita enviar volumenes en 0 o errores de calculo al backend.
-            valid_options = [
-                o for o in options_data
-                if o['mid'] > 0 or o['bid'] > 0 or o['ask'] > 0
-            ]
+            valid_mask = chain.valid_mask() if chain is not None else None
             
-            if not valid_options:
+            if valid_mask is None or not valid_mask.any():
                 logger.info("Esperando flujo de datos de IBKR (datos actuales en cero o vacias)")
                 time.sleep(1.5)
                 continue
 
             # --- Metrics: Tick Count & Pipeline Latency ---
-            ibkr_tick_count_total.labels(symbol="SPY").inc(len(valid_options))
+            ibkr_tick_count_total.labels(symbol="SPY").inc(int(valid_mask.sum()))
             
             # Use current time vs scan start to approximate latency if specific tick TS isn't available
             pipeline_latency = time.time() - scan_start_time
             pipeline_latency_seconds.observe(pipeline_latency)
 
             # 3. Deteccion de Anomalias con datos validados
-            raw_anomalies = detect_anomalies(valid_options, spy_price)
-            
-            if not raw_anomalies:
-                logger.info("No se detectaron Anomalias en %d contratos validos", len(valid_options))
-            else:
-                anomalies: List[AnomaliesSnapshot] = []
-                for raw in raw_anomalies:
-                    try:
-                        anomaly = _map_algo_anomaly_to_contract(raw)
-                        anomalies.append(anomaly)
-                    except Exception as e:
-                        logger.error("Anomalia invalida | data=%s | error=%s", raw, e)
-
-                if anomalies:
-                # Incrementar métricas por severidad
-                    for anomaly in anomalies:
-                        anomalies_detected_total.labels(severity=anomaly.severity).inc()
-                    _post_async(_post_anomalies, anomalies)
+            _run_anomaly_stage(chain, valid_mask, spy_price)
                 
            # --- NUEVO: PROCESAMIENTO DE SIGNED PREMIUM FLOW ---
             try:
-                volume_tracker = get_volume_tracker()
-                flow_aggregator = get_flow_aggregator()
-    
                 # --- VERIFICAR CAMBIO DE ATM ---
-                current_atm_center = round(spy_price)
-                if not hasattr(ibkr_client, '_last_atm_center') or ibkr_client._last_atm_center != current_atm_center:
-                    # Enviar market state con nuevo ATM range
-                    if ibkr_client.spy_prev_close and ibkr_client.spy_prev_close > 0:
-                        _post_spymarket(
-                            spy_price=spy_price,
-                            timestamp=int(time.time()),
-                            previous_close=ibkr_client.spy_prev_close,
-                            market_status=_get_market_status()
-                        )
-                        ibkr_client._last_atm_center = current_atm_center
-                        logger.info(f"ATM cambio: {current_atm_center} (enviado a backend)")
-                        
-                        
+                _check_atm_change(spy_price)
                 # --- FIN VERIFICACION ---               
                                 
-                # Procesar cada opcion individualmente
-                for option in valid_options:
-                    call_flow, put_flow = volume_tracker.process_option_tick(option)
-                    
-                    # AÃ±adir al bucket temporal (cierra cada segundo)
-                    bucket_result = flow_aggregator.add_signed_flow(call_flow, put_flow)
-                    
-                # Si el bucket cierra, enviar datos acumulados
-                    if bucket_result:
-                        from datetime import datetime
-                        
-                        timestamp_unix = bucket_result["timestamp"]
-                        timestamp_iso = datetime.fromtimestamp(timestamp_unix).isoformat() + "Z"
-                        
-                        # FLOW LIMPIO - Solo opciones
-                        flow_payload = {
-                            "timestamp": bucket_result["timestamp"],
-                            "cum_call_flow": round(volume_tracker.cum_call_flow, 2),
-                            "cum_put_flow": round(volume_tracker.cum_put_flow, 2),
-                            "net_flow": round(volume_tracker.cum_call_flow - volume_tracker.cum_put_flow, 2),
-                            "spy_price": round(spy_price, 2)  # Para línea del chart
-                        }
-                        
-                        logger.info(
-                            f"Flow Update | Timestamp: {flow_payload['timestamp']} | "
-                            f"Cum Calls: ${flow_payload['cum_call_flow']:,.0f} | "
-                            f"Cum Puts: ${flow_payload['cum_put_flow']:,.0f} | "
-                            f"Net: ${flow_payload['net_flow']:,.0f}"
-                        )
-                        # Enviar via SignalR al frontend
-                        
-                        _post_async(
-                            requests.post,
-                            f"{settings.backend_url}/flow",
-                            json=flow_payload,
-                            timeout=2
-                        )
-                        
-                        # Actualizar metrica de Prometheus
-                        net_flow_current.set(flow_payload["net_flow"])
+                _run_flow_stage(chain, valid_mask, spy_price)
                 
                 # --- GAMMA EXPOSURE METRICS ---
-                try:
-                    gamma_engine = get_gamma_engine()
-                    
-                    gamma_metrics = gamma_engine.calculate_gamma_metrics(
-                        options_data=valid_options,
-                        spy_price=spy_price,
-                        cum_call_flow=volume_tracker.cum_call_flow,
-                        cum_put_flow=volume_tracker.cum_put_flow
-                    )
-                    
-                    # Send to backend (async)
-                    _post_async(_post_gamma, gamma_metrics)
-                    
-                except Exception as e:
-                    logger.error(f"Error calculating gamma metrics: {e}")
+                _run_gamma_stage(chain, valid_mask, spy_price)
                 # --- END GAMMA BLOCK ---
                                                
             except Exception as e:
                 logger.error(f"Error procesando flow acumulado: {e}")
         # --- FIN NUEVO BLOQUE ---    
-        # --- FIN DEL BLOQUE AJUSTADO ---
                 
                 
         except Exception as exc:
             scan_errors_total.labels(error_type=type(exc).__name__).inc()
             logger.exception("Error inesperado en loop principal: %s", exc)
         finally:
+            # Un único POST /ingest/batch por scan (PUBLISH_MODE=batch)
+            get_publisher().flush()
+
              # Record scan duration
             scan_duration = time.time() - scan_start_time
             scan_duration_seconds.observe(scan_duration)
@@ -528,8 +507,124 @@ def run_detector_loop() -> None:
     )
     heartbeat_thread.start()        
 
+    get_publisher().close()
     logger.info("Detector detenido limpiamente")
 
+
+def run_detector_stream() -> None:
+    """
+    Modo streaming (INGESTION_MODE=stream).
+
+    En vez de scan + sleep, procesa la red IBKR hasta que llega un tick
+    (pendingTickersEvent) y empuja los tickers cambiados a cada etapa
+    con su propio debounce:
+      - market:  snapshot SPY al backend
+      - flow:    solo los contratos con ticks nuevos (deltas de volumen)
+      - gamma:   cadena completa
+      - anomaly: cadena completa
+    """
+    logger.info("Detector en modo STREAMING (pendingTickersEvent)")
+
+    debouncer = StageDebouncer({
+        "market": settings.stream_market_debounce_ms / 1000,
+        "flow": settings.stream_flow_debounce_ms / 1000,
+        "gamma": settings.stream_gamma_debounce_ms / 1000,
+        "anomaly": settings.stream_anomaly_debounce_ms / 1000,
+    })
+    subscribed_center = None
+
+    while RUNNING:
+        try:
+            if FORCE_DETECTOR_ACTIVE:
+                pass
+            elif not is_detector_active():
+                sleep_seconds = seconds_until_detector_active()
+                logger.info(
+                    "Mercado cerrado. Durmiendo %d segundos hasta apertura.",
+                    sleep_seconds,
+                )
+                ibkr_client.stop_streaming()
+                subscribed_center = None
+                time.sleep(min(sleep_seconds, 300))
+                continue
+
+            if not ibkr_client.ensure_connected():
+                ibkr_connection_status.set(0)
+                logger.error("IBKR no disponible, reintentando en 10s")
+                subscribed_center = None
+                time.sleep(10)
+                continue
+
+            ibkr_connection_status.set(1)
+
+            # Tras reconexión _on_connect limpia el ticker SPY y las suscripciones
+            if ibkr_client.spy_ticker is None:
+                if not ibkr_client.start_streaming():
+                    time.sleep(5)
+                    continue
+                subscribed_center = None
+
+            # --- Esperar ticks (como máximo hasta la próxima etapa pendiente) ---
+            timeout = settings.stream_idle_timeout_seconds
+            next_due = debouncer.time_until_due()
+            if next_due is not None:
+                timeout = min(timeout, next_due)
+            batch = ibkr_client.wait_for_ticks(timeout)
+
+            spy_price = ibkr_client.get_streaming_spy_price()
+            if spy_price is None:
+                continue
+            spy_price_current.set(spy_price)
+
+            _ensure_market_state(spy_price)
+
+            # --- Ventana ATM: resuscribir solo si cambia el centro ---
+            atm_center = round(spy_price)
+            if atm_center != subscribed_center or not ibkr_client.active_subscriptions:
+                if ibkr_client.sync_atm_subscriptions(spy_price):
+                    subscribed_center = atm_center
+                _check_atm_change(spy_price)
+
+            if batch.option_keys or batch.spy_changed:
+                debouncer.push(batch.option_keys)
+                ibkr_tick_count_total.labels(symbol="SPY").inc(len(batch.option_keys))
+
+            now = time.time()
+
+            if debouncer.due("market", now) is not None:
+                _send_spymarket_tick(spy_price)
+
+            flow_keys = debouncer.due("flow", now)
+            if flow_keys:
+                chain = ibkr_client.collect_options_data(flow_keys)
+                _run_flow_stage(chain, chain.valid_mask() & chain.mask_for_keys(flow_keys), spy_price)
+
+            run_gamma = debouncer.due("gamma", now) is not None
+            run_anomaly = debouncer.due("anomaly", now) is not None
+            if run_gamma or run_anomaly:
+                chain = ibkr_client.collect_options_data()
+                valid_mask = chain.valid_mask()
+                if valid_mask.any():
+                    if run_anomaly:
+                        _run_anomaly_stage(chain, valid_mask, spy_price)
+                    if run_gamma:
+                        _run_gamma_stage(chain, valid_mask, spy_price)
+
+            # Un único POST /ingest/batch por iteración (PUBLISH_MODE=batch)
+            get_publisher().flush()
+
+            if batch.first_tick_ts is not None:
+                pipeline_latency_seconds.observe(time.time() - batch.first_tick_ts)
+
+        except Exception as exc:
+            scan_errors_total.labels(error_type=type(exc).__name__).inc()
+            logger.exception("Error inesperado en loop streaming: %s", exc)
+            time.sleep(1)
+
+    ibkr_client.stop_streaming()
+    get_publisher().close()
+    logger.info("Detector (streaming) detenido limpiamente")
+
 # -----------------------------------------------------------------------------
 # Entrypoint
 # -----------------------------------------------------------------------------
@@ -0,0 +1,320 @@
+"""
+Greeks Engine - Vectorized Black-Scholes Greeks for the SPY 0DTE chain.
+
+Computes, for the whole subscribed chain in one call:
+- Implied volatility (batched Newton-Raphson with bisection safeguard)
+- Delta, Gamma and Vanna from Black-Scholes
+
+Time to expiry is intraday: seconds left until the 16:00 ET close, so the
+Greeks sharpen through the session as 0DTE contracts do.
+
+Caching:
+    The IV solve is the only iterative step. Its result is cached per chain
+    row and reused while the row's quote_version (bid/ask/last) is unchanged
+    and spot / time-to-expiry have not moved beyond tolerance. Closed-form
+    Greeks are then recomputed from the cached IVs every scan.
+
+Architecture:
+    IBKRClient.chain → GreeksEngine.compute() → GammaExposureEngine (GREEKS_MODE=bs)
+
+Code Pattern:
+    pressure_engine.py (singleton getter, NamedTuple results)
+"""
+import logging
+import math
+from datetime import datetime, time
+from typing import NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from scipy.special import ndtr
+
+from config import settings
+from option_chain import OptionChainSnapshot, RIGHT_CALL
+
+logger = logging.getLogger(__name__)
+
+NY_TZ = ZoneInfo('America/New_York')
+MARKET_CLOSE_ET = time(16, 0)
+SECONDS_PER_YEAR = 365.0 * 24 * 3600
+
+# Floor of 1 minute: Black-Scholes gamma diverges at expiry
+MIN_TIME_TO_EXPIRY = 60.0 / SECONDS_PER_YEAR
+
+# IV search bracket (annualized)
+IV_LOWER = 1e-3
+IV_UPPER = 5.0
+IV_INITIAL_GUESS = 0.3
+
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+
+class GreeksResult(NamedTuple):
+    """
+    Greeks for the rows of np.flatnonzero(mask), in that order.
+
+    Rows whose price could not be inverted (no quote, below intrinsic,
+    above the no-arbitrage bound) are NaN in every field.
+    """
+    iv: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    vanna: np.ndarray
+
+
+def time_to_expiry(now: Optional[datetime] = None) -> float:
+    """
+    Years left until today's 16:00 ET close (floored at MIN_TIME_TO_EXPIRY).
+    """
+    now = now.astimezone(NY_TZ) if now is not None else datetime.now(NY_TZ)
+    close = datetime.combine(now.date(), MARKET_CLOSE_ET, tzinfo=NY_TZ)
+    return max((close - now).total_seconds() / SECONDS_PER_YEAR, MIN_TIME_TO_EXPIRY)
+
+
+def _d1_d2(
+    spot: float,
+    strike: np.ndarray,
+    t: float,
+    r: float,
+    sigma: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    sigma_sqrt_t = sigma * math.sqrt(t)
+    d1 = (np.log(spot / strike) + (r + 0.5 * sigma * sigma) * t) / sigma_sqrt_t
+    return d1, d1 - sigma_sqrt_t
+
+
+def bs_price(
+    spot: float,
+    strike: np.ndarray,
+    t: float,
+    r: float,
+    sigma: np.ndarray,
+    is_call: np.ndarray
+) -> np.ndarray:
+    """
+    Black-Scholes price for calls and puts (vectorized over strike/sigma/is_call).
+    """
+    d1, d2 = _d1_d2(spot, strike, t, r, sigma)
+    discounted_strike = strike * math.exp(-r * t)
+    call = spot * ndtr(d1) - discounted_strike * ndtr(d2)
+    put = discounted_strike * ndtr(-d2) - spot * ndtr(-d1)
+    return np.where(is_call, call, put)
+
+
+def bs_greeks(
+    spot: float,
+    strike: np.ndarray,
+    t: float,
+    r: float,
+    sigma: np.ndarray,
+    is_call: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Black-Scholes delta, gamma and vanna (dDelta/dSigma).
+
+    Returns:
+        (delta, gamma, vanna) arrays; NaN sigma propagates to NaN Greeks
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(spot, strike, t, r, sigma)
+        pdf_d1 = np.exp(-0.5 * d1 * d1) * _INV_SQRT_2PI
+        delta = np.where(is_call, ndtr(d1), ndtr(d1) - 1.0)
+        gamma = pdf_d1 / (spot * sigma * math.sqrt(t))
+        vanna = -pdf_d1 * d2 / sigma
+    return delta, gamma, vanna
+
+
+def implied_volatility(
+    price: np.ndarray,
+    spot: float,
+    strike: np.ndarray,
+    t: float,
+    r: float,
+    is_call: np.ndarray,
+    initial: Optional[np.ndarray] = None,
+    tol: float = 1e-5,
+    max_iter: int = 50
+) -> np.ndarray:
+    """
+    Batched implied volatility solve.
+
+    Newton-Raphson on every row at once; a row whose Newton step is not finite
+    or leaves its current [lo, hi] bracket takes a bisection step instead, so
+    the solve always converges for prices inside the no-arbitrage bounds.
+
+    Args:
+        price: Option prices to invert
+        spot: Underlying price
+        strike: Strikes
+        t: Time to expiry (years)
+        r: Risk-free rate
+        is_call: Boolean mask (True=call, False=put)
+        initial: Optional warm-start sigmas (e.g. last scan's IV)
+        tol: Absolute price tolerance
+        max_iter: Iteration cap (rows still open keep their bracketed estimate)
+
+    Returns:
+        Implied volatilities (NaN where the price is not invertible)
+    """
+    discounted_strike = strike * math.exp(-r * t)
+    intrinsic = np.where(is_call, np.maximum(spot - discounted_strike, 0.0),
+                         np.maximum(discounted_strike - spot, 0.0))
+    upper_bound = np.where(is_call, spot, discounted_strike)
+    solvable = np.isfinite(price) & (price > intrinsic) & (price < upper_bound)
+
+    sigma = np.full(len(price), IV_INITIAL_GUESS)
+    if initial is not None:
+        warm = np.isfinite(initial) & (initial > IV_LOWER) & (initial < IV_UPPER)
+        sigma = np.where(warm, initial, sigma)
+    lo = np.full(len(price), IV_LOWER)
+    hi = np.full(len(price), IV_UPPER)
+
+    sqrt_t = math.sqrt(t)
+    active = np.flatnonzero(solvable)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            if len(active) == 0:
+                break
+            s = sigma[active]
+            k = strike[active]
+            calls = is_call[active]
+
+            d1, d2 = _d1_d2(spot, k, t, r, s)
+            dk = discounted_strike[active]
+            model = np.where(calls, spot * ndtr(d1) - dk * ndtr(d2), dk * ndtr(-d2) - spot * ndtr(-d1))
+            diff = model - price[active]
+            vega = spot * np.exp(-0.5 * d1 * d1) * _INV_SQRT_2PI * sqrt_t
+
+            # Price is increasing in sigma: tighten the bracket around the root
+            hi[active] = np.where(diff > 0, s, hi[active])
+            lo[active] = np.where(diff <= 0, s, lo[active])
+
+            step = s - diff / vega
+            outside = ~np.isfinite(step) | (step <= lo[active]) | (step >= hi[active])
+            converged = np.abs(diff) < tol
+            sigma[active] = np.where(converged, s, np.where(outside, 0.5 * (lo[active] + hi[active]), step))
+            active = active[~converged]
+
+    sigma[~solvable] = np.nan
+    return sigma
+
+
+class GreeksEngine:
+    """
+    Chain-wide Greeks with a per-row IV cache keyed by quote version.
+    """
+
+    def __init__(
+        self,
+        risk_free_rate: float = 0.0,
+        spot_tolerance: float = 0.05,
+        expiry_tolerance: float = 0.02
+    ):
+        """
+        Initializes the Greeks engine.
+
+        Args:
+            risk_free_rate: Annualized risk-free rate
+            spot_tolerance: Spot move (in $) that invalidates a cached IV
+            expiry_tolerance: Relative time-to-expiry change that invalidates a cached IV
+        """
+        self.risk_free_rate = risk_free_rate
+        self.spot_tolerance = spot_tolerance
+        self.expiry_tolerance = expiry_tolerance
+        self._resize(0)
+
+        logger.info(f"GreeksEngine initialized (r={risk_free_rate}, spot_tol=${spot_tolerance})")
+
+    def _resize(self, size: int) -> None:
+        """(Re)creates the per-row IV cache (called when the chain grows)."""
+        self._iv = np.full(size, np.nan)
+        self._version = np.full(size, -1, dtype=np.int64)
+        self._spot = np.full(size, np.nan)
+        self._expiry = np.full(size, np.nan)
+
+    @staticmethod
+    def _quote_price(chain: OptionChainSnapshot, idx: np.ndarray) -> np.ndarray:
+        """Mid when both sides are quoted, else last trade, else NaN."""
+        mid = chain.mid[idx]
+        last = chain.last[idx]
+        return np.where(mid > 0, mid, np.where(last > 0, last, np.nan))
+
+    def compute(
+        self,
+        chain: OptionChainSnapshot,
+        spy_price: float,
+        mask: Optional[np.ndarray] = None,
+        now: Optional[datetime] = None
+    ) -> GreeksResult:
+        """
+        Computes IV, delta, gamma and vanna for the masked chain rows.
+
+        Args:
+            chain: Columnar option chain
+            spy_price: Current SPY price
+            mask: Rows to compute (default: chain.valid_mask())
+            now: Evaluation time (default: now), for time to expiry
+
+        Returns:
+            GreeksResult aligned with np.flatnonzero(mask)
+        """
+        if mask is None:
+            mask = chain.valid_mask()
+        if chain.size != len(self._iv):
+            self._resize(chain.size)
+
+        idx = np.flatnonzero(mask)
+        t = time_to_expiry(now)
+        strike = chain.strike[idx]
+        is_call = chain.right[idx] == RIGHT_CALL
+
+        # ✅ OPT: only re-solve rows whose quote changed or whose spot/expiry drifted
+        stale = (
+            (self._version[idx] != chain.quote_version[idx])
+            | ~(np.abs(self._spot[idx] - spy_price) <= self.spot_tolerance)
+            | ~(np.abs(np.log(t / self._expiry[idx])) <= self.expiry_tolerance)
+        )
+        solve = idx[stale]
+        if len(solve):
+            self._iv[solve] = implied_volatility(
+                self._quote_price(chain, solve),
+                spy_price,
+                chain.strike[solve],
+                t,
+                self.risk_free_rate,
+                chain.right[solve] == RIGHT_CALL,
+                initial=self._iv[solve]
+            )
+            self._version[solve] = chain.quote_version[solve]
+            self._spot[solve] = spy_price
+            self._expiry[solve] = t
+
+        iv = self._iv[idx]
+        delta, gamma, vanna = bs_greeks(spy_price, strike, t, self.risk_free_rate, iv, is_call)
+
+        logger.debug(f"Greeks: {len(idx)} rows, {len(solve)} IV re-solved, T={t * SECONDS_PER_YEAR / 60:.0f}min")
+        return GreeksResult(iv=iv, delta=delta, gamma=gamma, vanna=vanna)
+
+
+# ========================================
+# SINGLETON PATTERN (pattern: pressure_engine.py)
+# ========================================
+
+_greeks_engine = None
+
+
+def get_greeks_engine() -> GreeksEngine:
+    """
+    Gets singleton instance of GreeksEngine.
+
+    Returns:
+        Global instance of GreeksEngine
+    """
+    global _greeks_engine
+    if _greeks_engine is None:
+        _greeks_engine = GreeksEngine(
+            risk_free_rate=settings.greeks_risk_free_rate,
+            spot_tolerance=settings.greeks_spot_tolerance
+        )
+        logger.info("✅ GreeksEngine singleton created")
+    return _greeks_engine
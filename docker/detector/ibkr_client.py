@@ -7,16 +7,23 @@ import time
 import math
 import os
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, NamedTuple, Set
 from datetime import datetime, timedelta
 from ib_async import IB, Stock, Option, Contract, Ticker
 from ib_async.contract import ContractDetails
 from config import settings
+from option_chain import OptionChainSnapshot
 
 pod_name = os.getenv("HOSTNAME", "detector-0")
 client_id = abs(hash(pod_name)) % 1000  # clientId estable y único por pod
 
 
+class TickBatch(NamedTuple):
+    """Tickers con cambios acumulados desde el último drain (modo streaming)."""
+    option_keys: Set[str]          # claves "strike_right" con ticks nuevos
+    spy_changed: bool              # hubo tick del subyacente SPY
+    first_tick_ts: Optional[float]  # epoch del primer tick pendiente (para latencia)
+
 
 class IBKRClient:
     """Interactive Brokers API client wrapper."""
@@ -31,6 +38,18 @@ class IBKRClient:
         self.contract_cache = {}
         self.spy_prev_close = None
         
+        # Snapshot columnar preasignado (±N strikes × C/P), actualizado in-place
+        atm_strikes = getattr(config, 'atm_fixed_strikes', 5) if config else 5
+        self.chain = OptionChainSnapshot(strikes_capacity=2 * atm_strikes + 1)
+        
+        # === Estado de streaming (pendingTickersEvent) ===
+        self.streaming = False
+        self.spy_ticker: Optional[Ticker] = None
+        self._conid_keys: Dict[int, str] = {}   # conId → "strike_right"
+        self._pending_keys: Set[str] = set()
+        self._spy_dirty = False
+        self._pending_since: Optional[float] = None
+        
         # === Event Handlers para Reconexión Automática ===
         self.ib.disconnectedEvent += self._on_disconnect
         self.ib.connectedEvent += self._on_connect
@@ -155,6 +174,8 @@ class IBKRClient:
             if self.connect():
                 self.logger.info(f"✅ Reconectado con éxito en el intento {attempt}")
                 self.active_subscriptions.clear() # Limpiamos para evitar datos corruptos
+                self._conid_keys.clear()
+                self.chain.clear()
                 return True
             
             if attempt < max_retries:
@@ -389,10 +410,36 @@ class IBKRClient:
             self.logger.warning("Error durante shutdown IBKR: %s", e)
             
 
-    def update_atm_subscriptions(self, spy_price: float) -> List[Dict[str, Any]]:
+    def update_atm_subscriptions(self, spy_price: float) -> Optional[OptionChainSnapshot]:
         """
         Actualiza suscripciones dinámicamente según precio ATM actual.
         Fusiona gestión de strikes dinámica con captura robusta de volumen.
+        
+        Returns:
+            El snapshot columnar (self.chain) actualizado in-place, o None si falla
+        """
+        if not self.sync_atm_subscriptions(spy_price):
+            return None
+        
+        # 6. Pausa de sincronización
+        try:
+            self.ib.sleep(0.5)  # Reducido de 5s → 0.5s
+        except (ConnectionError, ConnectionResetError, asyncio.CancelledError) as e:
+            self.logger.error(f"Conexión perdida durante sleep: {e}")
+            self.connect()
+            return None
+        except Exception as e:
+            self.logger.error(f"Error inesperado durante sleep: {e}")
+            return None
+        
+        return self.collect_options_data()
+    
+    def sync_atm_subscriptions(self, spy_price: float) -> bool:
+        """
+        Cancela/suscribe strikes para mantener la ventana ATM fija (±N strikes).
+        
+        Returns:
+            False si ningún strike nuevo pudo cualificarse (problema crítico en IBKR)
         """
         # ✅ Fix: math, datetime e Option ya importados al nivel de módulo
         
@@ -423,6 +470,9 @@ class IBKRClient:
                 key = f"{strike}_{right}"
                 if key in self.active_subscriptions:
                     ticker = self.active_subscriptions.pop(key)
+                    self._conid_keys.pop(ticker.contract.conId, None)
+                    self.chain.release(key)
+                    self._pending_keys.discard(key)
                     self.ib.cancelMktData(ticker.contract)
                     cancel_count += 1
         
@@ -456,7 +506,7 @@ class IBKRClient:
             
             if not valid_qualified:
                 self.logger.error(f"❌ NINGÚN strike cualificado ({failed_count} intentados) - problema crítico en IBKR o fecha")
-                return []
+                return False
             
             if failed_count > 0:
                 failed_strikes = [
@@ -476,26 +526,41 @@ class IBKRClient:
                     self.ib.sleep(0.1)
                     key = f"{strike}_{right}"
                     self.active_subscriptions[key] = ticker
+                    self._conid_keys[qualified.conId] = key
+                    self.chain.assign(key, strike, right)
                     add_count += 1
                 except Exception as e:
                     self.logger.error(f"Error suscribiendo {strike}_{right}: {e}")
         
-        # 6. Pausa de sincronización
-        try:
-            self.ib.sleep(0.5)  # Reducido de 5s → 0.5s
-        except (ConnectionError, ConnectionResetError, asyncio.CancelledError) as e:
-            self.logger.error(f"Conexión perdida durante sleep: {e}")
-            self.connect()
-            return []
-        except Exception as e:
-            self.logger.error(f"Error inesperado durante sleep: {e}")
-            return []
+        self.logger.info(
+            f"Suscripciones: {len(self.active_subscriptions)} | "
+            f"ATM: {len(current_strikes_set)} strikes | "
+            f"Limpia: {cancel_count} | "
+            f"Nuevas: {add_count}"
+        )
+        return True
+    
+    def collect_options_data(self, keys: Optional[Set[str]] = None) -> OptionChainSnapshot:
+        """
+        Vuelca el estado actual de los tickers suscritos en self.chain (sin esperar a IBKR).
+        
+        Args:
+            keys: Subconjunto de claves "strike_right" a leer (None = todas)
+            
+        Returns:
+            self.chain actualizado in-place
+        """
+        chain = self.chain
         
         # --- RECOLECCIÓN DE DATOS MEJORADA ---
-        options_data = []
         for key, ticker in self.active_subscriptions.items():
+            if keys is not None and key not in keys:
+                continue
             try:
-                strike_str, right = key.split('_')
+                idx = chain.index_of(key)
+                if idx is None:
+                    continue
+                right = key.split('_')[1]
                 
                 # MEJORA: Lógica de Volumen Robusta (Acumulado Suave)
                 vol = ticker.callVolume if right == "C" else ticker.putVolume
@@ -506,33 +571,116 @@ class IBKRClient:
 
                 volume = int(vol) if (not math.isnan(vol) and vol > 0) else 0
                 
-                # Mid price con seguridad
+                # Precios con seguridad (NaN → 0)
                 bid = ticker.bid if not math.isnan(ticker.bid) and ticker.bid > 0 else 0
                 ask = ticker.ask if not math.isnan(ticker.ask) and ticker.ask > 0 else 0
-                mid = (bid + ask) / 2 if (bid > 0 and ask > 0) else 0
                 
-                options_data.append({
-                    'strike': float(strike_str),
-                    'option_type': right,
-                    'expiration': today,
-                    'bid': bid,
-                    'ask': ask,
-                    'last': ticker.last if not math.isnan(ticker.last) else 0,
-                    'volume': volume, # <-- Volumen acumulado
-                    'open_interest': (ticker.callOpenInterest if right == 'C' else ticker.putOpenInterest) if right in ['C', 'P'] else 0,
-                    'mid': mid,
-                })
+                chain.update(
+                    idx,
+                    bid=bid,
+                    ask=ask,
+                    last=ticker.last if not math.isnan(ticker.last) else 0,
+                    volume=volume,  # <-- Volumen acumulado
+                    open_interest=ticker.callOpenInterest if right == 'C' else ticker.putOpenInterest,
+                )
             except Exception as e:
                 self.logger.debug(f"Error procesando datos para {key}: {e}")
         
-        self.logger.info(
-            f"Suscripciones: {len(self.active_subscriptions)} | "
-            f"ATM: {len(current_strikes_set)} strikes | "
-            f"Limpia: {cancel_count} | "
-            f"Nuevas: {add_count}"
+        return chain
+    
+    # -------------------------------------------------------------------------
+    #  Streaming: ingestión por eventos (pendingTickersEvent) en vez de polling
+    # -------------------------------------------------------------------------
+    
+    def start_streaming(self) -> bool:
+        """
+        Suscribe SPY de forma persistente y engancha pendingTickersEvent.
+        
+        Los ticks se acumulan en _pending_keys y se consumen con wait_for_ticks().
+        """
+        if not self.spy_contract:
+            self.get_spy_contract()
+        if not self.spy_contract:
+            return False
+        
+        if not self.streaming:
+            self.ib.pendingTickersEvent += self._on_pending_tickers
+            self.streaming = True
+        
+        # Reutilizar la suscripción SPY si sigue viva (evita duplicados en cada apertura)
+        if self.spy_ticker is None:
+            self.spy_ticker = self.ib.reqMktData(self.spy_contract, '', False, False)
+        self.logger.info("📡 Streaming IBKR activado (pendingTickersEvent)")
+        return True
+    
+    def stop_streaming(self):
+        """Desengancha el handler de ticks y cancela el market data de SPY (las opciones se mantienen)."""
+        if self.streaming:
+            self.ib.pendingTickersEvent -= self._on_pending_tickers
+            self.streaming = False
+        if self.spy_ticker is not None:
+            try:
+                self.ib.cancelMktData(self.spy_contract)
+            except Exception as e:
+                self.logger.debug(f"Error cancelando market data SPY: {e}")
+            self.spy_ticker = None
+    
+    def wait_for_ticks(self, timeout: float) -> TickBatch:
+        """
+        Procesa la red IBKR hasta que llegue algún tick o venza el timeout
+        y devuelve (y vacía) los tickers pendientes.
+        """
+        try:
+            if not self._pending_keys and not self._spy_dirty:
+                self.ib.waitOnUpdate(timeout=timeout)
+        except (ConnectionError, ConnectionResetError, asyncio.CancelledError) as e:
+            self.logger.error(f"Conexión perdida esperando ticks: {e}")
+        except Exception as e:
+            self.logger.error(f"Error inesperado esperando ticks: {e}")
+        
+        batch = TickBatch(
+            option_keys=self._pending_keys,
+            spy_changed=self._spy_dirty,
+            first_tick_ts=self._pending_since,
         )
+        self._pending_keys = set()
+        self._spy_dirty = False
+        self._pending_since = None
+        return batch
+    
+    def get_streaming_spy_price(self) -> Optional[float]:
+        """Precio SPY desde el ticker persistente (sin reqMktData ni esperas)."""
+        ticker = self.spy_ticker
+        if ticker is None:
+            return None
         
-        return options_data
+        price = ticker.marketPrice()
+        if math.isnan(price):
+            price = ticker.last or ticker.close or \
+                    ((ticker.bid + ticker.ask) / 2 if ticker.bid and ticker.ask else float('nan'))
+        if price is None or math.isnan(price):
+            return None
+        
+        close_val = ticker.close if ticker.close else float('nan')
+        if not math.isnan(close_val) and close_val > 0:
+            self.spy_prev_close = close_val
+        
+        return price
+    
+    def _on_pending_tickers(self, tickers):
+        """Handler de pendingTickersEvent: marca los contratos con ticks nuevos."""
+        spy_con_id = self.spy_contract.conId if self.spy_contract else None
+        for ticker in tickers:
+            con_id = getattr(ticker.contract, 'conId', 0)
+            if con_id == spy_con_id:
+                self._spy_dirty = True
+                continue
+            key = self._conid_keys.get(con_id)
+            if key is not None:
+                self._pending_keys.add(key)
+        
+        if self._pending_since is None and (self._pending_keys or self._spy_dirty):
+            self._pending_since = time.time()
     
     def _on_disconnect(self):
         """Handler cuando IBKR se desconecta (evento automático ib_async)"""
@@ -545,6 +693,10 @@ class IBKRClient:
         self.logger.info("🟢 IBKR reconnected - limpiando estado...")
         self.connected = True
         self.active_subscriptions.clear()  # Reset subscriptions tras reconexión
+        self._conid_keys.clear()
+        self._pending_keys.clear()
+        self.chain.clear()
+        self.spy_ticker = None  # El stream lo vuelve a pedir en el siguiente ciclo
   
 # ✅ Fix: instancia global eliminada — IBKRClient se instancia en detector.py.
 # Tenerla aqui creaba una segunda instancia fantasma al hacer el import.
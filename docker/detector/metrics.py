@@ -39,6 +39,12 @@ anomalies_per_scan = Histogram(
     buckets=[0, 5, 10, 20, 50, 100]
 )
 
+anomaly_fit_updates_total = Counter(
+    'anomaly_fit_updates_total',
+    'Exponential fit updates per side',
+    ['option_type', 'mode']  # mode: warm/cold/atm_change/drift
+)
+
 # Backend Communication
 backend_requests_total = Counter(
     'backend_requests_total',
@@ -52,6 +58,23 @@ backend_request_duration_seconds = Histogram(
     ['endpoint']
 )
 
+publisher_queue_depth = Gauge(
+    'publisher_queue_depth',
+    'Pending POSTs in the backend publisher queue'
+)
+
+publisher_dropped_total = Counter(
+    'publisher_dropped_total',
+    'POSTs dropped because the publisher queue was full',
+    ['endpoint']
+)
+
+publisher_retries_total = Counter(
+    'publisher_retries_total',
+    'POST retries after timeout, connection error or 5xx',
+    ['endpoint']
+)
+
 # Scan Operations
 scan_duration_seconds = Histogram(
     'scan_duration_seconds',
@@ -182,4 +182,31 @@ class GammaMetrics(BaseModel):
     gamma_walls: List[Dict]      # Top 5: [{strike, type, gamma, distance}, ...]
     atm_flow: float              # ATM flow pressure
     net_flow: float              # call_flow - put_flow
-    gamma_weighted_flow: float   # GWF (Gamma Weighted Flow)
\ No newline at end of file
+    gamma_weighted_flow: float   # GWF (Gamma Weighted Flow)
+
+class IngestBatch(BaseModel):
+    """
+    Envelope for POST /ingest/batch (one envelope per detector scan).
+    
+    Records are kept as raw dicts so one invalid record is rejected on its own
+    (per-record status) instead of failing the whole envelope with a 422.
+    """
+    spymarket: List[Dict] = Field(default_factory=list)   # /spymarket payloads
+    flow: List[Dict] = Field(default_factory=list)        # FlowSnapshot
+    gamma: List[Dict] = Field(default_factory=list)       # GammaMetrics
+    anomalies: List[Dict] = Field(default_factory=list)   # AnomaliesSnapshot
+
+
+class IngestRecordStatus(BaseModel):
+    """Per-record result of an /ingest/batch envelope."""
+    channel: str                  # "spymarket", "flow", "gamma", "anomalies"
+    index: int                    # Position in the channel list
+    status: str                   # "accepted" or "rejected"
+    detail: Optional[str] = None  # Rejection reason
+
+
+class IngestBatchResponse(BaseModel):
+    """Response for /ingest/batch endpoint."""
+    accepted: int
+    rejected: int
+    results: List[IngestRecordStatus]
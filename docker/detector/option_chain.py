@@ -0,0 +1,176 @@
+"""
+Option Chain Snapshot - Cadena de opciones columnar (NumPy) para el detector.
+
+Sustituye la lista de dicts que se reconstruía en cada scan por arrays
+preasignados que IBKRClient actualiza in-place. Todos los consumidores
+(anomaly_algo, GammaExposureEngine, VolumeTracker) leen las mismas columnas.
+
+Layout:
+    Cada strike suscrito ocupa un "strike slot" fijo; el índice de fila es
+    slot * 2 + right (RIGHT_CALL=0, RIGHT_PUT=1). Cuando la ventana ATM se
+    desplaza, los slots liberados se reutilizan para los strikes nuevos.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RIGHT_CALL = 0
+RIGHT_PUT = 1
+RIGHT_CODES = {'C': RIGHT_CALL, 'P': RIGHT_PUT}
+RIGHT_LABELS = ('C', 'P')
+
+
+class OptionChainSnapshot:
+    """
+    Snapshot columnar de la cadena 0DTE suscrita.
+
+    Columnas (longitud = capacity * 2):
+        strike, right, bid, ask, last, mid, volume, open_interest, active, epoch,
+        quote_version
+
+    `epoch` se incrementa cada vez que una fila cambia de contrato, para que
+    los consumidores con estado por fila (VolumeTracker) detecten la reasignación.
+    `quote_version` se incrementa cuando cambia bid/ask/last de la fila (o se
+    reasigna), para cachear cálculos caros por cotización (GreeksEngine).
+    """
+
+    def __init__(self, strikes_capacity: int):
+        self.strikes_capacity = 0
+        self.keys: List[Optional[str]] = []
+        self._key_index: Dict[str, int] = {}
+        self._strike_slots: Dict[float, int] = {}
+        self._free_slots: List[int] = []
+        self._allocate(max(1, strikes_capacity))
+
+    # -------------------------------------------------------------------------
+    #  Gestión de slots
+    # -------------------------------------------------------------------------
+
+    def _allocate(self, strikes_capacity: int) -> None:
+        """Reserva (o amplía) los arrays conservando las filas existentes."""
+        old_size = self.strikes_capacity * 2
+        size = strikes_capacity * 2
+
+        def _grow(name: str, dtype, fill):
+            column = np.full(size, fill, dtype=dtype)
+            if old_size:
+                column[:old_size] = getattr(self, name)
+            setattr(self, name, column)
+
+        _grow('strike', np.float64, 0.0)
+        _grow('bid', np.float64, 0.0)
+        _grow('ask', np.float64, 0.0)
+        _grow('last', np.float64, 0.0)
+        _grow('mid', np.float64, 0.0)
+        _grow('volume', np.int64, 0)
+        _grow('open_interest', np.float64, np.nan)  # NaN = OI aún no recibido
+        _grow('active', np.bool_, False)
+        _grow('epoch', np.int64, 0)
+        _grow('quote_version', np.int64, 0)
+        self.right = np.tile(np.array([RIGHT_CALL, RIGHT_PUT], dtype=np.int8), strikes_capacity)
+
+        self.keys.extend([None] * (size - old_size))
+        self._free_slots.extend(range(self.strikes_capacity, strikes_capacity))
+        self.strikes_capacity = strikes_capacity
+
+    @property
+    def size(self) -> int:
+        return self.strikes_capacity * 2
+
+    def assign(self, key: str, strike: float, right: str) -> int:
+        """Asigna una fila al contrato `key` ("strike_right") y devuelve su índice."""
+        if key in self._key_index:
+            return self._key_index[key]
+
+        strike = float(strike)
+        slot = self._strike_slots.get(strike)
+        if slot is None:
+            if not self._free_slots:
+                logger.warning(f"OptionChainSnapshot lleno ({self.strikes_capacity} strikes), ampliando")
+                self._allocate(self.strikes_capacity * 2)
+            slot = self._free_slots.pop(0)
+            self._strike_slots[strike] = slot
+
+        idx = slot * 2 + RIGHT_CODES[right]
+        self._reset_row(idx)
+        self.strike[idx] = strike
+        self.active[idx] = True
+        self.keys[idx] = key
+        self._key_index[key] = idx
+        return idx
+
+    def release(self, key: str) -> None:
+        """Libera la fila del contrato; el strike slot se recicla si ambos lados quedan libres."""
+        idx = self._key_index.pop(key, None)
+        if idx is None:
+            return
+        self._reset_row(idx)
+        self.keys[idx] = None
+
+        slot = idx // 2
+        if not self.active[slot * 2] and not self.active[slot * 2 + 1]:
+            strike = float(self.strike[idx])
+            if self._strike_slots.get(strike) == slot:
+                del self._strike_slots[strike]
+                self._free_slots.append(slot)
+
+    def clear(self) -> None:
+        """Libera todas las filas (p. ej. tras reconexión IBKR)."""
+        for key in list(self._key_index):
+            self.release(key)
+
+    def _reset_row(self, idx: int) -> None:
+        self.bid[idx] = self.ask[idx] = self.last[idx] = self.mid[idx] = 0.0
+        self.volume[idx] = 0
+        self.open_interest[idx] = np.nan
+        self.active[idx] = False
+        self.epoch[idx] += 1
+        self.quote_version[idx] += 1
+
+    def index_of(self, key: str) -> Optional[int]:
+        return self._key_index.get(key)
+
+    # -------------------------------------------------------------------------
+    #  Escritura in-place
+    # -------------------------------------------------------------------------
+
+    def update(
+        self,
+        idx: int,
+        bid: float,
+        ask: float,
+        last: float,
+        volume: int,
+        open_interest: float,
+    ) -> None:
+        """Actualiza las cotizaciones de una fila (valores ya saneados por el caller)."""
+        if bid != self.bid[idx] or ask != self.ask[idx] or last != self.last[idx]:
+            self.quote_version[idx] += 1
+        self.bid[idx] = bid
+        self.ask[idx] = ask
+        self.last[idx] = last
+        self.mid[idx] = (bid + ask) / 2 if (bid > 0 and ask > 0) else 0.0
+        self.volume[idx] = volume
+        self.open_interest[idx] = open_interest
+
+    # -------------------------------------------------------------------------
+    #  Máscaras de lectura
+    # -------------------------------------------------------------------------
+
+    def valid_mask(self) -> np.ndarray:
+        """Filas suscritas con datos reales (mid, bid o ask > 0)."""
+        return self.active & ((self.mid > 0) | (self.bid > 0) | (self.ask > 0))
+
+    def mask_for_keys(self, keys: Iterable[str]) -> np.ndarray:
+        """Máscara booleana de las filas correspondientes a `keys`."""
+        mask = np.zeros(self.size, dtype=np.bool_)
+        idx = [self._key_index[k] for k in keys if k in self._key_index]
+        if idx:
+            mask[idx] = True
+        return mask
+
+    def __len__(self) -> int:
+        return len(self._key_index)
@@ -21,13 +21,36 @@ Code Pattern:
 """
 import logging
 import math
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional
 from collections import deque
 from datetime import datetime
 import numpy as np
 
+from config import settings
+from greeks import get_greeks_engine
+from option_chain import OptionChainSnapshot, RIGHT_CALL
+
 logger = logging.getLogger(__name__)
 
+# Peak of the 1/(distance + 0.25) proxy; Black-Scholes gamma is rescaled to it
+# so the NetGEX / pinning normalizations keep their calibration
+GAMMA_PROXY_PEAK = 4.0
+
+
+class ChainArrays(NamedTuple):
+    """
+    Per-row arrays shared by every gamma metric (computed once per tick).
+    """
+    strike: np.ndarray
+    is_call: np.ndarray
+    volume: np.ndarray
+    last: np.ndarray
+    open_interest: np.ndarray   # NaN = OI not yet received
+    distance: np.ndarray        # |strike - spot|
+    gamma_proxy: np.ndarray     # 1 / (distance + 0.25), or rescaled BS gamma
+    delta: np.ndarray           # fixed 0.3/0.5/0.7 proxy, or BS delta
+    oi_factor: np.ndarray       # min(max(OI, volume), 500k), NaN if OI missing
+
 
 class GammaExposureEngine:
     """
@@ -81,19 +104,21 @@ class GammaExposureEngine:
     
     def calculate_gamma_metrics(
         self,
-        options_data: List[Dict],
+        chain: OptionChainSnapshot,
         spy_price: float,
         cum_call_flow: float,
-        cum_put_flow: float
+        cum_put_flow: float,
+        mask: Optional[np.ndarray] = None
     ) -> Dict:
         """
         Calculates industry-standard gamma exposure metrics.
         
         Args:
-            options_data: List of contracts with keys: strike, option_type, bid, ask, volume, mid, last
+            chain: Columnar option chain (strike, right, volume, last, open_interest arrays)
             spy_price: Current SPY underlying price
             cum_call_flow: Cumulative calls flow (signed premium)
             cum_put_flow: Cumulative puts flow (signed premium)
+            mask: Rows to include (default: chain.valid_mask())
             
         Returns:
             {
@@ -109,8 +134,11 @@ class GammaExposureEngine:
         """
         timestamp = int(datetime.utcnow().timestamp())
         
+        if mask is None:
+            mask = chain.valid_mask()
+        
         # Defensive validations
-        if not options_data:
+        if not mask.any():
             logger.warning("No options data provided to GammaExposureEngine")
             return self._empty_metrics(timestamp)
         
@@ -126,6 +154,9 @@ class GammaExposureEngine:
             # Calculate ATM strike
             atm_strike = round(spy_price)
             
+            # ✅ OPT: single vectorized pass over the chain, shared by every metric
+            options_data = self._chain_arrays(chain, mask, spy_price)
+            
             # 1. Calculate base metrics
             net_flow = cum_call_flow - cum_put_flow
             
@@ -187,9 +218,56 @@ class GammaExposureEngine:
             logger.error(f"Error calculating gamma metrics: {e}", exc_info=True)
             return self._empty_metrics(timestamp)
     
+    def _chain_arrays(self, chain: OptionChainSnapshot, mask: np.ndarray, spy_price: float) -> ChainArrays:
+        """
+        Extracts the masked chain rows and the derived gamma/delta/OI proxies as arrays.
+        
+        With GREEKS_MODE=bs, gamma and delta come from GreeksEngine (Black-Scholes
+        with implied vol); rows whose IV cannot be solved keep the proxies.
+        """
+        idx = np.flatnonzero(mask)
+        strike = chain.strike[idx]
+        is_call = chain.right[idx] == RIGHT_CALL
+        volume = chain.volume[idx].astype(np.float64)
+        open_interest = chain.open_interest[idx]
+        distance = np.abs(strike - spy_price)
+        atm_strike = round(spy_price)
+        
+        # Gamma proxy simple (institucional)
+        gamma_proxy = 1.0 / (distance + 0.25)
+        
+        # Delta proxy aproximado
+        call_delta = np.where(strike == atm_strike, 0.5, np.where(strike < atm_strike, 0.7, 0.3))
+        put_delta = np.where(strike == atm_strike, -0.5, np.where(strike > atm_strike, -0.7, -0.3))
+        delta = np.where(is_call, call_delta, put_delta)
+        
+        if settings.greeks_mode == "bs":
+            greeks = get_greeks_engine().compute(chain, spy_price, mask)
+            solved = np.isfinite(greeks.gamma) & np.isfinite(greeks.delta)
+            if solved.any():
+                peak = greeks.gamma[solved].max()
+                gamma_proxy = np.where(solved, greeks.gamma * (GAMMA_PROXY_PEAK / peak), gamma_proxy)
+                delta = np.where(solved, greeks.delta, delta)
+        
+        # Gamma concentration factor (OI capped at the 500k institutional threshold).
+        # np.maximum propagates NaN: rows without OI yet score NaN, as before.
+        oi_factor = np.minimum(np.maximum(open_interest, volume), 500_000)
+        
+        return ChainArrays(
+            strike=strike,
+            is_call=is_call,
+            volume=volume,
+            last=chain.last[idx],
+            open_interest=open_interest,
+            distance=distance,
+            gamma_proxy=gamma_proxy,
+            delta=delta,
+            oi_factor=oi_factor,
+        )
+    
     def _calculate_gamma_weighted_flow(
         self, 
-        options_data: List[Dict], 
+        options_data: ChainArrays, 
         spy_price: float,
         atm_strike: float
     ) -> float:
@@ -200,54 +278,31 @@ class GammaExposureEngine:
         gamma_proxy = 1 / (|strike - spot| + 0.25)
         
         Args:
-            options_data: Lista de contratos
+            options_data: Arrays de la cadena (ChainArrays)
             spy_price: Precio SPY
             atm_strike: Strike ATM calculado
             
         Returns:
             Gamma weighted flow (puede ser negativo)
         """
-        gwf = 0.0
-        
-        for option in options_data:
-            try:
-                strike = option.get('strike', 0)
-                option_type = option.get('option_type', '').upper()
-                volume = option.get('volume', 0)
-                last = option.get('last', 0)
-                
-                if not strike or not last or volume <= 0:
-                    continue
-                
-                # Gamma proxy simple (institucional)
-                distance = abs(strike - spy_price)
-                gamma_proxy = 1.0 / (distance + 0.25)
-                
-                # Delta proxy aproximado
-                if option_type == 'C':
-                    delta = 0.5 if strike == atm_strike else (0.7 if strike < atm_strike else 0.3)
-                else:  # PUT
-                    delta = -0.5 if strike == atm_strike else (-0.7 if strike > atm_strike else -0.3)
-                
-                # Flujo direccional (asumimos compra si hay volumen)
-                flow = volume * last * 100 * delta
-                
-                # Weight by gamma (with overflow protection)
-                contribution = flow * gamma_proxy
-                if not math.isinf(contribution) and not math.isnan(contribution):
-                    gwf += contribution
-                else:
-                    logger.warning(f"⚠️ Skipping inf contribution at strike {strike}")
-                
-            except Exception as e:
-                logger.debug(f"Error processing option for GWF: {e}")
-                continue
+        strike = options_data.strike
+        active = (strike != 0) & (options_data.last != 0) & (options_data.volume > 0)
+        
+        # Flujo direccional (asumimos compra si hay volumen)
+        flow = options_data.volume * options_data.last * 100 * options_data.delta
         
-        return gwf
+        # Weight by gamma (with overflow protection)
+        with np.errstate(invalid='ignore', over='ignore'):
+            contribution = flow * options_data.gamma_proxy
+        finite = np.isfinite(contribution)
+        for bad in np.flatnonzero(active & ~finite):
+            logger.warning(f"⚠️ Skipping inf contribution at strike {strike[bad]}")
+        
+        return float(contribution[active & finite].sum())
     
     def _calculate_atm_flow(
         self,
-        options_data: List[Dict],
+        options_data: ChainArrays,
         spy_price: float,
         atm_strike: float
     ) -> float:
@@ -255,42 +310,23 @@ class GammaExposureEngine:
         Calculates flow concentration at ATM strikes.
         
         Args:
-            options_data: List of contracts
+            options_data: Chain arrays (ChainArrays)
             spy_price: SPY price
             atm_strike: ATM strike
             
         Returns:
             ATM flow pressure normalized [-1, 1]
         """
-        atm_call_flow = 0.0
-        atm_put_flow = 0.0
-        
         # Consider ±1 strike as ATM
-        atm_range = [atm_strike - 1, atm_strike, atm_strike + 1]
-        
-        for option in options_data:
-            try:
-                strike = option.get('strike', 0)
-                if strike not in atm_range:
-                    continue
-                
-                option_type = option.get('option_type', '').upper()
-                volume = option.get('volume', 0)
-                last = option.get('last', 0)
-                
-                if not last or volume <= 0:
-                    continue
-                
-                flow = volume * last * 100
-                
-                if option_type == 'C':
-                    atm_call_flow += flow
-                else:
-                    atm_put_flow += flow
-                    
-            except Exception as e:
-                logger.debug(f"Error processing ATM option: {e}")
-                continue
+        atm_mask = (
+            np.isin(options_data.strike, [atm_strike - 1, atm_strike, atm_strike + 1])
+            & (options_data.last != 0)
+            & (options_data.volume > 0)
+        )
+        
+        flow = options_data.volume * options_data.last * 100
+        atm_call_flow = float(flow[atm_mask & options_data.is_call].sum())
+        atm_put_flow = float(flow[atm_mask & ~options_data.is_call].sum())
         
         # Normalize
         total = atm_call_flow + atm_put_flow
@@ -397,7 +433,7 @@ class GammaExposureEngine:
     
     def _calculate_pinning_risk(
         self,
-        options_data: List[Dict],
+        options_data: ChainArrays,
         spy_price: float,
         atm_strike: float
     ) -> float:
@@ -409,38 +445,19 @@ class GammaExposureEngine:
             Pinning Risk = max(gamma_concentration) normalized [0, 1]
         
         Args:
-            options_data: List of contracts
+            options_data: Chain arrays (ChainArrays)
             spy_price: SPY price
             atm_strike: ATM strike
             
         Returns:
             Pinning Risk scaled to [0, 100] (0=no pinning, 100=maximum pinning)
         """
-        max_magnetism = 0.0
-        
-        for option in options_data:
-            try:
-                strike = option.get('strike', 0)
-                volume = option.get('volume', 0)
-                open_interest = option.get('open_interest', 0)  # May not be available
-                
-                if not strike or volume <= 0:
-                    continue
-                
-                # Gamma proxy
-                distance = abs(strike - spy_price)
-                gamma_proxy = 1.0 / (distance + 0.25)
-                
-                # Gamma concentration score (fallback to volume if OI unavailable)
-                # ? Cap to prevent overflow (500k is institutional threshold)
-                oi_factor = min(max(open_interest, volume), 500_000)
-                magnetism = oi_factor * gamma_proxy * volume
-                
-                max_magnetism = max(max_magnetism, magnetism)
-                
-            except Exception as e:
-                logger.debug(f"Error processing pinning risk option: {e}")
-                continue
+        active = (options_data.strike != 0) & (options_data.volume > 0)
+        magnetism = options_data.oi_factor * options_data.gamma_proxy * options_data.volume
+        
+        # Rows without OI (NaN) never win the max, as in the scalar version
+        magnetism = magnetism[active & ~np.isnan(magnetism)]
+        max_magnetism = float(magnetism.max(initial=0.0))
         
         # ✅ CRITICAL: Sanitize before normalization
         if math.isinf(max_magnetism) or math.isnan(max_magnetism):
@@ -456,7 +473,7 @@ class GammaExposureEngine:
     
     def _find_gamma_walls(
         self,
-        options_data: List[Dict],
+        options_data: ChainArrays,
         spy_price: float,
         atm_strike: float
     ) -> List[Dict]:
@@ -469,7 +486,7 @@ class GammaExposureEngine:
         - Top 5 by score
         
         Args:
-            options_data: List of contracts
+            options_data: Chain arrays (ChainArrays)
             spy_price: SPY price
             atm_strike: ATM strike
             
@@ -484,51 +501,43 @@ class GammaExposureEngine:
                 }, ...
             ]
         """
-        gamma_wall_candidates = []
-        
-        # ATM exclusion range (±2 strikes)
-        atm_exclusion_range = set(range(atm_strike - 2, atm_strike + 3))
-        
-        for option in options_data:
-            try:
-                strike = option.get('strike', 0)
-                
-                # Filter out ATM strikes
-                if strike in atm_exclusion_range:
-                    continue
-                
-                option_type = option.get('option_type', '').upper()
-                volume = option.get('volume', 0)
-                open_interest = option.get('open_interest', 0)
-                
-                if volume <= 0:
-                    continue
-                
-                # Gamma proxy
-                distance = abs(strike - spy_price)
-                gamma_proxy = 1.0 / (distance + 0.25)
-                
-                # Gamma concentration score
-                # ? Cap to prevent overflow (500k is institutional threshold)
-                oi_factor = min(max(open_interest, volume), 500_000)
-                gamma_concentration = oi_factor * gamma_proxy * volume
-                
-                gamma_wall_candidates.append({
-                    'strike': float(strike),
-                    'type': option_type,
-                    'score': round(self._sanitize_float(gamma_concentration), 2),
-                    'distance': round(self._sanitize_float(distance), 2),
-                    'volume': int(volume)
-                })
-                
-            except Exception as e:
-                logger.debug(f"Error processing gamma wall: {e}")
-                continue
-        
-        # Sort by score descending and take Top 5
-        gamma_wall_candidates.sort(key=lambda x: x['score'], reverse=True)
-        
-        return gamma_wall_candidates[:5]
+        # ATM exclusion range (±2 strikes) and no-volume rows
+        candidates = np.flatnonzero(
+            ~np.isin(options_data.strike, np.arange(atm_strike - 2, atm_strike + 3))
+            & (options_data.volume > 0)
+        )
+        if len(candidates) == 0:
+            return []
+        
+        # Gamma concentration score (inf/NaN sanitized to 0, e.g. OI not received)
+        score = (options_data.oi_factor * options_data.gamma_proxy * options_data.volume)[candidates]
+        invalid = ~np.isfinite(score)
+        if invalid.any():
+            logger.warning(f"⚠️ Sanitized {int(invalid.sum())} invalid gamma wall scores → 0.0")
+            score = np.where(invalid, 0.0, score)
+        
+        # ✅ OPT: argpartition keeps only the Top 5 neighbourhood; the margin covers
+        # ties introduced by rounding scores to 2 decimals before the final sort
+        if len(candidates) > 5:
+            top = np.argpartition(-score, 4)[:5]
+            keep = score >= score[top].min() - 0.01
+            candidates = candidates[keep]
+            score = score[keep]
+        
+        # Sort by rounded score descending (stable: ties keep chain order) and take Top 5
+        rounded = [round(value, 2) for value in score.tolist()]
+        order = sorted(range(len(candidates)), key=lambda j: rounded[j], reverse=True)[:5]
+        
+        return [
+            {
+                'strike': float(options_data.strike[candidates[j]]),
+                'type': 'C' if options_data.is_call[candidates[j]] else 'P',
+                'score': rounded[j],
+                'distance': round(float(options_data.distance[candidates[j]]), 2),
+                'volume': int(options_data.volume[candidates[j]])
+            }
+            for j in order
+        ]
     
     def _empty_metrics(self, timestamp: int) -> Dict:
         """
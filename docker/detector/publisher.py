@@ -0,0 +1,271 @@
+"""
+Backend Publisher - Cola acotada + pool de workers para los POST detector → backend.
+
+Sustituye el patrón "un Thread por POST" (_post_async) y los requests.post
+sueltos (una conexión TCP nueva por llamada):
+
+- Una única queue.Queue acotada: el scan loop solo encola (put_nowait) y
+  nunca se bloquea; si la cola está llena el mensaje se descarta y se cuenta.
+- Pool fijo de workers daemon que consumen la cola.
+- requests.Session compartida con HTTPAdapter (keep-alive) hacia settings.backend_url.
+- Reintentos con backoff exponencial + jitter en timeouts, errores de conexión y 5xx.
+- Modo batch (PUBLISH_MODE=batch): spymarket/flow/gamma/anomalies se acumulan en
+  un sobre por scan y flush() lo envía como un único POST /ingest/batch.
+
+Architecture:
+    detector.py (_run_*_stage) → BackendPublisher.publish() → workers → Backend
+"""
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+from metrics import (
+    backend_requests_total,
+    backend_request_duration_seconds,
+    publisher_queue_depth,
+    publisher_dropped_total,
+    publisher_retries_total,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/ingest/batch"
+
+# Endpoint individual → canal del sobre IngestBatch
+BATCH_CHANNELS = {
+    "/spymarket": "spymarket",
+    "/flow": "flow",
+    "/gamma": "gamma",
+    "/anomalies": "anomalies",
+}
+
+
+class PublishJob(NamedTuple):
+    endpoint: str
+    payload: Any
+    timeout: float
+    success_message: Optional[str]
+
+
+class BackendPublisher:
+    """
+    Publicador asíncrono de payloads JSON hacia el backend.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_retries: int = 2,
+        backoff_seconds: float = 0.2,
+        batch: bool = False
+    ):
+        """
+        Args:
+            base_url: URL base del backend (settings.backend_url)
+            workers: Número fijo de threads consumidores (= conexiones keep-alive)
+            queue_size: Capacidad máxima de la cola (los excedentes se descartan)
+            max_retries: Reintentos por mensaje tras el primer intento
+            backoff_seconds: Backoff base (se duplica por intento, con jitter)
+            batch: Acumular los canales de BATCH_CHANNELS hasta flush()
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.batch = batch
+        self._envelope = self._new_envelope()
+        self._envelope_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue: "queue.Queue[Optional[PublishJob]]" = queue.Queue(maxsize=queue_size)
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"publisher-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        mode = "batch" if batch else "single"
+        logger.info(f"BackendPublisher initialized ({workers} workers, queue={queue_size}, {mode}) → {self.base_url}")
+
+    @staticmethod
+    def _new_envelope() -> dict:
+        return {channel: [] for channel in BATCH_CHANNELS.values()}
+
+    def publish(
+        self,
+        endpoint: str,
+        payload: Any,
+        timeout: float = 5.0,
+        success_message: Optional[str] = None
+    ) -> bool:
+        """
+        Encola un POST (fire-and-forget, nunca bloquea el scan loop).
+
+        Args:
+            endpoint: Ruta del backend (p. ej. "/flow")
+            payload: Cuerpo JSON serializable
+            timeout: Timeout HTTP por intento
+            success_message: Log INFO a emitir cuando el backend acepta el POST
+
+        Returns:
+            False si la cola estaba llena y el mensaje se descartó
+        """
+        channel = BATCH_CHANNELS.get(endpoint) if self.batch else None
+        if channel is not None:
+            with self._envelope_lock:
+                if channel == "anomalies":
+                    self._envelope[channel].extend(payload.get("anomalies", []))
+                else:
+                    self._envelope[channel].append(payload)
+            return True
+
+        return self._enqueue(PublishJob(endpoint, payload, timeout, success_message))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Envía el sobre acumulado del scan como un único POST /ingest/batch.
+
+        No hace nada en modo single o si el sobre está vacío.
+        """
+        with self._envelope_lock:
+            envelope = self._envelope
+            if not any(envelope.values()):
+                return True
+            self._envelope = self._new_envelope()
+
+        counts = " ".join(f"{channel}={len(records)}" for channel, records in envelope.items() if records)
+        return self._enqueue(PublishJob(BATCH_ENDPOINT, envelope, timeout, f"📦 Batch sent | {counts}"))
+
+    def _enqueue(self, job: PublishJob) -> bool:
+        endpoint = job.endpoint
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            publisher_dropped_total.labels(endpoint=endpoint).inc()
+            logger.warning(f"⚠️ Publisher queue full, dropping POST {endpoint}")
+            return False
+        publisher_queue_depth.set(self._queue.qsize())
+        return True
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._send(job)
+            except Exception as e:
+                logger.error(f"❌ Publisher error on {job.endpoint}: {e}")
+            finally:
+                self._queue.task_done()
+                publisher_queue_depth.set(self._queue.qsize())
+
+    def _send(self, job: PublishJob) -> None:
+        url = f"{self.base_url}{job.endpoint}"
+
+        for attempt in range(self.max_retries + 1):
+            start = time.time()
+            try:
+                response = self.session.post(url, json=job.payload, timeout=job.timeout)
+                backend_request_duration_seconds.labels(endpoint=job.endpoint).observe(time.time() - start)
+                backend_requests_total.labels(
+                    method="POST",
+                    endpoint=job.endpoint,
+                    status=str(response.status_code)
+                ).inc()
+
+                if response.status_code < 400:
+                    if job.success_message:
+                        logger.info(job.success_message)
+                    if job.endpoint == BATCH_ENDPOINT:
+                        self._log_batch_rejections(response)
+                    return
+
+                if response.status_code < 500:
+                    # 4xx: payload rechazado, reintentar no sirve
+                    logger.error(f"❌ Backend rejected POST {job.endpoint} | status={response.status_code}")
+                    return
+
+                error = f"status={response.status_code}"
+
+            except requests.exceptions.Timeout:
+                error = f"timeout ({job.timeout}s)"
+            except requests.exceptions.ConnectionError as e:
+                error = f"connection error: {e}"
+
+            if attempt < self.max_retries:
+                publisher_retries_total.labels(endpoint=job.endpoint).inc()
+                # Backoff exponencial con jitter (evita ráfagas sincronizadas contra el backend)
+                time.sleep(self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+        logger.warning(f"⏱️ POST {job.endpoint} failed after {self.max_retries + 1} attempts ({error})")
+
+    @staticmethod
+    def _log_batch_rejections(response: requests.Response) -> None:
+        """Registra los registros rechazados por /ingest/batch (estado por registro)."""
+        try:
+            result = response.json()
+        except ValueError:
+            return
+        if result.get("rejected"):
+            rejected = [r for r in result.get("results", []) if r.get("status") == "rejected"]
+            for record in rejected:
+                logger.warning(f"⚠️ Backend rejected {record.get('channel')}[{record.get('index')}]: {record.get('detail')}")
+
+    def close(self, timeout: float = 2.0) -> None:
+        """
+        Envía el sobre pendiente, espera (como máximo `timeout`) a que se vacíe
+        la cola y detiene los workers.
+        """
+        self.flush()
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        self.session.close()
+        logger.info("BackendPublisher closed")
+
+
+# ========================================
+# SINGLETON PATTERN (pattern: pressure_engine.py)
+# ========================================
+
+_publisher = None
+
+
+def get_publisher() -> BackendPublisher:
+    """
+    Gets singleton instance of BackendPublisher.
+
+    Returns:
+        Global instance of BackendPublisher
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = BackendPublisher(
+            base_url=settings.backend_url,
+            workers=settings.publisher_workers,
+            queue_size=settings.publisher_queue_size,
+            max_retries=settings.publisher_max_retries,
+            batch=settings.publish_mode == "batch"
+        )
+        logger.info("✅ BackendPublisher singleton created")
+    return _publisher
@@ -0,0 +1,65 @@
+"""
+Tick Stream - Debounce por etapa para la ingestión event-driven de IBKR.
+
+Cada etapa (market, flow, gamma, anomaly) acumula las claves de contrato
+con ticks nuevos y solo se ejecuta cuando ha pasado su intervalo mínimo.
+Así un burst de ticks se agrupa sin añadir la latencia de un scan completo.
+"""
+import time
+from typing import Dict, Iterable, Optional, Set
+
+
+class StageDebouncer:
+    """
+    Debounce independiente por etapa del pipeline.
+
+    Uso:
+        debouncer.push(keys)                # ticks recién llegados
+        keys = debouncer.due("flow")        # None si la etapa aún no toca
+    """
+
+    def __init__(self, intervals: Dict[str, float]):
+        """
+        Args:
+            intervals: {stage: intervalo mínimo entre ejecuciones (segundos)}
+        """
+        self.intervals = dict(intervals)
+        self._pending: Dict[str, Set[str]] = {stage: set() for stage in intervals}
+        self._dirty: Dict[str, bool] = {stage: False for stage in intervals}
+        self._last_run: Dict[str, float] = {stage: 0.0 for stage in intervals}
+
+    def push(self, keys: Iterable[str], stages: Optional[Iterable[str]] = None) -> None:
+        """Marca ticks nuevos para las etapas indicadas (todas por defecto)."""
+        keys = set(keys)
+        for stage in (stages or self.intervals):
+            self._pending[stage] |= keys
+            self._dirty[stage] = True
+
+    def due(self, stage: str, now: Optional[float] = None) -> Optional[Set[str]]:
+        """
+        Devuelve (y vacía) las claves pendientes si la etapa debe ejecutarse.
+
+        Returns:
+            Set de claves (puede estar vacío si solo hubo tick de SPY) o None
+        """
+        now = time.time() if now is None else now
+        if not self._dirty[stage]:
+            return None
+        if now - self._last_run[stage] < self.intervals[stage]:
+            return None
+
+        keys = self._pending[stage]
+        self._pending[stage] = set()
+        self._dirty[stage] = False
+        self._last_run[stage] = now
+        return keys
+
+    def time_until_due(self, now: Optional[float] = None) -> Optional[float]:
+        """Segundos hasta que alguna etapa con trabajo pendiente pueda ejecutarse."""
+        now = time.time() if now is None else now
+        waits = [
+            max(0.0, self._last_run[stage] + interval - now)
+            for stage, interval in self.intervals.items()
+            if self._dirty[stage]
+        ]
+        return min(waits) if waits else None
@@ -2,6 +2,8 @@
 Volume Tracker - Calcula deltas de volumen entre scans.
 """
 import logging
+import numpy as np
+from option_chain import OptionChainSnapshot, RIGHT_CALL
 logger = logging.getLogger(__name__)
 
 class VolumeTracker:
@@ -15,6 +17,11 @@ class VolumeTracker:
         self.cum_call_flow = 0.0
         self.cum_put_flow = 0.0
         
+        # Volumen previo alineado con las filas del OptionChainSnapshot
+        self._prev_volume = np.zeros(0, dtype=np.int64)
+        self._row_epoch = np.zeros(0, dtype=np.int64)
+        self._row_keys = []
+        
     # COMENTADO: Método antiguo (agregación ATM total)
     # def calculate_deltas(self, calls_volume: int, puts_volume: int) -> tuple:
     #     if self.first_scan:
@@ -78,4 +85,68 @@ class VolumeTracker:
             return signed_premium, 0.0
         else:
             self.cum_put_flow += signed_premium
-            return 0.0, signed_premium
\ No newline at end of file
+            return 0.0, signed_premium
+    
+    def process_chain(self, chain: OptionChainSnapshot, mask: np.ndarray) -> tuple:
+        """
+        Signed premium de todas las filas de `mask` en una sola pasada vectorizada.
+        
+        Misma lógica que process_option_tick, pero sobre las columnas del snapshot.
+        El volumen previo se guarda por fila; si la fila cambia de contrato
+        (epoch distinto) se recupera el del contrato desde prev_volumes.
+        
+        Returns:
+            (call_flow, put_flow): Flujo firmado agregado de este scan
+        """
+        self._sync_rows(chain, mask)
+        
+        idx = np.flatnonzero(mask)
+        if len(idx) == 0:
+            return 0.0, 0.0
+        
+        current_volume = chain.volume[idx]
+        delta = current_volume - self._prev_volume[idx]
+        self._prev_volume[idx] = current_volume
+        
+        bid = chain.bid[idx]
+        ask = chain.ask[idx]
+        last = chain.last[idx]
+        
+        # Clasificación de agresión: +1 compra (last >= ask), -1 venta (last <= bid), 0 neutral
+        sign = np.where(last >= ask, 1.0, np.where(last <= bid, -1.0, 0.0))
+        countable = (delta > 0) & (last != 0) & (bid != 0) & (ask != 0)
+        
+        # Calcular premium (delta * precio * multiplicador)
+        signed_premium = np.where(countable, delta * last * 100 * sign, 0.0)
+        
+        is_call = chain.right[idx] == RIGHT_CALL
+        call_flow = float(signed_premium[is_call].sum())
+        put_flow = float(signed_premium[~is_call].sum())
+        
+        self.cum_call_flow += call_flow
+        self.cum_put_flow += put_flow
+        return call_flow, put_flow
+    
+    def _sync_rows(self, chain: OptionChainSnapshot, mask: np.ndarray) -> None:
+        """Alinea el estado por fila con el snapshot (tamaño y reasignación de slots)."""
+        if len(self._prev_volume) != chain.size:
+            grow = chain.size - len(self._prev_volume)
+            self._prev_volume = np.concatenate([self._prev_volume, np.zeros(grow, dtype=np.int64)])
+            self._row_epoch = np.concatenate([self._row_epoch, np.full(grow, -1, dtype=np.int64)])
+            self._row_keys.extend([None] * grow)
+        
+        for i in np.flatnonzero(mask & (self._row_epoch != chain.epoch)):
+            # Guardar el volumen del contrato saliente y cargar el del entrante
+            old_key = self._row_keys[i]
+            if old_key is not None:
+                self.prev_volumes[old_key] = int(self._prev_volume[i])
+            new_key = chain.keys[i]
+            self._prev_volume[i] = self.prev_volumes.get(self._contract_id(new_key), 0)
+            self._row_keys[i] = self._contract_id(new_key)
+            self._row_epoch[i] = chain.epoch[i]
+    
+    @staticmethod
+    def _contract_id(key: str) -> str:
+        """Misma clave que process_option_tick: "{strike(float)}_{right}"."""
+        strike, right = key.split('_')
+        return f"{float(strike)}_{right}"
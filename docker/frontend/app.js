@@ -1031,16 +1031,28 @@ const initSignalR = async () => {
             }
         });
 
-        connection.on('anomalyDetected', data => {
-            console.log('[SignalR] 🚨 anomalyDetected:', { type: data.option_type, strike: data.strike });
+        const pushAnomaly = data => {
             const arr = data.option_type === 'PUT' ? State.anomalies.puts : State.anomalies.calls;
             arr.unshift(data);
             if (arr.length > 5) arr.pop();
+        };
+
+        connection.on('anomalyDetected', data => {
+            console.log('[SignalR] 🚨 anomalyDetected:', { type: data.option_type, strike: data.strike });
+            pushAnomaly(data);
             updateUI.anomalies();
             // Solo persistimos en localStorage para el panel
             Storage.saveAnomalies({ calls: State.anomalies.calls, puts: State.anomalies.puts });
         });
 
+        // Backend agrupa las anomalías de un mismo tick en un único mensaje (lista)
+        connection.on('anomalyBatch', batch => {
+            console.log('[SignalR] 🚨 anomalyBatch:', batch.length);
+            batch.forEach(pushAnomaly);
+            updateUI.anomalies();
+            Storage.saveAnomalies({ calls: State.anomalies.calls, puts: State.anomalies.puts });
+        });
+
         connection.on('tvSignal', data => {
             console.log('[SignalR] 🚩 tvSignal:', data);
             
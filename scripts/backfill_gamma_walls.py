@@ -0,0 +1,125 @@
+"""
+Backfill de gamma_walls: str(list) legado → JSON compacto versionado.
+
+Las filas antiguas de la tabla gammametrics guardan gamma_walls como str(list)
+y el backend las decodifica con ast.literal_eval en cada lectura. Este script
+las reescribe como JSON (gamma_walls_v = 2) con MERGE por lotes de 100 (una
+transacción por lote). Es idempotente: las filas ya migradas se saltan, así que
+puede relanzarse si se interrumpe. Recorre la partición 'SPY' y las diarias
+'SPY|YYYYMMDD' (storage_partition_scheme = daily).
+
+Variables de entorno:
+    AZURE_ACCOUNT_NAME, AZURE_ACCOUNT_KEY  Credenciales de la cuenta de storage
+    TABLE_NAME                             Tabla (default: gammametrics)
+    DRY_RUN                                'true' = solo contar, sin escribir
+"""
+import ast
+import json
+import os
+import sys
+import time
+import logging
+from azure.data.tables import TableServiceClient, UpdateMode
+
+GAMMA_WALLS_VERSION = 2
+BATCH_SIZE = 100  # Máximo de operaciones por transacción en Azure Tables
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+
+def encode_walls(value) -> str:
+    """gamma_walls legado (str(list) o lista) → JSON compacto."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = ast.literal_eval(value)
+    return json.dumps(value if value is not None else [], separators=(",", ":"), default=str)
+
+
+def backfill(table_client, dry_run: bool) -> dict:
+    """Reescribe las filas sin gamma_walls_v. Devuelve contadores."""
+    stats = {"read": 0, "migrated": 0, "skipped": 0, "failed": 0}
+    batch = []
+
+    def _submit():
+        if not batch:
+            return
+        if not dry_run:
+            try:
+                table_client.submit_transaction(batch)
+            except Exception as e:
+                logger.error(f"   ❌ Error en lote ({len(batch)} filas): {e}")
+                stats["failed"] += len(batch)
+                batch.clear()
+                return
+        stats["migrated"] += len(batch)
+        batch.clear()
+        logger.info(f"   ✅ {stats['migrated']} migradas ({stats['read']} leídas)")
+
+    # 'SPY' y 'SPY|YYYYMMDD' ('}' es el carácter siguiente a '|')
+    entities = table_client.query_entities(
+        "PartitionKey ge 'SPY' and PartitionKey lt 'SPY}'",
+        select=["PartitionKey", "RowKey", "gamma_walls", "gamma_walls_v"],
+        results_per_page=1000,
+    )
+    for entity in entities:
+        stats["read"] += 1
+        if entity.get("gamma_walls_v") == GAMMA_WALLS_VERSION:
+            stats["skipped"] += 1
+            continue
+        try:
+            walls = encode_walls(entity.get("gamma_walls"))
+        except (ValueError, SyntaxError) as e:
+            # Fila intacta (sin marcar v2) para revisarla a mano
+            logger.warning(f"   ⚠️ gamma_walls no decodificable en {entity['PartitionKey']}/{entity['RowKey']}: {e}")
+            stats["failed"] += 1
+            continue
+        patch = {
+            "PartitionKey": entity["PartitionKey"],
+            "RowKey": entity["RowKey"],
+            "gamma_walls": walls,
+            "gamma_walls_v": GAMMA_WALLS_VERSION,
+        }
+        # Una transacción solo admite entidades de una misma partición
+        if batch and batch[0][1]["PartitionKey"] != patch["PartitionKey"]:
+            _submit()
+        batch.append(("update", patch, {"mode": UpdateMode.MERGE}))
+        if len(batch) >= BATCH_SIZE:
+            _submit()
+    _submit()
+    return stats
+
+
+# =============================================
+# EJECUCIÓN PRINCIPAL
+# =============================================
+if __name__ == "__main__":
+    account_name = os.environ.get('AZURE_ACCOUNT_NAME', '')
+    account_key = os.environ.get('AZURE_ACCOUNT_KEY', '')
+    table_name = os.environ.get('TABLE_NAME', 'gammametrics')
+    dry_run = os.environ.get('DRY_RUN', 'false').lower() == 'true'
+
+    if not account_name or not account_key:
+        logger.error("❌ Faltan credenciales de Azure")
+        sys.exit(1)
+
+    connection_string = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
+    table_client = TableServiceClient.from_connection_string(connection_string).get_table_client(table_name)
+    logger.info(f"🚀 Backfill gamma_walls → JSON v{GAMMA_WALLS_VERSION} en {table_name} (DRY_RUN={dry_run})")
+
+    start = time.time()
+    stats = backfill(table_client, dry_run)
+    elapsed = time.time() - start
+
+    logger.info(f"\n{'='*50}")
+    logger.info("🏁 PROCESO FINALIZADO")
+    logger.info(f"⏱️ Tiempo: {elapsed:.2f} segundos")
+    logger.info(f"📊 Leídas: {stats['read']} | Migradas: {stats['migrated']} | Ya en v{GAMMA_WALLS_VERSION}: {stats['skipped']} | Fallidas: {stats['failed']}")
+    logger.info(f"{'='*50}")
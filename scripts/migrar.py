@@ -1,10 +1,42 @@
+"""
+Migraciones de datos en Azure Tables.
+
+MODE=anomalies (default): reescribe las últimas MAX_RECORDS anomalías con RowKey
+invertido (ver migrate_anomalies).
+
+MODE=repartition: copia online las tablas de TABLES desde la partición 'SPY' a
+particiones diarias 'SPY|YYYYMMDD' (storage_partition_scheme = daily en el
+backend). Lee página a página y guarda en CHECKPOINT_FILE el último RowKey
+procesado por tabla, así que puede interrumpirse y relanzarse. Despliegue:
+    1. MODE=repartition                 → copia (el backend sigue leyendo 'SPY')
+    2. STORAGE_PARTITION_SCHEME=daily   → el backend escribe/lee particiones diarias
+    3. MODE=repartition RESET_CHECKPOINT=true
+                                        → catch-up de lo escrito en 'SPY' entre 1 y 2
+                                          (upserts idempotentes)
+    4. MODE=repartition DELETE_OLD=true → borra las filas copiadas de 'SPY'
+
+Variables de entorno:
+    AZURE_ACCOUNT_NAME, AZURE_ACCOUNT_KEY  Credenciales de la cuenta de storage
+    MODE                                   anomalies | repartition
+    TABLES                                 Tablas a repartir (coma), MODE=repartition
+    CHECKPOINT_FILE                        Checkpoint JSON (default: repartition_checkpoint.json)
+    RESET_CHECKPOINT                       'true' = empezar desde el principio
+    DELETE_OLD                             'true' = borrar las filas originales tras copiarlas
+"""
 import os
+import json
 import time
 import logging
 from datetime import datetime, timedelta, timezone
-from azure.data.tables import TableServiceClient
+from azure.data.tables import TableServiceClient, UpdateMode
 import sys
 
+BATCH_SIZE = 100  # Máximo de operaciones por transacción en Azure Tables
+REPARTITION_TABLES = (
+    "spymarket,flow,volumes,anomalies,gammametrics,marketevents,"
+    "flowrollup10s,flowrollup1m,flowrollup5m,spymarketrollup10s,spymarketrollup1m,spymarketrollup5m"
+)
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -64,6 +96,100 @@ class AzureMigrator:
         logger.warning(f"⚠️ Usando timestamp actual para {entity.get('RowKey', 'unknown')}")
         return time.time()
 
+    def _rowkey_to_day_partition(self, rowkey: str) -> str:
+        """RowKey invertido (19 dígitos) → PartitionKey diaria 'SPY|YYYYMMDD' (UTC)."""
+        ticks = 10**19 - 1 - int(rowkey)
+        day = datetime.fromtimestamp(ticks / 10_000_000, tz=timezone.utc)
+        return f"SPY|{day:%Y%m%d}"
+
+    def _load_checkpoint(self, path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_checkpoint(self, path: str, checkpoint: dict):
+        # Escritura atómica: un corte a mitad no deja un JSON truncado
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def _submit_batches(self, table_client, operations: list) -> int:
+        """Envía operaciones agrupadas por partición en transacciones de <= 100; uno a uno si falla."""
+        by_partition = {}
+        for op in operations:
+            by_partition.setdefault(op[1]['PartitionKey'], []).append(op)
+        done = 0
+        for ops in by_partition.values():
+            for i in range(0, len(ops), BATCH_SIZE):
+                chunk = ops[i:i + BATCH_SIZE]
+                try:
+                    table_client.submit_transaction(chunk)
+                    done += len(chunk)
+                except Exception as e:
+                    logger.warning(f"   ⚠️ Lote de {len(chunk)} falló ({e}); reintentando uno a uno")
+                    for kind, entity, *_ in chunk:
+                        try:
+                            if kind == 'upsert':
+                                table_client.upsert_entity(entity=entity, mode=UpdateMode.REPLACE)
+                            else:
+                                table_client.delete_entity(partition_key=entity['PartitionKey'], row_key=entity['RowKey'])
+                            done += 1
+                        except Exception as item_error:
+                            if kind == 'delete' and 'ResourceNotFound' in str(item_error):
+                                done += 1  # Ya borrada (relanzamiento)
+                                continue
+                            logger.error(f"   ❌ Error {kind} {entity['RowKey']}: {item_error}")
+        return done
+
+    def repartition_table(self, table_name: str, checkpoint_path: str, delete_old: bool) -> dict:
+        """
+        Copia la partición 'SPY' de una tabla a particiones diarias 'SPY|YYYYMMDD'.
+
+        Online: solo lee páginas de 'SPY' con RowKey > checkpoint (más reciente →
+        más antiguo) y hace upsert en las particiones nuevas, sin parar el backend.
+        Tras cada página se guarda el checkpoint; al relanzar continúa desde ahí.
+        """
+        stats = {"read": 0, "copied": 0, "deleted": 0, "skipped": 0}
+        table_client = self.table_service.get_table_client(table_name)
+        checkpoint = self._load_checkpoint(checkpoint_path)
+        query = "PartitionKey eq 'SPY'"
+        if table_name in checkpoint:
+            query += f" and RowKey gt '{checkpoint[table_name]}'"
+            logger.info(f"↩️ {table_name}: reanudando tras RowKey {checkpoint[table_name]}")
+        logger.info(f"🔄 Repartition {table_name} → SPY|YYYYMMDD")
+
+        for page in table_client.query_entities(query, results_per_page=1000).by_page():
+            upserts = []
+            deletes = []
+            last_rowkey = None
+            for ent in page:
+                stats["read"] += 1
+                last_rowkey = ent['RowKey']
+                if len(last_rowkey) != 19 or not last_rowkey.isdigit():
+                    # RowKey con formato antiguo: migrar antes con MODE=anomalies
+                    stats["skipped"] += 1
+                    continue
+                nueva_entidad = {k: v for k, v in ent.items() if k not in ('PartitionKey', 'Timestamp', 'etag')}
+                nueva_entidad['PartitionKey'] = self._rowkey_to_day_partition(last_rowkey)
+                upserts.append(('upsert', nueva_entidad, {'mode': UpdateMode.REPLACE}))
+                deletes.append(('delete', {'PartitionKey': 'SPY', 'RowKey': last_rowkey}))
+            if last_rowkey is None:
+                continue
+
+            stats["copied"] += self._submit_batches(table_client, upserts)
+            if delete_old:
+                stats["deleted"] += self._submit_batches(table_client, deletes)
+
+            checkpoint[table_name] = last_rowkey
+            self._save_checkpoint(checkpoint_path, checkpoint)
+            logger.info(f"   ✅ {table_name}: {stats['copied']} copiadas, {stats['deleted']} borradas ({stats['read']} leídas)")
+
+        logger.info(f"✅ {table_name}: repartition completado {stats}")
+        return stats
+
     def migrate_anomalies(self, keep_days: int, max_records: int, delete_old: bool):
         """
         Migra SOLO las últimas 'max_records' anomalías de la tabla.
@@ -175,6 +301,7 @@ class AzureMigrator:
 if __name__ == "__main__":
     account_name = os.environ.get('AZURE_ACCOUNT_NAME', '')
     account_key = os.environ.get('AZURE_ACCOUNT_KEY', '')
+    mode = os.environ.get('MODE', 'anomalies').lower()
     keep_days = int(os.environ.get('KEEP_DAYS', '30'))
     max_records = int(os.environ.get('MAX_RECORDS', '100'))
     delete_old = os.environ.get('DELETE_OLD', 'false').lower() == 'true'
@@ -183,6 +310,23 @@ if __name__ == "__main__":
         logger.error("❌ Faltan credenciales de Azure")
         sys.exit(1)
 
+    if mode == 'repartition':
+        tables = [t.strip() for t in os.environ.get('TABLES', REPARTITION_TABLES).split(',') if t.strip()]
+        checkpoint_path = os.environ.get('CHECKPOINT_FILE', 'repartition_checkpoint.json')
+        if os.environ.get('RESET_CHECKPOINT', 'false').lower() == 'true' and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        logger.info(f"🚀 Iniciando REPARTITION diario: {tables} (Borrar={delete_old}, checkpoint={checkpoint_path})")
+
+        migrator = AzureMigrator(account_name, account_key)
+        start = time.time()
+        for table_name in tables:
+            try:
+                migrator.repartition_table(table_name, checkpoint_path, delete_old)
+            except Exception as e:
+                logger.error(f"❌ Error crítico en repartition de {table_name}: {e}")
+        logger.info(f"🏁 REPARTITION FINALIZADO en {time.time() - start:.2f} segundos")
+        sys.exit(0)
+
     logger.info("🚀 Iniciando migración de ANOMALIES (últimas 100)")
     logger.info(f"📋 Configuración: Días={keep_days}, Máx={max_records}, Borrar={delete_old}")
 